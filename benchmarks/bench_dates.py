@@ -0,0 +1,24 @@
+import pytest
+
+from benchmarks.common import DATE_RANGES, START_DATE, TIME_PERIODS, \
+    end_date
+from tidetool.lib.tide_file import format_timestamps
+from tidetool.lib.tide_series import generate_dates_between
+
+
+@pytest.mark.parametrize('time_period', TIME_PERIODS)
+@pytest.mark.parametrize('date_range', DATE_RANGES)
+def bench_generate_dates(benchmark, date_range, time_period):
+    dates = benchmark(
+        generate_dates_between,
+        START_DATE, end_date(date_range), time_period
+    )
+    assert len(dates) == DATE_RANGES[date_range] * 24 * 60 // time_period
+
+
+@pytest.mark.parametrize('time_period', TIME_PERIODS)
+@pytest.mark.parametrize('date_range', ['1d', '1y'])
+def bench_format_timestamps(benchmark, date_range, time_period):
+    dates = generate_dates_between(
+        START_DATE, end_date(date_range), time_period)
+    benchmark(format_timestamps, dates)
@@ -0,0 +1,106 @@
+import pytest
+
+from benchmarks import fake_pyfes
+fake_pyfes.install()
+
+from benchmarks.common import DATE_RANGES, START_DATE, STATION_COUNTS, \
+    TIME_PERIODS, end_date, skip_if_too_large, station_locations, write_zdf
+from tidetool.lib.tide_generation import TideGenerator
+from tidetool.lib.tide_series import iter_dates_between
+from tidetool.lib.tides import InterpolatedTideModel, ThreadedTideModel, \
+    TideModel
+
+
+# model step (minutes) of the interpolated prediction benchmarks
+MODEL_STEP = 30
+# threads used by the threaded prediction benchmarks
+THREADS = 4
+
+
+@pytest.fixture(scope='module')
+def tide_model(fes_data_folder):
+    return TideModel.from_data_folder(fes_data_folder)
+
+
+def _predict(model, locations, date_range, time_period):
+    count = 0
+    for dates in iter_dates_between(
+            START_DATE, end_date(date_range), time_period):
+        for series in model.calculate_stations(dates, locations):
+            count += len(series)
+    return count
+
+
+@pytest.mark.parametrize('time_period', TIME_PERIODS)
+@pytest.mark.parametrize('date_range', DATE_RANGES)
+@pytest.mark.parametrize('stations', STATION_COUNTS)
+def bench_predict(benchmark, tide_model, stations, date_range, time_period):
+    skip_if_too_large(stations, date_range, time_period)
+    locations = station_locations(stations)
+
+    count = benchmark(
+        _predict, tide_model, locations, date_range, time_period)
+    assert count == \
+        stations * DATE_RANGES[date_range] * 24 * 60 // time_period
+
+
+@pytest.mark.parametrize('time_period', TIME_PERIODS)
+@pytest.mark.parametrize('date_range', DATE_RANGES)
+@pytest.mark.parametrize('stations', STATION_COUNTS)
+def bench_predict_interpolated(
+        benchmark, tide_model, stations, date_range, time_period):
+    """ Same as bench_predict, with FES evaluated every MODEL_STEP minutes
+    and interpolated to the time period.
+    """
+    skip_if_too_large(stations, date_range, time_period)
+    locations = station_locations(stations)
+    model = InterpolatedTideModel(tide_model, MODEL_STEP)
+
+    count = benchmark(_predict, model, locations, date_range, time_period)
+    assert count == \
+        stations * DATE_RANGES[date_range] * 24 * 60 // time_period
+
+
+@pytest.mark.parametrize('time_period', TIME_PERIODS)
+@pytest.mark.parametrize('date_range', DATE_RANGES)
+@pytest.mark.parametrize('stations', [1])
+def bench_predict_threaded(
+        benchmark, fes_data_folder, stations, date_range, time_period):
+    """ Same as bench_predict, with each window split into time slices
+    predicted by THREADS threads. Only a single station is benchmarked, as
+    that's what the threads are for. Timings depend on the number of cores.
+    """
+    skip_if_too_large(stations, date_range, time_period)
+    locations = station_locations(stations)
+    model = ThreadedTideModel(
+        lambda: TideModel.from_data_folder(fes_data_folder, num_threads=1),
+        THREADS
+    )
+    # models are created as the threads first need them, which isn't
+    # included in the timings
+    _predict(model, locations, date_range, time_period)
+
+    count = benchmark(_predict, model, locations, date_range, time_period)
+    model.close()
+    assert count == \
+        stations * DATE_RANGES[date_range] * 24 * 60 // time_period
+
+
+@pytest.mark.parametrize('time_period', TIME_PERIODS)
+@pytest.mark.parametrize('date_range', DATE_RANGES)
+@pytest.mark.parametrize('stations', STATION_COUNTS)
+def bench_generate_tides(
+        benchmark, fes_data_folder, tmp_path,
+        stations, date_range, time_period):
+    """ Zdf file to tide files, including the creation of the model """
+    skip_if_too_large(stations, date_range, time_period)
+    zdf_path = write_zdf(tmp_path / 'zone.zdf', stations)
+
+    def generate():
+        generator = TideGenerator(fes_data_folder)
+        generator.overwrite = True
+        generator.generate_tides_from_zdf(
+            zdf_path, START_DATE, end_date(date_range), time_period)
+
+    benchmark(generate)
+    assert len(list(tmp_path.glob('*.tid'))) == stations
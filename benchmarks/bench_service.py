@@ -0,0 +1,73 @@
+""" Latency and throughput of the prediction service compared with the cold
+path, where each prediction loads its own tide model (`get_tide_data`).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from benchmarks import fake_pyfes
+fake_pyfes.install()
+
+from benchmarks.common import START_DATE, end_date, station_locations
+from tidetool.lib.service import PredictionClient, ServerThread
+from tidetool.lib.tides import TideModel, get_tide_data
+
+
+# each client makes this many requests for a day of tide data
+REQUESTS_PER_CLIENT = 10
+CLIENT_COUNTS = [1, 10, 50]
+
+
+@pytest.fixture(scope='module')
+def service(fes_data_folder):
+    model = TideModel.from_data_folder(fes_data_folder)
+    server = ServerThread(model, port=0)
+    yield server
+    server.close()
+
+
+def bench_cold_request(benchmark, fes_data_folder):
+    """ A day of tide data, loading the tide model for the request """
+    latitude, longitude = station_locations(1)[0]
+
+    def request():
+        return get_tide_data(
+            fes_data_folder,
+            START_DATE, end_date('1d'),
+            latitude, longitude)
+
+    assert len(benchmark(request)) == 144
+
+
+def bench_service_request(benchmark, service):
+    """ A day of tide data, from the service """
+    latitude, longitude = station_locations(1)[0]
+
+    with PredictionClient(port=service.address[1]) as client:
+        series = benchmark(
+            client.get_tide_data,
+            START_DATE, end_date('1d'),
+            latitude, longitude)
+    assert len(series) == 144
+
+
+@pytest.mark.parametrize('clients', CLIENT_COUNTS)
+def bench_service_throughput(benchmark, service, clients):
+    """ Concurrent clients each making REQUESTS_PER_CLIENT requests for a
+    day of tide data, at different locations.
+    """
+    locations = station_locations(clients)
+
+    def client_requests(location):
+        count = 0
+        with PredictionClient(port=service.address[1]) as client:
+            for _ in range(REQUESTS_PER_CLIENT):
+                count += len(client.get_tide_data(
+                    START_DATE, end_date('1d'), *location))
+        return count
+
+    def run():
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            return sum(executor.map(client_requests, locations))
+
+    assert benchmark(run) == clients * REQUESTS_PER_CLIENT * 144
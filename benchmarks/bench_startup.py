@@ -0,0 +1,44 @@
+import subprocess
+import sys
+import pytest
+
+
+# heavy modules that must not be loaded by --help or argument validation
+HEAVY_MODULES = ['numpy', 'pyfes', 'tidetool.lib.tides']
+
+_MAIN = "from tidetool.tidetool import main; main()"
+
+
+def _run_tidetool(*args):
+    return subprocess.run(
+        [sys.executable, '-c', _MAIN, *args],
+        capture_output=True, text=True
+    )
+
+
+@pytest.mark.parametrize('args', [
+    ['--help'],
+    ['generate-tides', '--help'],
+    # missing required options
+    ['generate-tides'],
+], ids=['help', 'command-help', 'invalid-args'])
+def bench_startup(benchmark, args):
+    result = benchmark(_run_tidetool, *args)
+    assert 'Usage:' in result.stdout + result.stderr
+
+
+def bench_import_cli(benchmark):
+    """ Importing the cli module doesn't import the heavy modules """
+    check = (
+        "import sys; import tidetool.tidetool; "
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+
+    def import_cli():
+        return subprocess.run(
+            [sys.executable, '-c', check],
+            capture_output=True, text=True, check=True
+        )
+
+    result = benchmark(import_cli)
+    assert result.stdout.strip() == '[]'
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from benchmarks.common import DATE_RANGES, START_DATE, STATION_COUNTS, \
+    TIME_PERIODS, end_date, skip_if_too_large
+from tidetool.lib.tide_file import format_timestamps, read_tid_file, \
+    write_tid_file, TidWriter
+from tidetool.lib.tide_series import TideSeries, generate_dates_between
+
+
+def _series(date_range, time_period):
+    dates = generate_dates_between(
+        START_DATE, end_date(date_range), time_period)
+    heights = np.sin(np.arange(len(dates)) / 50) * 2.5
+    return TideSeries(dates, heights)
+
+
+def _write_stations(folder, series, stations):
+    # all stations share the formatted timestamps, as in a generator run
+    timestamps = format_timestamps(series.times)
+    for i in range(stations):
+        with TidWriter(folder / f"station_{i:04d}.tid") as writer:
+            writer.write(series, timestamps)
+
+
+@pytest.mark.parametrize('time_period', TIME_PERIODS)
+@pytest.mark.parametrize('date_range', DATE_RANGES)
+@pytest.mark.parametrize('stations', STATION_COUNTS)
+def bench_write_tid(benchmark, tmp_path, stations, date_range, time_period):
+    skip_if_too_large(stations, date_range, time_period)
+    series = _series(date_range, time_period)
+
+    benchmark(_write_stations, tmp_path, series, stations)
+    assert len(list(tmp_path.glob('*.tid'))) == stations
+
+
+@pytest.mark.parametrize('time_period', TIME_PERIODS)
+@pytest.mark.parametrize('date_range', DATE_RANGES)
+def bench_read_tid(benchmark, tmp_path, date_range, time_period):
+    skip_if_too_large(1, date_range, time_period)
+    series = _series(date_range, time_period)
+    path = tmp_path / 'station.tid'
+    write_tid_file(path, series)
+
+    read = benchmark(read_tid_file, path)
+    assert len(read) == len(series)
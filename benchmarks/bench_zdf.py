@@ -0,0 +1,19 @@
+import pytest
+
+from benchmarks.common import STATION_COUNTS, write_zdf
+from tidetool.lib.zdf import ZdfParser
+
+
+def _read_zdf(path):
+    parser = ZdfParser()
+    parser.read(path)
+    return parser.zdf
+
+
+@pytest.mark.parametrize('stations', STATION_COUNTS)
+def bench_zdf_read(benchmark, tmp_path, stations):
+    path = write_zdf(tmp_path / 'zone.zdf', stations)
+    zdf = benchmark(_read_zdf, path)
+
+    tide_stations = zdf.get_blocks_by_type('TIDE_STATION')[0]
+    assert len(tide_stations.data) == stations
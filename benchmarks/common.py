@@ -0,0 +1,68 @@
+""" Parameters and helpers shared by the benchmark modules """
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Tuple
+import os
+import pytest
+
+
+# cases with more points (stations x dates) than this are skipped
+MAX_POINTS = int(os.environ.get('TIDETOOL_BENCHMARK_MAX_POINTS', 2_000_000))
+
+START_DATE = datetime(2005, 1, 1)
+STATION_COUNTS = [1, 100, 1000]
+DATE_RANGES = {'1d': 1, '1y': 365, '10y': 3652}
+TIME_PERIODS = [1, 10]
+
+
+def end_date(date_range: str) -> datetime:
+    return START_DATE + timedelta(days=DATE_RANGES[date_range])
+
+
+def skip_if_too_large(stations: int, date_range: str, time_period: int) -> None:
+    points = stations * DATE_RANGES[date_range] * 24 * 60 // time_period
+    if points > MAX_POINTS:
+        pytest.skip(
+            f"{points} points is larger than TIDETOOL_BENCHMARK_MAX_POINTS")
+
+
+def station_locations(count: int) -> List[Tuple[float, float]]:
+    """ Locations spread along the northern australian coast """
+    return [
+        (-10.0 - (i % 50) * 0.05, 130.0 + (i * 0.37) % 10.0)
+        for i in range(count)
+    ]
+
+
+def write_zdf(path: Path, stations: int) -> Path:
+    """ Writes a zone definition file with the given number of tide
+    stations (and a zone and tide zone per station).
+    """
+    lines = ["[ZONE_DEF_VERSION_3]", ""]
+    locations = station_locations(stations)
+    for i, (lat, lon) in enumerate(locations):
+        lines += [
+            "[ZONE]",
+            f"box{i:04d}, 5",
+            f"{lat:.6f}, {lon:.6f}",
+            f"{lat + 0.1:.6f}, {lon:.6f}",
+            f"{lat + 0.1:.6f}, {lon + 0.1:.6f}",
+            f"{lat:.6f}, {lon + 0.1:.6f}",
+            f"{lat:.6f}, {lon:.6f}",
+            "",
+        ]
+    lines.append("[TIDE_ZONE]")
+    lines += [
+        f"box{i:04d},tide{i:04d},PRIM,600,1.0,1.0,0.01"
+        for i in range(stations)
+    ]
+    lines += ["", "[TIDE_STATION]"]
+    lines += [
+        f"tide{i:04d},{lat},{lon},0.0,0.01,station_{i:04d}.tid"
+        for i, (lat, lon) in enumerate(locations)
+    ]
+    lines += ["", "[OPTIONS]", "Outage, 600", "Interval, 10", ""]
+
+    path.write_text("\n".join(lines))
+    return path
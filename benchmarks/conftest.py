@@ -0,0 +1,183 @@
+""" Fixtures shared by the tide tool benchmarks, run them with
+
+    python -m pytest benchmarks
+
+Each benchmark records the best wall time over a number of rounds, and the
+peak memory (traced by tracemalloc) of one further round. Results are
+compared with the baseline saved in baseline.json, a benchmark fails if it
+is more than TIME_TOLERANCE times slower, or uses more than
+MEMORY_TOLERANCE times the memory, than its baseline.
+
+Wall times depend on the machine (and how busy it is), so a fixed
+calibration workload is timed once per session and saved with the
+baseline. Baseline times are scaled by how much slower or faster the
+calibration ran in this session than when the baseline was saved.
+
+Environment variables;
+    TIDETOOL_BENCHMARK_UPDATE=1 saves the results as the new baseline
+    TIDETOOL_BENCHMARK_TOLERANCE sets TIME_TOLERANCE
+    TIDETOOL_BENCHMARK_MAX_POINTS limits the size (stations x dates) of
+        the cases that are run, larger cases are skipped (see common.py)
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, Optional
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pytest
+
+
+BASELINE_FILE = Path(__file__).parent.joinpath('baseline.json')
+
+TIME_TOLERANCE = float(os.environ.get('TIDETOOL_BENCHMARK_TOLERANCE', 1.5))
+# allowance for timer noise in very short benchmarks (seconds)
+TIME_SLACK = 0.005
+MEMORY_TOLERANCE = 1.25
+# allowance for small allocations (bytes)
+MEMORY_SLACK = 1024 * 1024
+
+# benchmarks are repeated until they have run for MIN_TIME seconds, or for
+# MAX_ROUNDS rounds
+MIN_TIME = 0.5
+MAX_ROUNDS = 10
+
+UPDATE_BASELINE = os.environ.get('TIDETOOL_BENCHMARK_UPDATE') == '1'
+
+# name the calibration time is saved under in the baseline
+CALIBRATION = 'calibration'
+CALIBRATION_ROUNDS = 5
+
+# results of this session, by benchmark name
+_results: Dict[str, Dict] = {}
+# time of the calibration workload in this session, once it's been run
+_calibration: Optional[float] = None
+
+
+def _calibration_workload() -> None:
+    """ Mix of the work done by the benchmarks; starting python, numpy
+    array operations, string formatting and plain python loops.
+    """
+    subprocess.run([sys.executable, '-c', 'import json'], check=True)
+    values = np.cos(np.arange(1_000_000) * 0.001)
+    np.char.mod('% 6.2f', values[:100_000])
+    sum(i * i for i in range(200_000))
+
+
+def calibration_time() -> float:
+    """ Best time of the calibration workload, run the first time it's
+    needed in a session.
+    """
+    global _calibration
+    if _calibration is None:
+        times = []
+        for _ in range(CALIBRATION_ROUNDS):
+            start = time.perf_counter()
+            _calibration_workload()
+            times.append(time.perf_counter() - start)
+        _calibration = min(times)
+    return _calibration
+
+
+@pytest.fixture(scope='session')
+def fes_data_folder(tmp_path_factory) -> Path:
+    """ Data folder with (empty) config files for the fake pyfes module """
+    folder = tmp_path_factory.mktemp('fes')
+    folder.joinpath('ocean_tide.ini').write_text("")
+    folder.joinpath('load_tide.ini').write_text("")
+    return folder
+
+
+class Benchmark:
+    """ Runs and records a single benchmark, see module docs """
+
+    def __init__(self, name: str, baseline: Dict) -> None:
+        self.name = name
+        self.baseline = baseline
+
+
+    def __call__(self, function: Callable, *args, **kwargs):
+        times = []
+        while len(times) < MAX_ROUNDS and sum(times) < MIN_TIME:
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            function(*args, **kwargs)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        _results[self.name] = {
+            'time': min(times),
+            'rounds': len(times),
+            'peak_memory': peak_memory,
+        }
+        self._check(_results[self.name])
+        return result
+
+
+    def _check(self, result: Dict) -> None:
+        if UPDATE_BASELINE or self.name not in self.baseline:
+            return
+        baseline = self.baseline[self.name]
+
+        # baseline time on this machine, as it is now
+        scale = 1.0
+        if CALIBRATION in self.baseline:
+            scale = calibration_time() / self.baseline[CALIBRATION]['time']
+        baseline_time = baseline['time'] * scale
+        time_limit = baseline_time * TIME_TOLERANCE + TIME_SLACK
+        assert result['time'] <= time_limit, (
+            f"{self.name} took {result['time']:.4f}s, baseline is "
+            f"{baseline_time:.4f}s ({baseline['time']:.4f}s scaled by "
+            f"{scale:.2f} for this machine)"
+        )
+        memory_limit = \
+            baseline['peak_memory'] * MEMORY_TOLERANCE + MEMORY_SLACK
+        assert result['peak_memory'] <= memory_limit, (
+            f"{self.name} peak memory was {result['peak_memory']} bytes, "
+            f"baseline is {baseline['peak_memory']} bytes"
+        )
+
+
+@pytest.fixture(scope='session')
+def benchmark_baseline() -> Dict:
+    if not BASELINE_FILE.exists():
+        return {}
+    return json.loads(BASELINE_FILE.read_text())
+
+
+@pytest.fixture
+def benchmark(request, benchmark_baseline) -> Benchmark:
+    module = request.node.module.__name__.split('.')[-1]
+    name = f"{module}::{request.node.name}"
+    return Benchmark(name, benchmark_baseline)
+
+
+def pytest_terminal_summary(terminalreporter) -> None:
+    if len(_results) == 0:
+        return
+    terminalreporter.section('benchmarks')
+    for name, result in sorted(_results.items()):
+        terminalreporter.write_line(
+            f"{name:<60} {result['time']:10.4f}s "
+            f"{result['peak_memory'] / 1024 / 1024:10.1f}MB"
+        )
+
+
+def pytest_sessionfinish(session) -> None:
+    if not UPDATE_BASELINE or len(_results) == 0:
+        return
+    baseline = {}
+    if BASELINE_FILE.exists():
+        baseline = json.loads(BASELINE_FILE.read_text())
+    baseline.update(_results)
+    baseline[CALIBRATION] = {'time': calibration_time()}
+    BASELINE_FILE.write_text(json.dumps(baseline, indent=2, sort_keys=True))
@@ -0,0 +1,87 @@
+""" Deterministic stand-in for the pyfes module, so the tide tool can be
+benchmarked without the AVISO FES library or the FES2014 grids.
+
+The costs of the real library are modelled by the fake handler; creating a
+handler takes HANDLER_COST seconds (loading the grids), each calculate call
+takes CALL_COST seconds on top of the time taken to sum CONSTITUENT_COUNT
+constituents for every point. Heights depend smoothly on the location and
+time so the predictions look like a tide, but they are not a real tide.
+
+Use `install` before importing tidetool.lib.tides;
+
+    from benchmarks import fake_pyfes
+    fake_pyfes.install()
+    from tidetool.lib.tides import TideModel
+"""
+
+import sys
+import time
+import numpy as np
+
+
+# seconds taken to create a handler
+HANDLER_COST = 0.05
+# seconds of overhead for each calculate call
+CALL_COST = 0.0005
+# constituents summed for each point, FES2014 includes 34 waves
+CONSTITUENT_COUNT = 34
+
+# angular speeds (radians / hour) of the constituents, spread across the
+# long period, diurnal, semi-diurnal and shallow water bands
+_SPEEDS = np.concatenate([
+    np.linspace(0.0001, 0.01, 4),
+    np.linspace(0.22, 0.29, 10),
+    np.linspace(0.47, 0.53, 12),
+    np.linspace(0.9, 1.6, CONSTITUENT_COUNT - 26),
+])
+
+
+class Handler:
+    """ Fake pyfes.Handler, tide_type is 'ocean' or 'radial' """
+
+    def __init__(self, tide_type: str, mode: str, path: str) -> None:
+        if tide_type not in ('ocean', 'radial'):
+            raise ValueError(f"Unknown tide type {tide_type}")
+        self.tide_type = tide_type
+        self.mode = mode
+        self.path = path
+        time.sleep(HANDLER_COST)
+
+
+    def calculate(
+            self,
+            lon: np.ndarray,
+            lat: np.ndarray,
+            dates: np.ndarray,
+            num_threads: int = 0):
+        """ Returns the tide, long period tide and a (zero) flag array, all
+        in cm as the real handler does.
+        """
+        time.sleep(CALL_COST)
+
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        hours = np.asarray(dates).astype('datetime64[us]').astype(np.int64) \
+            / 3.6e9
+
+        # radial (load) tide is a few percent of the ocean tide
+        scale = 100.0 if self.tide_type == 'ocean' else 3.0
+        amplitude = scale * (1.0 + 0.5 * np.cos(np.radians(lat)))
+
+        tide = np.zeros(len(hours))
+        for i, speed in enumerate(_SPEEDS):
+            phase = np.radians(lon * (i + 1) + lat)
+            tide += amplitude / (i + 1) * np.cos(speed * hours + phase)
+        lp = 0.02 * amplitude * np.cos(hours * 2 * np.pi / (24 * 14.77))
+
+        return tide, lp, np.zeros(len(hours), dtype=np.int32)
+
+
+def install() -> None:
+    """ Installs this module in place of pyfes """
+    tides = sys.modules.get('tidetool.lib.tides')
+    if tides is not None and tides.pyfes is not sys.modules[__name__]:
+        raise RuntimeError(
+            "tidetool.lib.tides was imported before the fake pyfes module "
+            "was installed")
+    sys.modules['pyfes'] = sys.modules[__name__]
@@ -30,5 +30,9 @@ setup(
     install_requires=[
         'Click'
     ],
+    extras_require={
+        # regional grids and NetCDF output
+        'netcdf': ['netCDF4'],
+    },
     tests_require=['pytest'],
 )
@@ -0,0 +1,74 @@
+from datetime import datetime
+from pathlib import Path
+import pytest
+
+from tidetool.lib.batch import find_zdf_files, read_manifest
+
+
+def _touch(path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("[ZONE_DEF_VERSION_3]\n")
+    return path.resolve()
+
+
+def test_find_zdf_files(tmp_path):
+    a = _touch(tmp_path.joinpath('block_a', 'a.zdf'))
+    b = _touch(tmp_path.joinpath('block_b', 'b.zdf'))
+    c = _touch(tmp_path.joinpath('c.zdf'))
+
+    files = find_zdf_files([
+        str(tmp_path.joinpath('c.zdf')),
+        str(tmp_path.joinpath('**', '*.zdf')),
+    ])
+    # each file is only included once, in the order it's first matched
+    assert files == [c, a, b]
+
+    with pytest.raises(ValueError):
+        find_zdf_files([str(tmp_path.joinpath('*.txt'))])
+
+
+def test_read_manifest(tmp_path):
+    a = _touch(tmp_path.joinpath('block_a', 'a.zdf'))
+    b = _touch(tmp_path.joinpath('b.zdf'))
+    manifest = tmp_path.joinpath('manifest.txt')
+    manifest.write_text(
+        "# zdf file, start date, end date, time period\n"
+        "block_a/a.zdf, 2005-01-01, 2005-06-30\n"
+        "\n"
+        f"{b}, 2005-03-01, 2005-09-30, 30\n"
+        "b.zdf\n"
+    )
+
+    jobs = read_manifest(
+        manifest, datetime(2006, 1, 1), datetime(2007, 1, 1), 10)
+    assert len(jobs) == 3
+
+    assert jobs[0].zone_definition == a
+    assert jobs[0].start_date == datetime(2005, 1, 1)
+    assert jobs[0].end_date == datetime(2005, 6, 30)
+    assert jobs[0].time_period == 10
+
+    assert jobs[1].zone_definition == b
+    assert jobs[1].time_period == 30
+
+    # default date range
+    assert jobs[2].start_date == datetime(2006, 1, 1)
+    assert jobs[2].end_date == datetime(2007, 1, 1)
+
+    # no default date range
+    with pytest.raises(ValueError):
+        read_manifest(manifest)
+
+
+def test_read_manifest_errors(tmp_path):
+    _touch(tmp_path.joinpath('a.zdf'))
+    manifest = tmp_path.joinpath('manifest.txt')
+
+    for line in [
+            "missing.zdf, 2005-01-01, 2005-06-30",
+            "a.zdf, 2005-01-01",
+            "a.zdf, 01/01/2005, 2005-06-30",
+            "a.zdf, 2005-01-01, 2005-06-30, 0"]:
+        manifest.write_text(line + "\n")
+        with pytest.raises(ValueError, match="line 1"):
+            read_manifest(manifest)
@@ -0,0 +1,129 @@
+from datetime import datetime
+import os
+import numpy as np
+
+from tidetool.lib.cache import ConstituentStore, PredictionCache, \
+    config_digest
+from tidetool.lib.harmonics import CONSTITUENT_NAMES, HarmonicConstituents
+from tidetool.lib.tide_series import TideSeries, generate_dates_between
+
+
+def _write_configs(folder, content):
+    folder.joinpath('ocean_tide.ini').write_text(content)
+    folder.joinpath('load_tide.ini').write_text(content)
+
+
+def test_config_digest(tmp_path):
+    _write_configs(tmp_path, "TIDE_M2_FILE = ocean_tide/m2.nc\n")
+    digest = config_digest(tmp_path)
+
+    assert digest == config_digest(tmp_path)
+
+    _write_configs(tmp_path, "TIDE_M2_FILE = ocean_tide/m2_v2.nc\n")
+    assert digest != config_digest(tmp_path)
+
+
+def test_constituent_store(tmp_path):
+    store = ConstituentStore(tmp_path / 'constituents', 'abc')
+    count = len(CONSTITUENT_NAMES)
+    constituents = HarmonicConstituents(
+        np.linspace(0, 1, count), np.linspace(-90, 90, count), 0.1)
+
+    assert store.get(-11.2, 134.7) is None
+
+    store.put(-11.2, 134.7, constituents)
+    stored = store.get(-11.2, 134.7)
+
+    assert np.array_equal(stored.amplitudes, constituents.amplitudes)
+    assert np.array_equal(stored.phases, constituents.phases)
+    assert stored.mean == 0.1
+
+    # different location or config is a different entry
+    assert store.get(-11.3, 134.7) is None
+    assert ConstituentStore(tmp_path / 'constituents', 'xyz').get(
+        -11.2, 134.7) is None
+
+
+def _cache_entry(cache, latitude, heights):
+    dates = generate_dates_between(
+        datetime(2005, 1, 1), datetime(2005, 1, 2), 10)
+    writer = cache.writer(
+        latitude, 134.7,
+        datetime(2005, 1, 1), datetime(2005, 1, 2),
+        10, 'fes',
+        len(heights)
+    )
+    # written in two windows
+    series = TideSeries(dates, heights)
+    writer.write(series[:100])
+    writer.write(series[100:])
+    writer.commit()
+
+
+def _cache_get(cache, latitude):
+    return cache.get(
+        latitude, 134.7,
+        datetime(2005, 1, 1), datetime(2005, 1, 2),
+        10, 'fes'
+    )
+
+
+def test_prediction_cache(tmp_path):
+    cache = PredictionCache(tmp_path, 'abc', max_size=1024 * 1024)
+    heights = np.linspace(-1, 1, 144)
+
+    assert _cache_get(cache, -11.2) is None
+    _cache_entry(cache, -11.2, heights)
+
+    series = _cache_get(cache, -11.2)
+    assert np.array_equal(series.heights, heights)
+    assert series.times[0] == np.datetime64('2005-01-01T00:00')
+    assert series.times[-1] == np.datetime64('2005-01-01T23:50')
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_prediction_cache_eviction(tmp_path):
+    heights = np.zeros(144)
+    # room for two entries (each entry also includes a small header)
+    cache = PredictionCache(tmp_path, 'abc', max_size=2 * heights.nbytes + 512)
+
+    _cache_entry(cache, 0.0, heights)
+    os.utime(next(tmp_path.glob('*.npy')), (1000, 1000))
+    _cache_entry(cache, 1.0, heights)
+    for path in tmp_path.glob('*.npy'):
+        if path.stat().st_mtime != 1000:
+            os.utime(path, (2000, 2000))
+
+    # using the first entry makes the second the least recently used
+    assert _cache_get(cache, 0.0) is not None
+    _cache_entry(cache, 2.0, heights)
+
+    assert len(list(tmp_path.glob('*.npy'))) == 2
+    assert _cache_get(cache, 0.0) is not None
+    assert _cache_get(cache, 1.0) is None
+    assert _cache_get(cache, 2.0) is not None
+
+
+def test_prediction_cache_scans(tmp_path, monkeypatch):
+    heights = np.zeros(144)
+    cache = PredictionCache(tmp_path, 'abc', max_size=3 * heights.nbytes + 768)
+    scans = []
+    evict = cache.evict
+
+    def counted_evict():
+        scans.append(len(list(tmp_path.glob('*.npy'))))
+        evict()
+
+    monkeypatch.setattr(cache, 'evict', counted_evict)
+
+    # the folder is scanned for the first entry, then only once the entries
+    # added take the cache over its size
+    for latitude in range(3):
+        _cache_entry(cache, float(latitude), heights)
+    assert scans == [1]
+    _cache_entry(cache, 3.0, heights)
+    assert scans == [1, 4]
+    assert len(list(tmp_path.glob('*.npy'))) == 3
+    _cache_entry(cache, 4.0, heights)
+    assert scans == [1, 4, 4]
@@ -0,0 +1,125 @@
+from pathlib import Path
+import numpy as np
+import pytest
+
+from tidetool.lib.fes_config import Region, config_grids, read_fes_config, \
+    regional_data_folder, resolve_config
+
+
+def test_read_fes_config(tmp_path):
+    path = tmp_path.joinpath('ocean_tide.ini')
+    path.write_text(
+        "# ocean tide\n"
+        "TIDE_M2_FILE = ./ocean_tide/m2.nc  # comment\n"
+        "TIDE_M2_LATITUDE=lat\n"
+        "\n"
+        "TIDE_M2_LONGITUDE = lon\n"
+    )
+    config = read_fes_config(path)
+    assert config == {
+        'TIDE_M2_FILE': './ocean_tide/m2.nc',
+        'TIDE_M2_LATITUDE': 'lat',
+        'TIDE_M2_LONGITUDE': 'lon',
+    }
+    assert config_grids(config) == {
+        'TIDE_M2': {
+            'file': './ocean_tide/m2.nc',
+            'latitude': 'lat',
+            'longitude': 'lon',
+        }
+    }
+
+
+def test_region_from_locations():
+    region = Region.from_locations([(-33.5, 151.2), (-34.1, 150.9)])
+    assert (region.lat_min, region.lat_max) == (-36.0, -32.0)
+    assert (region.lon_min, region.lon_max) == (149.0, 153.0)
+    assert region.contains(-34.0, 151.0)
+    assert not region.contains(-34.0, 155.0)
+
+    # stations either side of 0 degrees longitude
+    region = Region.from_locations([(50.0, -0.5), (50.2, 0.5)])
+    assert (region.lon_min, region.lon_max) == (358.0, 362.0)
+    assert region.contains(50.0, -0.5)
+    assert region.contains(50.0, 1.0)
+    assert not region.contains(50.0, 3.0)
+
+
+def _write_grid(path: Path, lats: np.ndarray, lons: np.ndarray) -> None:
+    netCDF4 = pytest.importorskip('netCDF4')
+    with netCDF4.Dataset(path, 'w') as dataset:
+        dataset.createDimension('lat', len(lats))
+        dataset.createDimension('lon', len(lons))
+        dataset.createVariable('lat', 'f8', ('lat',))[:] = lats
+        dataset.createVariable('lon', 'f8', ('lon',))[:] = lons
+        amplitude = dataset.createVariable(
+            'amplitude', 'f4', ('lat', 'lon'), fill_value=1e10)
+        amplitude.units = 'cm'
+        amplitude[:] = lats[:, None] * 1000 + lons[None, :]
+
+
+def test_regional_data_folder(tmp_path):
+    netCDF4 = pytest.importorskip('netCDF4')
+
+    data_folder = tmp_path.joinpath('fes')
+    data_folder.joinpath('grids').mkdir(parents=True)
+    lats = np.arange(-90.0, 90.5, 0.5)
+    lons = np.arange(0.0, 360.0, 0.5)
+    for name in ['ocean_tide', 'load_tide']:
+        _write_grid(data_folder.joinpath('grids', f"{name}_m2.nc"), lats, lons)
+        data_folder.joinpath(f"{name}.ini").write_text(
+            f"TIDE_M2_FILE = grids/{name}_m2.nc\n"
+            "TIDE_M2_LATITUDE = lat\n"
+            "TIDE_M2_LONGITUDE = lon\n"
+        )
+
+    cache_folder = tmp_path.joinpath('cache')
+    region = Region.from_locations([(50.0, -0.5), (50.2, 0.5)])
+    folder = regional_data_folder(data_folder, region, cache_folder)
+
+    config = read_fes_config(folder.joinpath('ocean_tide.ini'))
+    assert config['TIDE_M2_FILE'] == './ocean_tide/ocean_tide_m2.nc'
+    with netCDF4.Dataset(folder.joinpath(config['TIDE_M2_FILE'])) as dataset:
+        cropped_lats = dataset['lat'][:]
+        cropped_lons = dataset['lon'][:]
+        amplitude = dataset['amplitude']
+        assert amplitude.units == 'cm'
+        assert np.array_equal(cropped_lats, np.arange(49.0, 52.5, 0.5))
+        # longitudes run across 360 without a break
+        assert np.array_equal(cropped_lons, np.arange(358.0, 362.5, 0.5))
+        expected = cropped_lats[:, None] * 1000 + cropped_lons[None, :] % 360
+        assert np.allclose(amplitude[:], expected)
+
+    # the cropped grids are reused
+    mtime = folder.joinpath('load_tide.ini').stat().st_mtime_ns
+    assert regional_data_folder(data_folder, region, cache_folder) == folder
+    assert folder.joinpath('load_tide.ini').stat().st_mtime_ns == mtime
+    assert [p.name for p in folder.parent.iterdir()] == [folder.name]
+
+
+def test_resolve_config(tmp_path, monkeypatch):
+    data_folder = tmp_path.joinpath('fes')
+    data_folder.mkdir()
+    monkeypatch.setenv('TIDETOOL_TEST_GRIDS', str(tmp_path.joinpath('grids')))
+    config_path = data_folder.joinpath('ocean_tide.ini')
+    config_path.write_text(
+        "TIDE_M2_FILE = ./ocean_tide/m2.nc\n"
+        "TIDE_M2_LATITUDE = lat\n"
+        "TIDE_K1_FILE = ${TIDETOOL_TEST_GRIDS}/k1.nc\n"
+    )
+
+    configs = tmp_path.joinpath('configs')
+    resolved = resolve_config(config_path, configs)
+    assert resolved.parent == configs
+    config = read_fes_config(resolved)
+    assert config == {
+        'TIDE_M2_FILE': str(data_folder.joinpath('ocean_tide', 'm2.nc')),
+        'TIDE_M2_LATITUDE': 'lat',
+        'TIDE_K1_FILE': str(tmp_path.joinpath('grids', 'k1.nc')),
+    }
+    # the same copy is used each time
+    assert resolve_config(config_path, configs) == resolved
+    assert len(list(configs.iterdir())) == 1
+
+    # config files with absolute paths are used as they are
+    assert resolve_config(resolved, configs) == resolved
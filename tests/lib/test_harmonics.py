@@ -0,0 +1,47 @@
+import numpy as np
+
+from tidetool.lib.harmonics import CONSTITUENT_NAMES, HarmonicConstituents, \
+    astronomical_arguments, fit_constituents, predict
+
+
+def _hourly_dates(start: str, days: int) -> np.ndarray:
+    return np.datetime64(start, 'm') + \
+        np.arange(days * 24) * np.timedelta64(60, 'm')
+
+
+def test_astronomical_arguments():
+    dates = _hourly_dates('2000-01-01T12:00', 2)
+    args = astronomical_arguments(dates)
+
+    assert args.shape == (6, len(dates))
+    assert np.all((args >= 0) & (args < 360))
+
+    # M2 (2 x lunar time) should advance close to 28.984 degrees per hour
+    tau_rate = (args[0, 1] - args[0, 0]) % 360
+    assert abs(2 * tau_rate - 28.9841042) < 1e-4
+
+
+def test_fit_and_predict():
+    count = len(CONSTITUENT_NAMES)
+    rng = np.random.default_rng(1)
+    constituents = HarmonicConstituents(
+        rng.uniform(0.0, 1.0, count),
+        rng.uniform(-180.0, 180.0, count),
+        0.05
+    )
+
+    fit_dates = _hourly_dates('2015-01-01T00:00', 370)
+    heights = predict([constituents], fit_dates)
+    fitted = fit_constituents(fit_dates, heights)[0]
+
+    assert np.allclose(fitted.amplitudes, constituents.amplitudes, atol=1e-8)
+    assert abs(fitted.mean - constituents.mean) < 1e-8
+
+    # predictions well away from the fitted record should still match,
+    # nodal corrections are applied to both
+    dates = _hourly_dates('2031-06-01T00:00', 10)
+    assert np.allclose(
+        predict([fitted], dates),
+        predict([constituents], dates),
+        atol=1e-8
+    )
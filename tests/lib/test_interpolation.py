@@ -0,0 +1,58 @@
+import numpy as np
+
+from tidetool.lib.interpolation import coarse_dates, interpolate, off_step
+
+
+def _dates(start: str, count: int, minutes: int) -> np.ndarray:
+    return np.datetime64(start, 'm') + \
+        np.arange(count) * np.timedelta64(minutes, 'm')
+
+
+def test_coarse_dates():
+    dates = _dates('2005-01-01T00:07', 100, 1)
+    coarse = coarse_dates(dates, 30)
+
+    # aligned to the model step, with two extra dates either side
+    assert coarse[0] == np.datetime64('2004-12-31T23:30')
+    assert coarse[-1] == np.datetime64('2005-01-01T02:30')
+    assert np.all(np.diff(coarse) == np.timedelta64(30, 'm'))
+
+    assert np.array_equal(
+        np.flatnonzero(~off_step(dates, 30)), [23, 53, 83])
+
+
+def test_interpolate_cubic():
+    # cubics are interpolated exactly
+    def cubic(d):
+        hours = (d - np.datetime64('2005-01-01T00:00')) / np.timedelta64(1, 'h')
+        return 0.5 - 0.2 * hours + 0.03 * hours ** 2 - 0.001 * hours ** 3
+
+    dates = _dates('2005-01-01T00:00', 600, 1)
+    coarse = coarse_dates(dates, 60)
+    heights = interpolate(coarse, cubic(coarse), dates)
+    assert np.allclose(heights, cubic(dates))
+
+    # with one row per station
+    coarse_heights = np.array([cubic(coarse), 2 * cubic(coarse)])
+    heights = interpolate(coarse, coarse_heights, dates)
+    assert heights.shape == (2, 600)
+    assert np.allclose(heights[1], 2 * cubic(dates))
+
+
+def test_interpolate_windows():
+    # splitting the dates into windows gives the same heights
+    def tide(d):
+        hours = d.astype('datetime64[m]').astype(np.int64) / 60
+        return np.cos(hours * 2 * np.pi / 12.42)
+
+    dates = _dates('2005-01-01T00:00', 1000, 1)
+    coarse = coarse_dates(dates, 30)
+    heights = interpolate(coarse, tide(coarse), dates)
+    assert np.abs(heights - tide(dates)).max() < 1e-4
+
+    for first in range(0, 1000, 333):
+        window = dates[first:first + 333]
+        window_coarse = coarse_dates(window, 30)
+        assert np.array_equal(
+            interpolate(window_coarse, tide(window_coarse), window),
+            heights[first:first + 333])
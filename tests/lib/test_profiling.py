@@ -0,0 +1,71 @@
+import json
+import pytest
+
+from tidetool.lib import profiling
+
+
+def test_phase_disabled():
+    assert not profiling.enabled()
+    # the same no-op context manager is used for every phase
+    assert profiling.phase('write') is profiling.phase('predict', 10)
+    with profiling.phase('write'):
+        pass
+    assert profiling.stop() is None
+
+
+def test_profile_report():
+    profiling.start()
+    try:
+        with profiling.phase('predict', 100, ['a.tid', 'b.tid']):
+            with profiling.phase('fes_calculate', 100):
+                pass
+        with profiling.phase('predict', 50, ['a.tid']):
+            pass
+    finally:
+        report = profiling.stop()
+
+    assert not profiling.enabled()
+    assert report['points'] == 150
+    assert report['phases']['predict']['calls'] == 2
+    assert report['phases']['fes_calculate']['points'] == 100
+    assert report['phases']['predict']['time'] >= \
+        report['phases']['fes_calculate']['time']
+    assert set(report['stations']) == {'a.tid', 'b.tid'}
+    assert report['stations']['a.tid'] >= report['stations']['b.tid']
+    assert report['peak_traced_memory'] is None
+
+
+def test_profile_merge():
+    worker = profiling.Profiler(trace_memory=True)
+    worker.add('write', 2.0, 10, ['a.tid'])
+    snapshot = worker.take_snapshot()
+    worker.close()
+    assert worker.phases == {}
+
+    main = profiling.Profiler()
+    main.add('write', 1.0, 5, ['a.tid', 'b.tid'])
+    main.merge(snapshot)
+    report = main.report()
+
+    assert report['phases']['write'] == {
+        'calls': 2, 'time': 3.0, 'points': 15, 'points_per_second': 5.0}
+    assert report['stations'] == {'a.tid': 2.5, 'b.tid': 0.5}
+    assert report['peak_traced_memory_workers'] is not None
+
+
+def test_profile_run(tmp_path):
+    path = tmp_path.joinpath('profile.json')
+    messages = []
+    # the report is saved even when the run fails
+    with pytest.raises(RuntimeError):
+        with profiling.profile_run(path, log_function=messages.append):
+            assert profiling.enabled()
+            with profiling.phase('predict', 10):
+                raise RuntimeError("prediction failed")
+
+    assert not profiling.enabled()
+    assert json.loads(path.read_text())['phases']['predict']['points'] == 10
+    assert messages == [f"Profile report saved to {path}"]
+
+    with profiling.profile_run(None):
+        assert not profiling.enabled()
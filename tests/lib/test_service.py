@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import asyncio
+import time
+import numpy as np
+import pytest
+
+from tidetool.lib import service
+from tidetool.lib.service import PredictionBatcher, PredictionClient, \
+    PredictionServiceError, ServerThread
+from tidetool.lib.tide_series import generate_dates_between
+
+
+class _FakeModel:
+    """ Height is a function of the location and time, so results can be
+    checked without pyfes.
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        # number of points of each call
+        self.calls = []
+
+
+    def calculate(self, dates, latitudes, longitudes):
+        time.sleep(self.delay)
+        self.calls.append(len(dates))
+        minutes = dates.astype('datetime64[m]').astype(np.int64)
+        if np.any(latitudes > 90):
+            raise ValueError("Invalid latitude")
+        return latitudes + longitudes / 1000 + (minutes % 1000) / 1e6
+
+
+@pytest.fixture
+def server():
+    server_thread = ServerThread(_FakeModel(), port=0, batch_delay=0.0)
+    yield server_thread
+    server_thread.close()
+
+
+def test_service_series(server):
+    start, end = datetime(2005, 1, 1), datetime(2005, 1, 2)
+    with PredictionClient(port=server.address[1]) as client:
+        series = client.get_tide_data_many(
+            start, end, [(-11.0, 134.0), (-12.0, 135.0)], 30)
+
+    dates = generate_dates_between(start, end, 30)
+    model = _FakeModel()
+    assert len(series) == 2
+    for (lat, lon), s in zip([(-11.0, 134.0), (-12.0, 135.0)], series):
+        assert np.array_equal(s.times, dates)
+        expected = model.calculate(
+            dates, np.full(len(dates), lat), np.full(len(dates), lon))
+        assert np.array_equal(s.heights, expected)
+
+
+def test_service_points(server):
+    dates = np.array(['2005-01-01T00:00', '2010-06-01T12:30'],
+        dtype='datetime64[m]')
+    latitudes = np.array([-11.0, -12.5])
+    longitudes = np.array([134.0, 135.5])
+
+    with PredictionClient(port=server.address[1]) as client:
+        heights = client.calculate(dates, latitudes, longitudes)
+        assert np.array_equal(
+            heights, _FakeModel().calculate(dates, latitudes, longitudes))
+
+        # errors are raised by the client, and the connection can still be
+        # used afterwards
+        with pytest.raises(PredictionServiceError, match="Invalid latitude"):
+            client.calculate(dates, latitudes + 200, longitudes)
+        with pytest.raises(PredictionServiceError, match="same shape"):
+            client.calculate(dates, latitudes[:1], longitudes)
+        assert client.stats()['requests'] == 2
+
+
+def test_service_coalesces_requests():
+    # while one model call is running all other requests queue up, and are
+    # predicted by a single call
+    server_thread = ServerThread(
+        _FakeModel(delay=0.1), port=0, batch_delay=0.0)
+    try:
+        def request(i):
+            with PredictionClient(port=server_thread.address[1]) as client:
+                return client.get_tide_data(
+                    datetime(2005, 1, 1), datetime(2005, 1, 2),
+                    -10.0 - i, 130.0, 10)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            all_series = list(executor.map(request, range(8)))
+
+        model = _FakeModel()
+        for i, series in enumerate(all_series):
+            assert len(series) == 144
+            expected = model.calculate(
+                series.times, np.full(144, -10.0 - i), np.full(144, 130.0))
+            assert np.array_equal(series.heights, expected)
+
+        with PredictionClient(port=server_thread.address[1]) as client:
+            stats = client.stats()
+        assert stats['requests'] == 8
+        assert stats['calls'] < 8
+        assert stats['points'] == 8 * 144
+    finally:
+        server_thread.close()
+
+
+def test_batcher_splits_large_requests():
+    model = _FakeModel()
+    dates = np.arange(
+        '2005-01-01', '2005-01-03', np.timedelta64(10, 'm'),
+        dtype='datetime64[m]')
+    latitudes = np.linspace(-20.0, -10.0, len(dates))
+    longitudes = np.full(len(dates), 130.0)
+
+    async def calculate():
+        batcher = PredictionBatcher(
+            model, batch_delay=0.001, max_batch_points=100)
+        batcher.start()
+        try:
+            # a request larger than a model call, and one that shares the
+            # batch with it
+            heights = await asyncio.gather(
+                batcher.calculate(dates, latitudes, longitudes),
+                batcher.calculate(dates[:30], latitudes[:30], longitudes[:30]))
+            return heights, batcher.calls
+        finally:
+            await batcher.close()
+
+    (large, small), calls = asyncio.run(calculate())
+    assert max(model.calls) <= 100
+    assert sum(model.calls) == len(dates) + 30
+    assert calls == len(model.calls)
+    expected = _FakeModel().calculate(dates, latitudes, longitudes)
+    assert np.array_equal(large, expected)
+    assert np.array_equal(small, expected[:30])
+
+
+def test_service_request_size(monkeypatch):
+    monkeypatch.setattr(service, 'MAX_REQUEST_SIZE', 64 * 1024)
+    server_thread = ServerThread(_FakeModel(), port=0, batch_delay=0.0)
+    try:
+        dates = np.full(10_000, np.datetime64('2005-01-01T00:00'))
+        with PredictionClient(port=server_thread.address[1]) as client:
+            with pytest.raises(PredictionServiceError, match="larger than"):
+                client.calculate(dates, np.zeros(10_000), np.zeros(10_000))
+            # the rest of the request is skipped, so the connection can
+            # still be used
+            heights = client.calculate(dates[:10], np.zeros(10), np.zeros(10))
+            assert len(heights) == 10
+    finally:
+        server_thread.close()
+
+
+def test_batcher_bad_request():
+    # a request the model fails on doesn't fail the request it was
+    # batched with
+    model = _FakeModel()
+    dates = np.arange(
+        '2005-01-01', '2005-01-02', np.timedelta64(10, 'm'),
+        dtype='datetime64[m]')
+    latitudes = np.full(len(dates), -10.0)
+    longitudes = np.full(len(dates), 130.0)
+
+    async def calculate():
+        batcher = PredictionBatcher(model, batch_delay=0.01)
+        batcher.start()
+        try:
+            return await asyncio.gather(
+                batcher.calculate(dates, latitudes, longitudes),
+                batcher.calculate(dates, latitudes + 200, longitudes),
+                return_exceptions=True)
+        finally:
+            await batcher.close()
+
+    good, bad = asyncio.run(calculate())
+    # the shared call failed, then each request was predicted on its own
+    assert model.calls == [2 * len(dates), len(dates), len(dates)]
+    assert np.array_equal(
+        good, _FakeModel().calculate(dates, latitudes, longitudes))
+    assert isinstance(bad, ValueError)
+
+
+def test_service_series_points(monkeypatch, server):
+    monkeypatch.setattr(service, 'MAX_SERIES_POINTS', 1000)
+    start = datetime(2005, 1, 1)
+    with PredictionClient(port=server.address[1]) as client:
+        # 144 dates for 6 locations is under the limit, 7 are over
+        series = client.get_tide_data_many(
+            start, datetime(2005, 1, 2), [(-11.0, 134.0)] * 6, 10)
+        assert len(series) == 6
+        with pytest.raises(PredictionServiceError, match="larger than"):
+            client.get_tide_data_many(
+                start, datetime(2005, 1, 2), [(-11.0, 134.0)] * 7, 10)
+        # even a request for a huge number of points is rejected up front
+        with pytest.raises(PredictionServiceError, match="larger than"):
+            client.get_tide_data(start, datetime(3005, 1, 1), -11.0, 134.0, 1)
+        assert client.stats()['points'] == 6 * 144
@@ -0,0 +1,29 @@
+from tidetool.lib.spatial import LocationIndex, FES2014_GRID_SIZE
+
+
+def test_location_index_exact():
+    index = LocationIndex()
+
+    assert index.add(-11.223203, 134.741672) == 0
+    assert index.add(-10.954652, 136.787012) == 1
+    assert index.add(-11.223203, 134.741672) == 0
+    # same longitude, expressed differently
+    assert index.add(-11.223203, 134.741672 - 360) == 0
+
+    assert index.locations == [
+        (-11.223203, 134.741672),
+        (-10.954652, 136.787012)
+    ]
+
+
+def test_location_index_grid():
+    index = LocationIndex(FES2014_GRID_SIZE)
+
+    assert index.add(-11.22, 134.74) == 0
+    # within the same 1/16 degree grid cell
+    assert index.add(-11.23, 134.70) == 0
+    # next grid cell
+    assert index.add(-11.22, 134.76) == 1
+
+    # location of the group is the first location added
+    assert index.locations[0] == (-11.22, 134.74)
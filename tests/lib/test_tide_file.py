@@ -0,0 +1,222 @@
+from datetime import datetime, timedelta
+import os
+import numpy as np
+import pytest
+
+from tidetool.lib.tide_file import format_timestamps, format_heights, \
+    read_tid_extent, read_tid_file, read_tid_sidecar, sidecar_path, \
+    write_tid_file, TidWriter
+from tidetool.lib.tide_series import TideSeries
+
+
+def _reference_line(timestamp: datetime, height: float) -> str:
+    # the original line by line formatting of tide files
+    timestamp_str = timestamp.strftime("%Y/%m/%d %H:%M")
+    height_str = f"{height: .2f}".rjust(6)
+    return f"{timestamp_str} {height_str}\n"
+
+
+def test_format_timestamps():
+    dates = np.array(['2005-01-01T00:00', '1999-12-31T23:50'],
+        dtype='datetime64[m]')
+    timestamps = format_timestamps(dates)
+
+    assert timestamps.dtype == np.dtype('S17')
+    assert timestamps[0] == b"2005/01/01 00:00 "
+    assert timestamps[1] == b"1999/12/31 23:50 "
+
+
+def test_format_heights():
+    heights = np.array([0.0, 1.234, -1.235, 12.5, -12.345, 123.456, -0.001])
+    heights_str = format_heights(heights)
+
+    for h, h_str in zip(heights.tolist(), heights_str):
+        assert h_str == f"{h: .2f}".rjust(6)
+
+
+def test_write_tid_file(tmp_path):
+    start = datetime(2005, 1, 1)
+    dates_list = [start + timedelta(minutes=10 * i) for i in range(500)]
+    dates = np.array(dates_list, dtype='datetime64[m]')
+    heights = np.sin(np.arange(500) / 10) * 3.5
+
+    output_file = tmp_path / "test.tid"
+    write_tid_file(output_file, TideSeries(dates, heights))
+
+    expected = '--------\n' + ''.join(
+        _reference_line(d, h) for d, h in zip(dates_list, heights.tolist())
+    )
+    assert output_file.read_text() == expected
+
+
+def test_write_tid_file_wide_heights(tmp_path):
+    # heights too wide for the 6 char column are still written in full
+    start = datetime(2005, 1, 1)
+    dates_list = [start + timedelta(minutes=10 * i) for i in range(4)]
+    dates = np.array(dates_list, dtype='datetime64[m]')
+    heights = np.array([1.5, 1234.567, -123.4, -0.25])
+
+    output_file = tmp_path / "test.tid"
+    write_tid_file(output_file, TideSeries(dates, heights))
+
+    expected = '--------\n' + ''.join(
+        _reference_line(d, h) for d, h in zip(dates_list, heights.tolist())
+    )
+    assert output_file.read_text() == expected
+
+
+def test_tid_writer_windows(tmp_path):
+    dates = np.datetime64('2005-01-01T00:00') + \
+        np.arange(100) * np.timedelta64(10, 'm')
+    heights = np.cos(np.arange(100) / 7) * 2.0
+    series = TideSeries(dates, heights)
+    timestamps = format_timestamps(dates)
+
+    write_tid_file(tmp_path / "single.tid", series)
+    with TidWriter(tmp_path / "windows.tid") as writer:
+        for first in range(0, 100, 30):
+            writer.write(
+                series[first:first + 30], timestamps[first:first + 30])
+
+    assert (tmp_path / "single.tid").read_text() == \
+        (tmp_path / "windows.tid").read_text()
+
+
+def test_read_tid_extent(tmp_path):
+    dates = np.datetime64('2005-01-01T00:00') + \
+        np.arange(100) * np.timedelta64(10, 'm')
+    heights = np.zeros(100)
+    output_file = tmp_path / "test.tid"
+    write_tid_file(output_file, TideSeries(dates, heights))
+
+    first, last, spacing = read_tid_extent(output_file)
+    assert first == dates[0]
+    assert last == dates[-1]
+    assert spacing == np.timedelta64(10, 'm')
+
+    # appended lines carry on from the end of the file
+    more_dates = dates[-1] + np.arange(1, 11) * np.timedelta64(10, 'm')
+    with TidWriter(output_file, append=True) as writer:
+        writer.write(TideSeries(more_dates, np.zeros(10)))
+
+    _, last, _ = read_tid_extent(output_file)
+    assert last == more_dates[-1]
+    assert output_file.read_text().count('--------') == 1
+
+
+def test_read_tid_extent_incomplete(tmp_path):
+    output_file = tmp_path / "test.tid"
+    output_file.write_text("--------\n2005/01/01 00:00   0.00\n2005/01/01 00:")
+
+    with pytest.raises(ValueError):
+        read_tid_extent(output_file)
+
+
+def _test_series(count=500):
+    dates = np.datetime64('2005-01-01T00:00') + \
+        np.arange(count) * np.timedelta64(10, 'm')
+    return TideSeries(dates, np.sin(np.arange(count) / 10) * 3.5)
+
+
+def test_read_tid_file(tmp_path):
+    series = _test_series()
+    output_file = tmp_path / "test.tid"
+    write_tid_file(output_file, series)
+
+    read = read_tid_file(output_file)
+    assert np.array_equal(read.times, series.times)
+    assert np.array_equal(read.heights, np.round(series.heights, 2))
+
+
+def test_read_tid_file_other_widths(tmp_path):
+    # heights too large for the standard line width, and windows new lines
+    output_file = tmp_path / "test.tid"
+    output_file.write_bytes(
+        b"--------\r\n"
+        b"2005/01/01 00:00   0.25\r\n"
+        b"2005/01/01 00:10 1234.50\r\n"
+    )
+    read = read_tid_file(output_file)
+    assert read.times[1] == np.datetime64('2005-01-01T00:10')
+    assert np.array_equal(read.heights, [0.25, 1234.5])
+
+    output_file.write_bytes(
+        b"--------\r\n"
+        b"2005/01/01 00:00   0.25\r\n"
+        b"2005/01/01 00:10  -1.50\r\n"
+    )
+    read = read_tid_file(output_file)
+    assert np.array_equal(read.heights, [0.25, -1.5])
+
+    output_file.write_text("--------\n2005/01/01 00:00\n")
+    with pytest.raises(ValueError):
+        read_tid_file(output_file)
+
+
+def test_tid_sidecar(tmp_path):
+    series = _test_series()
+    output_file = tmp_path / "test.tid"
+    write_tid_file(output_file, series[:300], sidecar=True)
+    with TidWriter(output_file, append=True, sidecar=True) as writer:
+        writer.write(series[300:])
+
+    sidecar = read_tid_sidecar(output_file)
+    assert np.array_equal(sidecar.times, series.times)
+    assert np.allclose(sidecar.heights, series.heights, atol=1e-6)
+    assert np.array_equal(
+        np.load(sidecar_path(output_file))['time'], series.times)
+
+    # sidecar is used when up to date
+    assert read_tid_file(output_file).heights.dtype == np.float32
+
+
+def test_tid_sidecar_out_of_date(tmp_path):
+    series = _test_series()
+    output_file = tmp_path / "test.tid"
+    write_tid_file(output_file, series[:300], sidecar=True)
+    # tide file is now newer than the sidecar
+    with TidWriter(output_file, append=True) as writer:
+        writer.write(series[300:])
+    os.utime(sidecar_path(output_file), (1000, 1000))
+
+    assert read_tid_file(output_file).heights.dtype == np.float64
+
+    # appending with a sidecar rebuilds it from the tide file
+    with TidWriter(output_file, append=True, sidecar=True) as writer:
+        next_time = series.times[-1:] + np.timedelta64(10, 'm')
+        writer.write(TideSeries(next_time, [1.0]))
+
+    sidecar = read_tid_sidecar(output_file)
+    assert len(sidecar) == 501
+    assert np.array_equal(sidecar.times[:500], series.times)
+
+
+def test_tid_writer_discard(tmp_path):
+    series = _test_series()
+    output_file = tmp_path / "test.tid"
+
+    # a new tide file only appears once the writer is closed
+    writer = TidWriter(output_file, sidecar=True)
+    writer.write(series[:300])
+    assert not output_file.exists()
+    writer.discard()
+    assert list(tmp_path.iterdir()) == []
+
+    write_tid_file(output_file, series[:300], sidecar=True)
+    original = output_file.read_bytes()
+    original_sidecar = sidecar_path(output_file).read_bytes()
+
+    # an interrupted write leaves existing files as they were
+    with pytest.raises(RuntimeError):
+        with TidWriter(output_file, sidecar=True) as writer:
+            writer.write(series)
+            raise RuntimeError("interrupted")
+    with pytest.raises(RuntimeError):
+        with TidWriter(output_file, append=True, sidecar=True) as writer:
+            writer.write(series[300:])
+            raise RuntimeError("interrupted")
+
+    assert output_file.read_bytes() == original
+    assert sidecar_path(output_file).read_bytes() == original_sidecar
+    assert sorted(p.name for p in tmp_path.iterdir()) == \
+        ["test.tid", "test.tid.npy"]
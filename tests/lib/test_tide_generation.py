@@ -0,0 +1,457 @@
+from datetime import datetime
+from pathlib import Path
+import json
+import multiprocessing
+import shutil
+import types
+import numpy as np
+import pytest
+
+from benchmarks import fake_pyfes
+from tidetool.lib import profiling, tide_file, tide_generation, tides
+from tidetool.lib.fes_config import read_fes_config
+from tidetool.lib.tide_file import read_tid_file
+from tidetool.lib.tide_generation import MAX_OPEN_FILES, TideGenerator
+from tidetool.lib.tide_netcdf import read_tide_netcdf, \
+    read_tide_netcdf_stations
+from tidetool.lib.tide_series import TideSeries, generate_dates_between
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """ Replaces pyfes with the fake pyfes module of the benchmarks, returns
+    the list of handlers created.
+    """
+    created = []
+
+    class Handler(fake_pyfes.Handler):
+        def __init__(self, *args) -> None:
+            super().__init__(*args)
+            self.calls = 0
+            # number of points predicted
+            self.points = 0
+            created.append(self)
+
+        def calculate(self, lon, *args, **kwargs):
+            self.calls += 1
+            self.points += len(lon)
+            return super().calculate(lon, *args, **kwargs)
+
+    monkeypatch.setattr(fake_pyfes, 'HANDLER_COST', 0.0)
+    monkeypatch.setattr(fake_pyfes, 'CALL_COST', 0.0)
+    monkeypatch.setattr(tides, 'pyfes', types.SimpleNamespace(Handler=Handler))
+    return created
+
+
+def _data_folder(tmp_path):
+    folder = tmp_path.joinpath('fes')
+    folder.mkdir()
+    folder.joinpath('ocean_tide.ini').write_text("")
+    folder.joinpath('load_tide.ini').write_text("")
+    return folder
+
+
+def _write_zdf(path, count):
+    lines = ["[ZONE_DEF_VERSION_3]", "", "[TIDE_STATION]"]
+    lines.extend(
+        f"station_{i:04d},{-10.0 - i * 0.01:.4f},{130.0 + i * 0.01:.4f},"
+        f"0.0,0.01,station_{i:04d}.tid"
+        for i in range(count)
+    )
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_tide_model_reuses_handlers(handlers, tmp_path):
+    model = tides.TideModel.from_data_folder(_data_folder(tmp_path))
+    assert [h.tide_type for h in handlers] == ['ocean', 'radial']
+
+    for latitude in [-10.0, -11.0, -12.0]:
+        model.get_tide_data(
+            datetime(2005, 1, 1), datetime(2005, 1, 2), latitude, 130.0, 10)
+    assert len(handlers) == 2
+    assert [h.calls for h in handlers] == [3, 3]
+
+
+def test_generator_reuses_handlers(handlers, tmp_path):
+    zdf = tmp_path.joinpath('zone.zdf')
+    _write_zdf(zdf, 5)
+
+    tg = TideGenerator(_data_folder(tmp_path))
+    tg.generate_tides_from_zdf(
+        zdf, datetime(2005, 1, 1), datetime(2005, 1, 2), 10)
+
+    # one ocean and one radial handler for the whole run, not per station
+    assert len(handlers) == 2
+    for i in range(5):
+        series = read_tid_file(tmp_path.joinpath(f"station_{i:04d}.tid"))
+        assert len(series.times) == 144
+
+
+def test_generator_many_stations_short_range(handlers, tmp_path, monkeypatch):
+    # a short date range gives a large group of stations, the files open
+    # while a group is written are limited by MAX_OPEN_FILES
+    zdf = tmp_path.joinpath('zone.zdf')
+    _write_zdf(zdf, 600)
+
+    # writers open at once
+    open_writers = []
+    peak = [0]
+    writer_init = tide_file.TidWriter.__init__
+    writer_close = tide_file.TidWriter.close
+
+    def init(self, *args, **kwargs):
+        writer_init(self, *args, **kwargs)
+        open_writers.append(self)
+        peak[0] = max(peak[0], len(open_writers))
+
+    def close(self):
+        writer_close(self)
+        open_writers.remove(self)
+
+    monkeypatch.setattr(tide_file.TidWriter, '__init__', init)
+    monkeypatch.setattr(tide_file.TidWriter, 'close', close)
+
+    tg = TideGenerator(_data_folder(tmp_path))
+    tg.sidecar = True
+    tg.cache_folder = tmp_path.joinpath('cache')
+    tg.cache_size = 64 * 1024 * 1024
+
+    def generate():
+        tg.generate_tides_from_zdf(
+            zdf, datetime(2005, 1, 1), datetime(2005, 1, 2), 10)
+
+    try:
+        import resource
+    except ImportError:
+        # windows, only the open writers are checked
+        generate()
+    else:
+        # writing every station at once would need over 1800 files
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(512, hard), hard))
+        try:
+            generate()
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    # each writer has a tide file, sidecar and cache entry open
+    assert peak[0] <= MAX_OPEN_FILES // 3
+    assert len(list(tmp_path.glob('station_*.tid'))) == 600
+    assert len(read_tid_file(tmp_path.joinpath('station_0599.tid'))) == 144
+
+
+def _generate_folder(folder, data_folder, count, start, end, **options):
+    """ Generates the tide files of count stations in folder, returns the
+    contents of each tide file.
+    """
+    folder.mkdir()
+    zdf = folder.joinpath('zone.zdf')
+    _write_zdf(zdf, count)
+    tg = TideGenerator(data_folder)
+    for name, value in options.items():
+        setattr(tg, name, value)
+    tg.generate_tides_from_zdf(zdf, start, end, 10)
+    return [
+        folder.joinpath(f"station_{i:04d}.tid").read_bytes()
+        for i in range(count)
+    ]
+
+
+def test_generator_groups_and_windows(handlers, tmp_path, monkeypatch):
+    data_folder = _data_folder(tmp_path)
+    start, end = datetime(2005, 1, 1), datetime(2005, 1, 3)
+    expected = _generate_folder(
+        tmp_path.joinpath('single'), data_folder, 10, start, end)
+    assert [h.calls for h in handlers] == [1, 1]
+
+    # 288 dates in windows of 50, with 4 stations (200 points) per call
+    monkeypatch.setattr(tide_generation, 'MAX_POINTS_PER_CALL', 200)
+    monkeypatch.setattr(tides, 'MAX_POINTS_PER_CALL', 200)
+    del handlers[:]
+    batched = _generate_folder(
+        tmp_path.joinpath('batched'), data_folder, 10, start, end,
+        chunk_size=50)
+    # 3 groups of stations, each predicted in 6 windows
+    assert [h.calls for h in handlers] == [18, 18]
+
+    assert batched == expected
+    dates = generate_dates_between(start, end, 10)
+    for i in [0, 5, 9]:
+        series = read_tid_file(tmp_path.joinpath(
+            'batched', f"station_{i:04d}.tid"))
+        assert (series.times == dates).all()
+
+
+def test_generator_formats_timestamps_once(handlers, tmp_path, monkeypatch):
+    formatted = []
+
+    def format_timestamps(dates):
+        formatted.append(len(dates))
+        return tide_file.format_timestamps(dates)
+
+    monkeypatch.setattr(
+        tide_generation, 'format_timestamps', format_timestamps)
+    monkeypatch.setattr(tide_generation, 'MAX_POINTS_PER_CALL', 200)
+    _generate_folder(
+        tmp_path.joinpath('out'), _data_folder(tmp_path), 10,
+        datetime(2005, 1, 1), datetime(2005, 1, 3), chunk_size=50)
+
+    # each of the 6 windows is formatted once, not once per group
+    assert formatted == [50, 50, 50, 50, 50, 38]
+
+
+def test_generator_workers(handlers, tmp_path):
+    if multiprocessing.get_start_method() != 'fork':
+        pytest.skip("worker processes only use the fake pyfes when forked")
+    data_folder = _data_folder(tmp_path)
+    start, end = datetime(2005, 1, 1), datetime(2005, 1, 3)
+
+    def generate(name, workers):
+        messages = []
+        with profiling.profile_run(tmp_path.joinpath(f"{name}.json")):
+            files = _generate_folder(
+                tmp_path.joinpath(name), data_folder, 20, start, end,
+                workers=workers,
+                cache_folder=tmp_path.joinpath(f"{name}_cache"),
+                cache_size=64 * 1024 * 1024,
+                log_function=messages.append)
+        report = json.loads(tmp_path.joinpath(f"{name}.json").read_text())
+        # messages other than the progress of each file
+        summary = [m for m in messages if not m.startswith("Generating")]
+        return files, summary, report
+
+    serial, serial_summary, serial_report = generate('serial', 1)
+    parallel, parallel_summary, parallel_report = generate('parallel', 2)
+    assert parallel == serial
+    assert parallel_summary == serial_summary
+    assert "Prediction cache: 0 hits, 20 misses" in parallel_summary
+    # worker profiles are merged into the report
+    assert parallel_report['points'] == serial_report['points'] == 20 * 288
+
+    # predictions cached by the workers are used by the next run
+    for name in ['serial', 'parallel']:
+        shutil.rmtree(tmp_path.joinpath(name))
+    _, serial_summary, _ = generate('serial', 1)
+    _, parallel_summary, _ = generate('parallel', 2)
+    assert parallel_summary == serial_summary
+    assert "Prediction cache: 20 hits, 0 misses" in parallel_summary
+
+
+def test_generator_shared_locations(handlers, tmp_path):
+    zdf = tmp_path.joinpath('zone.zdf')
+    # five stations at three locations
+    zdf.write_text("\n".join([
+        "[ZONE_DEF_VERSION_3]", "", "[TIDE_STATION]",
+        "a,-10.0000,130.0000,0.0,0.01,a.tid",
+        "b,-11.0000,131.0000,0.0,0.01,b.tid",
+        "c,-10.0000,130.0000,0.0,0.01,c.tid",
+        "d,-12.0000,132.0000,0.0,0.01,d.tid",
+        "e,-10.0000,130.0000,0.0,0.01,e.tid",
+    ]) + "\n")
+
+    messages = []
+    tg = TideGenerator(_data_folder(tmp_path))
+    tg.log_function = messages.append
+    tg.generate_tides_from_zdf(
+        zdf, datetime(2005, 1, 1), datetime(2005, 1, 2), 10)
+
+    # each location is predicted once, and written to all its tide files
+    assert [h.points for h in handlers] == [3 * 144, 3 * 144]
+    contents = {
+        name: tmp_path.joinpath(f"{name}.tid").read_bytes()
+        for name in "abcde"
+    }
+    assert contents['a'] == contents['c'] == contents['e']
+    assert contents['a'] != contents['b']
+    assert len(read_tid_file(tmp_path.joinpath('e.tid'))) == 144
+    assert "Predicted tide data for 3 locations, 2 predictions saved by " \
+        "tide stations sharing a location" in messages
+
+
+def test_generator_extend(handlers, tmp_path):
+    data_folder = _data_folder(tmp_path)
+    start = datetime(2005, 1, 1)
+    expected = _generate_folder(
+        tmp_path.joinpath('full'), data_folder, 2, start,
+        datetime(2005, 1, 3))
+
+    folder = tmp_path.joinpath('extended')
+    _generate_folder(folder, data_folder, 2, start, datetime(2005, 1, 2))
+    messages = []
+    tg = TideGenerator(data_folder)
+    tg.extend = True
+    tg.log_function = messages.append
+    tg.generate_tides_from_zdf(
+        folder.joinpath('zone.zdf'), start, datetime(2005, 1, 3), 10)
+
+    # the missing day is appended, without repeating the last line
+    for i, contents in enumerate(expected):
+        assert folder.joinpath(f"station_{i:04d}.tid").read_bytes() == \
+            contents
+    assert "Extended 2 tide files, 0 already up to date, 0 could not be " \
+        "extended" in messages
+
+
+def test_generator_extend_skipped(handlers, tmp_path):
+    data_folder = _data_folder(tmp_path)
+    start = datetime(2005, 1, 1)
+    folder = tmp_path.joinpath('out')
+    _generate_folder(folder, data_folder, 4, start, datetime(2005, 1, 2))
+
+    def write(i, dates):
+        tide_file.write_tid_file(
+            folder.joinpath(f"station_{i:04d}.tid"),
+            TideSeries(dates, np.zeros(len(dates))))
+
+    # 30 minute time period
+    write(1, generate_dates_between(start, datetime(2005, 1, 2), 30))
+    # not contiguous, the last line is an hour after the one before it
+    dates = generate_dates_between(start, datetime(2005, 1, 2), 10)
+    write(2, np.append(dates, dates[-1] + np.timedelta64(60, 'm')))
+    # the last line is incomplete
+    path = folder.joinpath('station_0003.tid')
+    path.write_bytes(path.read_bytes()[:-4])
+
+    before = [
+        folder.joinpath(f"station_{i:04d}.tid").read_bytes()
+        for i in range(4)
+    ]
+    messages = []
+    tg = TideGenerator(data_folder)
+    tg.extend = True
+    tg.log_function = messages.append
+    tg.generate_tides_from_zdf(
+        folder.joinpath('zone.zdf'), start, datetime(2005, 1, 3), 10)
+
+    # only the first file is extended, the others are reported and left
+    # as they were
+    assert len(read_tid_file(folder.joinpath('station_0000.tid'))) == 288
+    for i in range(1, 4):
+        assert folder.joinpath(f"station_{i:04d}.tid").read_bytes() == \
+            before[i]
+    skipped = [m for m in messages if m.startswith("Can't extend")]
+    assert len(skipped) == 3
+    assert "Extended 1 tide files, 0 already up to date, 3 could not be " \
+        "extended" in messages
+
+
+def test_generator_model_step(handlers, tmp_path):
+    data_folder = _data_folder(tmp_path)
+    start, end = datetime(2005, 1, 1), datetime(2005, 1, 3)
+    _generate_folder(tmp_path.joinpath('direct'), data_folder, 5, start, end)
+    assert [h.points for h in handlers] == [5 * 288, 5 * 288]
+
+    del handlers[:]
+    _generate_folder(
+        tmp_path.joinpath('interpolated'), data_folder, 5, start, end,
+        model_step=30)
+    # the model is evaluated every 30 minutes (plus the interpolation
+    # checks), rather than every 10
+    assert all(h.points < 5 * 288 / 2 for h in handlers)
+
+    tolerance = tide_generation.DEFAULT_INTERPOLATION_TOLERANCE / 100
+    for i in range(5):
+        name = f"station_{i:04d}.tid"
+        direct = read_tid_file(tmp_path.joinpath('direct', name))
+        interpolated = read_tid_file(tmp_path.joinpath('interpolated', name))
+        assert np.array_equal(interpolated.times, direct.times)
+        # heights in the tide files are rounded to the nearest cm
+        error = np.abs(interpolated.heights - direct.heights).max()
+        assert error <= tolerance + 0.01
+
+
+def test_generator_regional_grids(handlers, tmp_path):
+    netCDF4 = pytest.importorskip('netCDF4')
+    data_folder = tmp_path.joinpath('fes')
+    data_folder.joinpath('grids').mkdir(parents=True)
+    for name in ['ocean_tide', 'load_tide']:
+        with netCDF4.Dataset(
+                data_folder.joinpath('grids', f"{name}_m2.nc"), 'w') as grid:
+            grid.createDimension('lat', 361)
+            grid.createDimension('lon', 720)
+            grid.createVariable('lat', 'f8', ('lat',))[:] = \
+                np.arange(-90.0, 90.5, 0.5)
+            grid.createVariable('lon', 'f8', ('lon',))[:] = \
+                np.arange(0.0, 360.0, 0.5)
+            grid.createVariable('amplitude', 'f4', ('lat', 'lon'))[:] = 1.0
+        data_folder.joinpath(f"{name}.ini").write_text(
+            f"TIDE_M2_FILE = grids/{name}_m2.nc\n"
+            "TIDE_M2_LATITUDE = lat\n"
+            "TIDE_M2_LONGITUDE = lon\n"
+        )
+    start, end = datetime(2005, 1, 1), datetime(2005, 1, 2)
+    expected = _generate_folder(
+        tmp_path.joinpath('global'), data_folder, 5, start, end)
+
+    del handlers[:]
+    cache_folder = tmp_path.joinpath('cache')
+    messages = []
+    regional = _generate_folder(
+        tmp_path.joinpath('regional'), data_folder, 5, start, end,
+        regional_grids=True, region_margin=1.0, cache_folder=cache_folder,
+        log_function=messages.append)
+    assert regional == expected
+    assert any(
+        m.startswith("Using regional AVISO FES grids") for m in messages)
+
+    # the handlers load the cropped grids into memory
+    folder, = cache_folder.joinpath('regional_grids').iterdir()
+    assert [h.mode for h in handlers] == ['memory', 'memory']
+    for handler, name in zip(handlers, ['ocean_tide', 'load_tide']):
+        config = read_fes_config(Path(handler.path))
+        assert Path(config['TIDE_M2_FILE']) == \
+            folder.joinpath(name, f"{name}_m2.nc")
+    with netCDF4.Dataset(folder.joinpath('ocean_tide', 'ocean_tide_m2.nc')) \
+            as grid:
+        # stations are between 10 and 10.04 S, 130 and 130.04 E
+        assert grid['lat'][0] >= -12.0 and grid['lat'][-1] <= -9.0
+        assert grid['lon'][0] >= 128.0 and grid['lon'][-1] <= 132.0
+
+
+def test_generator_netcdf_file(handlers, tmp_path):
+    pytest.importorskip('netCDF4')
+    folder = tmp_path.joinpath('out')
+    netcdf_file = tmp_path.joinpath('tides.nc')
+    _generate_folder(
+        folder, _data_folder(tmp_path), 5,
+        datetime(2005, 1, 1), datetime(2005, 1, 3),
+        netcdf_file=netcdf_file)
+
+    stations = read_tide_netcdf_stations(netcdf_file)
+    assert [s[0] for s in stations] == [f"station_{i:04d}" for i in range(5)]
+    for i, (name, _, _, tide_file) in enumerate(stations):
+        assert tide_file == f"out/{name}.tid"
+        series = read_tid_file(tmp_path.joinpath(tide_file))
+        netcdf_series = read_tide_netcdf(netcdf_file, i)
+        assert np.array_equal(netcdf_series.times, series.times)
+        # tide file heights are rounded to the nearest cm, NetCDF heights
+        # are kept to the nearest mm
+        assert np.abs(netcdf_series.heights - series.heights).max() <= 0.006
+
+    # the sidecars written for the NetCDF file aren't kept
+    assert list(folder.glob('*.npy')) == []
+
+
+def test_generator_netcdf_file_keeps_sidecars(handlers, tmp_path):
+    pytest.importorskip('netCDF4')
+    data_folder = _data_folder(tmp_path)
+    start, end = datetime(2005, 1, 1), datetime(2005, 1, 2)
+    folder = tmp_path.joinpath('out')
+    _generate_folder(folder, data_folder, 3, start, end, sidecar=True)
+    # one of the tide files was written without a sidecar
+    tide_file.sidecar_path(folder.joinpath('station_0002.tid')).unlink()
+
+    tg = TideGenerator(data_folder)
+    tg.overwrite = True
+    tg.netcdf_file = tmp_path.joinpath('tides.nc')
+    tg.generate_tides_from_zdf(folder.joinpath('zone.zdf'), start, end, 10)
+
+    # only the sidecar created for the NetCDF file is removed, sidecars
+    # from the earlier run are rewritten and kept
+    assert sorted(p.name for p in folder.glob('*.npy')) == [
+        'station_0000.tid.npy', 'station_0001.tid.npy']
+    for i in range(2):
+        path = folder.joinpath(f"station_{i:04d}.tid")
+        sidecar = tide_file.read_tid_sidecar(path)
+        series = read_tid_file(path, use_sidecar=False)
+        assert np.array_equal(sidecar.times, series.times)
@@ -0,0 +1,128 @@
+from datetime import datetime
+import numpy as np
+import pytest
+
+from tidetool.lib.tide_grid import TideGrid, generate_tide_grid, \
+    grid_metadata_path, points_in_polygon, rasterize_zones, read_tide_grid
+from tidetool.lib.tide_series import generate_dates_between
+from tidetool.lib.tides import BaseTideModel, TideSeries
+from tidetool.lib.zdf import ZdfZone
+
+
+def _zone(name, vertices):
+    zone = ZdfZone('ZONE')
+    zone.name = name
+    zone.vertex_count = len(vertices)
+    zone.vertices = vertices
+    return zone
+
+
+class _PositionTideModel(BaseTideModel):
+    """ Height is a function of the location and time, so misplaced
+    heights are caught.
+    """
+
+    def __init__(self) -> None:
+        self.calls = []
+
+
+    def calculate_stations(self, dates, locations):
+        self.calls.append(len(dates) * len(locations))
+        minutes = dates.astype('datetime64[m]').astype(np.int64)
+        for latitude, longitude in locations:
+            yield TideSeries(
+                dates,
+                latitude + longitude / 100 + (minutes % 1440) / 1440)
+
+
+def test_points_in_polygon():
+    # L shaped (concave) polygon
+    vertices = [(0, 0), (0, 2), (1, 2), (1, 1), (2, 1), (2, 0)]
+    lats = np.array([0.5, 0.5, 1.5, 1.5, -0.5, 0.5])
+    lons = np.array([0.5, 1.5, 0.5, 1.5, 0.5, 2.5])
+    assert points_in_polygon(lats, lons, vertices).tolist() == \
+        [True, True, True, False, False, False]
+
+
+def test_rasterize_zones():
+    zones = [
+        _zone('square', [(-10.0, 130.0), (-10.0, 131.0), (-9.0, 131.0),
+                         (-9.0, 130.0)]),
+        _zone('triangle', [(-12.0, 130.0), (-12.0, 131.0), (-11.0, 130.0)]),
+        # too few vertices to cover any nodes, but included in the grid
+        _zone('line', [(-13.0, 130.0), (-13.0, 131.0)]),
+    ]
+    grid = TideGrid.from_zones(zones, 0.25)
+    assert grid.shape == (17, 5)
+    assert grid.lat_start == -13.0 and grid.lon_start == 130.0
+
+    mask = rasterize_zones(grid, zones)
+    assert mask.shape == grid.shape
+    # nodes on the south and west edges of a zone are inside it, those on
+    # the north and east edges aren't
+    assert mask[12:16, 0:4].all()
+    assert mask[12:].sum() == 16
+    assert mask[4:9].sum(axis=1).tolist() == [4, 3, 2, 1, 0]
+    assert not mask[:4].any()
+    assert mask.sum() == 16 + 10
+
+
+def test_generate_tide_grid(tmp_path):
+    zones = [
+        _zone('a', [(-10.0, 130.0), (-10.0, 131.0), (-9.0, 131.0),
+                    (-9.0, 130.0)]),
+    ]
+    path = tmp_path.joinpath('grid.npy')
+    start = datetime(2005, 1, 1)
+    end = datetime(2005, 1, 3)
+
+    # small chunks so the grid is predicted in several windows, and (when a
+    # date of the grid exceeds the chunk) groups of nodes
+    for chunk_points in [200, 20]:
+        model = _PositionTideModel()
+        metadata = generate_tide_grid(
+            model, zones, 0.25, start, end, 10, path,
+            chunk_points=chunk_points)
+        assert max(model.calls) <= chunk_points
+        assert sum(model.calls) == 288 * 16
+        assert sorted(p.name for p in tmp_path.iterdir()) == \
+            ['grid.json', 'grid.npy']
+
+        grid_metadata, heights = read_tide_grid(path)
+        assert grid_metadata == metadata
+        assert metadata['nodes'] == 16
+        assert heights.shape == (288, 5, 5)
+        assert heights.dtype == np.float32
+
+        dates = generate_dates_between(start, end, 10)
+        minutes = dates.astype(np.int64)
+        lats = metadata['lat_start'] + np.arange(5) * metadata['resolution']
+        lons = metadata['lon_start'] + np.arange(5) * metadata['resolution']
+        expected = lats[2] + lons[3] / 100 + (minutes % 1440) / 1440
+        assert np.allclose(heights[:, 2, 3], expected, atol=1e-5)
+        # nodes on the north and east edges of the zone aren't predicted
+        assert np.isnan(heights[:, 4, :]).all()
+        assert np.isnan(heights[:, :, 4]).all()
+        assert np.isfinite(heights[:, 0:4, 0:4]).all()
+        del heights
+
+
+def test_generate_tide_grid_errors(tmp_path):
+    path = tmp_path.joinpath('grid.npy')
+    # falls between the nodes of a 1 degree grid
+    zones = [_zone('a', [(-9.9, 130.1), (-9.9, 130.2), (-9.8, 130.1)])]
+    with pytest.raises(ValueError):
+        generate_tide_grid(
+            _PositionTideModel(), zones, 1.0,
+            datetime(2005, 1, 1), datetime(2005, 1, 2), 10, path)
+
+    class _FailingModel(BaseTideModel):
+        def calculate_stations(self, dates, locations):
+            raise RuntimeError("prediction failed")
+
+    with pytest.raises(RuntimeError):
+        generate_tide_grid(
+            _FailingModel(), zones, 0.01,
+            datetime(2005, 1, 1), datetime(2005, 1, 2), 10, path)
+    assert list(tmp_path.iterdir()) == []
+    assert not grid_metadata_path(path).exists()
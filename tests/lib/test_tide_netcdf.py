@@ -0,0 +1,86 @@
+from datetime import datetime
+import numpy as np
+import pytest
+
+from tidetool.lib.tide_file import write_tid_file
+from tidetool.lib.tide_series import TideSeries, generate_dates_between
+from tidetool.lib.tide_netcdf import TideNetcdfWriter, read_tide_netcdf, \
+    read_tide_netcdf_stations, read_tide_netcdf_window, \
+    write_tide_netcdf_from_sidecars
+
+
+pytest.importorskip('netCDF4')
+
+
+STATIONS = [
+    ('tide01', -11.223203, 134.741672, 'ga0276_01_msl.tid'),
+    ('tide03', -10.954652, 136.787012, 'ga0276_03_msl.tid'),
+]
+
+
+def _heights(count: int) -> np.ndarray:
+    return np.array([
+        np.sin(np.arange(count) * 0.01 + i) for i in range(len(STATIONS))
+    ])
+
+
+def test_tide_netcdf_writer(tmp_path):
+    path = tmp_path.joinpath('tides.nc')
+    start = datetime(2005, 1, 1)
+    heights = _heights(1000)
+
+    with TideNetcdfWriter(path, STATIONS, start, 10, 1000) as writer:
+        # written in windows, as the tide tool does
+        writer.write(0, 0, heights[:, :600])
+        writer.write(0, 600, heights[:, 600:])
+
+    assert read_tide_netcdf_stations(path) == STATIONS
+    dates = generate_dates_between(start, datetime(2005, 1, 7, 22, 40), 10)
+
+    series = read_tide_netcdf(path, 'tide03')
+    assert np.array_equal(series.times, dates)
+    assert np.allclose(series.heights, heights[1], atol=0.001)
+
+    # a time slice of one station, and of all stations
+    series = read_tide_netcdf(
+        path, 0, datetime(2005, 1, 1, 0, 5), datetime(2005, 1, 1, 1, 0))
+    assert np.array_equal(series.times, dates[1:7])
+    assert np.allclose(series.heights, heights[0, 1:7], atol=0.001)
+    times, window = read_tide_netcdf_window(
+        path, datetime(2005, 1, 2), datetime(2005, 1, 3))
+    assert np.array_equal(times, dates[144:289])
+    assert np.allclose(window, heights[:, 144:289], atol=0.001)
+
+    with pytest.raises(ValueError):
+        read_tide_netcdf(path, 'tide02')
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_tide_netcdf_writer_discard(tmp_path):
+    path = tmp_path.joinpath('tides.nc')
+    with pytest.raises(RuntimeError):
+        with TideNetcdfWriter(path, STATIONS, datetime(2005, 1, 1), 10, 10):
+            raise RuntimeError("interrupted")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_write_tide_netcdf_from_sidecars(tmp_path):
+    start = datetime(2005, 1, 1)
+    dates = generate_dates_between(start, datetime(2005, 1, 8), 10)
+    heights = _heights(len(dates))
+    tide_files = []
+    for station, station_heights in zip(STATIONS, heights):
+        tide_files.append(tmp_path.joinpath(station[3]))
+        write_tid_file(
+            tide_files[-1], TideSeries(dates, station_heights), sidecar=True)
+
+    path = tmp_path.joinpath('tides.nc')
+    write_tide_netcdf_from_sidecars(
+        path, STATIONS, tide_files, start, 10, len(dates))
+    times, window = read_tide_netcdf_window(path)
+    assert np.array_equal(times, dates)
+    assert np.allclose(window, heights, atol=0.001)
+
+    with pytest.raises(ValueError):
+        write_tide_netcdf_from_sidecars(
+            path, STATIONS, tide_files, start, 10, len(dates) + 1)
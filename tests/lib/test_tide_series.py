@@ -0,0 +1,65 @@
+from datetime import datetime
+import numpy as np
+import pytest
+
+from tidetool.lib.tide_series import TideSeries, generate_dates_between
+
+
+def _series(count=100):
+    dates = generate_dates_between(
+        datetime(2005, 1, 1), datetime(2006, 1, 1), 10)[:count]
+    return TideSeries(dates, np.linspace(-1, 1, count))
+
+
+def test_tide_series_iter():
+    series = _series()
+    items = list(series)
+
+    assert len(items) == len(series) == 100
+    assert items[0] == (datetime(2005, 1, 1), -1.0)
+    assert items[-1] == (datetime(2005, 1, 1, 16, 30), 1.0)
+    assert all(isinstance(h, float) for _, h in items)
+
+
+def test_tide_series_iter_blocks():
+    # more than one block of tuples is created while iterating
+    series = _series(25_000)
+    items = list(series)
+
+    assert len(items) == 25_000
+    assert items[12_345] == series[12_345]
+
+
+def test_tide_series_getitem():
+    series = _series()
+
+    assert series[1] == (datetime(2005, 1, 1, 0, 10), series.heights[1])
+    assert series[-1][0] == datetime(2005, 1, 1, 16, 30)
+
+    window = series[10:20]
+    assert isinstance(window, TideSeries)
+    assert len(window) == 10
+    assert np.shares_memory(window.heights, series.heights)
+
+
+def test_tide_series_float32():
+    series = _series()
+    compact = series.astype(np.float32)
+
+    assert compact.heights.dtype == np.float32
+    assert compact.times is series.times
+    assert compact.heights.nbytes == series.heights.nbytes // 2
+    assert np.allclose(compact.heights, series.heights)
+
+    series = TideSeries(series.times, series.heights, dtype=np.float32)
+    assert series.heights.dtype == np.float32
+
+
+def test_tide_series_invalid():
+    dates = generate_dates_between(
+        datetime(2005, 1, 1), datetime(2005, 1, 2), 10)
+
+    with pytest.raises(ValueError):
+        TideSeries(dates, np.zeros(10))
+    with pytest.raises(ValueError):
+        TideSeries(np.arange(144), np.zeros(144))
@@ -0,0 +1,117 @@
+from datetime import datetime
+import csv
+import numpy as np
+import pytest
+
+from tidetool.lib.tide_series import generate_dates_between
+from tidetool.lib.tide_stats import TideStats, compute_tide_stats, \
+    default_end_date, write_tide_stats_csv, HISTOGRAM_BIN_SIZE
+from tidetool.lib.tides import BaseTideModel, TideSeries
+
+
+class _SineTideModel(BaseTideModel):
+    """ Semi-diurnal tide with a spring / neap cycle, the amplitude and
+    mean level depend on the latitude.
+    """
+
+    def __init__(self) -> None:
+        self.calls = []
+        self.points = []
+
+
+    def calculate_stations(self, dates, locations):
+        self.calls.append(len(dates))
+        self.points.append(len(dates) * len(locations))
+        hours = dates.astype('datetime64[m]').astype(np.int64) / 60
+        for latitude, _ in locations:
+            yield TideSeries(
+                dates,
+                latitude / 10
+                + np.cos(hours * 2 * np.pi / 12.42)
+                + 0.3 * np.cos(hours * 2 * np.pi / 12.0))
+
+
+def test_tide_stats_update():
+    dates = generate_dates_between(
+        datetime(2005, 1, 1), datetime(2005, 3, 1), 10)
+    heights = np.sin(np.arange(len(dates)) * 0.001) * 2 + 0.5
+
+    stats = TideStats(histogram=True)
+    # updated in uneven windows, as when the date range isn't a multiple
+    # of the chunk size
+    for first, last in [(0, 1000), (1000, 1001), (1001, len(dates))]:
+        stats.update(TideSeries(dates[first:last], heights[first:last]))
+
+    assert stats.count == len(dates)
+    assert stats.min == heights.min()
+    assert stats.min_time == dates[np.argmin(heights)]
+    assert stats.max == heights.max()
+    assert stats.max_time == dates[np.argmax(heights)]
+    assert stats.range == pytest.approx(heights.max() - heights.min())
+    assert stats.mean == pytest.approx(heights.mean())
+    assert stats.std == pytest.approx(heights.std())
+    for q in [0, 1, 50, 99, 100]:
+        assert abs(stats.percentile(q) - np.percentile(heights, q)) <= \
+            HISTOGRAM_BIN_SIZE
+
+    with pytest.raises(ValueError):
+        TideStats().percentile(50)
+
+
+def test_compute_tide_stats(tmp_path):
+    start = datetime(2005, 1, 1)
+    end = datetime(2005, 3, 1)
+    # the second station shares the location of the first
+    locations = [(-10.0, 130.0), (-10.0, 130.0), (-12.0, 131.0)]
+    model = _SineTideModel()
+
+    stats = compute_tide_stats(
+        model, locations, start, end, 10, histogram=True, chunk=1000)
+    dates = generate_dates_between(start, end, 10)
+    assert max(model.calls) <= 1000
+    assert sum(model.calls) == len(dates)
+    assert stats[0] is stats[1]
+
+    expected = next(model.calculate_stations(dates, [locations[2]])).heights
+    assert stats[2].count == len(dates)
+    assert stats[2].min == pytest.approx(expected.min())
+    assert stats[2].max == pytest.approx(expected.max())
+    assert stats[2].mean == pytest.approx(expected.mean())
+    assert stats[0].mean == pytest.approx(stats[2].mean + 0.2)
+
+    path = tmp_path.joinpath('stats.csv')
+    stations = [('tide01', -10.0, 130.0), ('tide02', -10.0, 130.0),
+                ('tide03', -12.0, 131.0)]
+    write_tide_stats_csv(path, stations, stats, [5, 50, 95])
+    with path.open(newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['station'] for row in rows] == ['tide01', 'tide02', 'tide03']
+    assert float(rows[2]['min']) == pytest.approx(expected.min(), abs=0.001)
+    assert rows[2]['min_time'] == str(dates[np.argmin(expected)])
+    assert float(rows[2]['p50']) == \
+        pytest.approx(np.percentile(expected, 50), abs=HISTOGRAM_BIN_SIZE)
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_compute_tide_stats_many_locations():
+    start = datetime(2005, 1, 1)
+    end = datetime(2005, 1, 15)
+    locations = [(-10.0 - i, 130.0) for i in range(7)]
+    model = _SineTideModel()
+
+    # each window of 1000 dates is predicted two locations at a time
+    stats = compute_tide_stats(
+        model, locations, start, end, 10, chunk=1000, chunk_points=2000)
+    dates = generate_dates_between(start, end, 10)
+    assert max(model.points) <= 2000
+    assert sum(model.points) == len(dates) * len(locations)
+
+    for (latitude, _), location_stats in zip(locations, stats):
+        assert location_stats.count == len(dates)
+        assert location_stats.mean == pytest.approx(
+            latitude / 10 + stats[0].mean + 1.0, abs=1e-9)
+
+
+def test_default_end_date():
+    end = default_end_date(datetime(2001, 1, 1))
+    assert end.year == 2019 and end.month == 8
@@ -1,15 +1,28 @@
 from datetime import datetime, timedelta
+import types
+import numpy as np
+import pytest
+
+from benchmarks import fake_pyfes
+from tidetool.lib import tides
+from tidetool.lib.harmonics import CONSTITUENT_NAMES, harmonic_basis
 from tidetool.lib.tides import \
-    _generate_annual_dates, _generate_dates_between
+    _generate_annual_dates, _generate_dates_between, generate_dates_between, \
+    iter_dates_between, \
+    BaseTideModel, HarmonicTideModel, InterpolatedTideModel, \
+    InterpolationError, INTERPOLATION_CHECK_SAMPLES, ThreadedTideModel, \
+    TideModel, TideSeries
 
 
 def test_dates_generation_annual():
     dates = _generate_annual_dates(2008, 10)
 
+    assert dates.dtype == np.dtype('datetime64[m]')
+
     # it's all within a year, so both start and
     # end dates should be 2008
-    assert dates[0].year == 2008
-    assert dates[-1].year == 2008
+    assert dates[0].astype(datetime).year == 2008
+    assert dates[-1].astype(datetime).year == 2008
 
     # if every ten minutes there should be this many
     # datetimes in the list
@@ -31,9 +44,191 @@ def test_dates_generation_between():
     end_date = datetime(2000, 1, 6)
     dates = _generate_dates_between(start_date, end_date, 60)
 
+    assert dates.dtype == np.dtype('datetime64[m]')
+
     # 5 days, every 60 minutes (hour)
     assert len(dates) == 5 * 24
 
     assert dates[0] == datetime(2000, 1, 1, 0, 0, 0)
     assert dates[1] == datetime(2000, 1, 1, 1, 0, 0)
     assert dates[-1] == datetime(2000, 1, 5, 23, 0, 0)
+
+
+def test_dates_generation_between_end_date():
+    # end date is exclusive, but any partial time period before the end
+    # date still gets a date (as when a year is given on the command line)
+    start_date = datetime(2005, 1, 1)
+    end_date = datetime(2005, 12, 31, 23, 59, 59)
+    dates = generate_dates_between(start_date, end_date, 10)
+
+    assert len(dates) == 6 * 24 * 365
+    assert dates[-1] == datetime(2005, 12, 31, 23, 50)
+
+    dates = generate_dates_between(start_date, start_date, 10)
+    assert len(dates) == 0
+
+
+def test_dates_generation_windows():
+    start_date = datetime(2000, 1, 1)
+    end_date = datetime(2000, 1, 6)
+    windows = list(iter_dates_between(start_date, end_date, 60, chunk=50))
+
+    assert [len(w) for w in windows] == [50, 50, 20]
+    assert np.array_equal(
+        np.concatenate(windows),
+        generate_dates_between(start_date, end_date, 60)
+    )
+
+
+class _SineTideModel(BaseTideModel):
+    """ Semi-diurnal tide with an amplitude of 1m, and a shallow water
+    constituent if shallow is True.
+    """
+
+    def __init__(self, shallow: bool = False) -> None:
+        self.shallow = shallow
+        self.points = 0
+        self.closed = False
+
+
+    def close(self):
+        self.closed = True
+
+
+    def calculate_stations(self, dates, locations):
+        self.points += len(dates) * len(locations)
+        hours = dates.astype('datetime64[m]').astype(np.int64) / 60
+        for latitude, _ in locations:
+            heights = np.cos(hours * 2 * np.pi / 12.42 + latitude)
+            if self.shallow:
+                heights += 0.3 * np.cos(hours * 2 * np.pi / 3.1)
+            yield TideSeries(dates, heights)
+
+
+def test_interpolated_tide_model():
+    start, end = datetime(2005, 1, 1), datetime(2005, 1, 3)
+    locations = [(-10.0, 130.0), (-12.0, 131.0)]
+    direct = _SineTideModel().get_tide_data_many(start, end, locations, 1)
+
+    inner = _SineTideModel()
+    model = InterpolatedTideModel(inner, 30)
+    interpolated = model.get_tide_data_many(start, end, locations, 1)
+
+    for d, i in zip(direct, interpolated):
+        assert np.array_equal(d.times, i.times)
+        assert np.abs(d.heights - i.heights).max() < 0.001
+    # the coarse dates, plus the samples checked against direct predictions
+    assert inner.points < 2 * (2 * 24 * 2 + 4 + INTERPOLATION_CHECK_SAMPLES)
+
+    # shallow water tides need a shorter step
+    model = InterpolatedTideModel(_SineTideModel(shallow=True), 120)
+    with pytest.raises(InterpolationError):
+        model.get_tide_data(start, end, -10.0, 130.0, 1)
+
+
+def test_threaded_tide_model():
+    start, end = datetime(2005, 1, 1), datetime(2005, 3, 1)
+    locations = [(-10.0, 130.0), (-12.0, 131.0)]
+    direct = _SineTideModel().get_tide_data_many(start, end, locations, 1)
+
+    models = []
+
+    def create_model():
+        models.append(_SineTideModel())
+        return models[-1]
+
+    model = ThreadedTideModel(create_model, 4, min_slice=1000)
+    threaded = model.get_tide_data_many(start, end, locations, 1)
+    model.close()
+
+    for d, t in zip(direct, threaded):
+        assert np.array_equal(d.times, t.times)
+        assert np.array_equal(d.heights, t.heights)
+    # each slice is predicted by one of (at most) 4 models
+    assert len(models) <= 4
+    assert sum(m.points for m in models) == len(direct[0]) * len(locations)
+
+    # short series aren't split
+    model = ThreadedTideModel(create_model, 4, min_slice=1000)
+    model.get_tide_data(start, datetime(2005, 1, 1, 12), -10.0, 130.0, 1)
+    assert models[-1].points == 720
+
+
+def test_tide_model_close():
+    start, end = datetime(2005, 1, 1), datetime(2005, 3, 1)
+    models = []
+
+    def create_model():
+        models.append(_SineTideModel())
+        return models[-1]
+
+    # closing the outer model shuts down the threads and closes the models
+    # used by them
+    with InterpolatedTideModel(
+            ThreadedTideModel(create_model, 4, min_slice=1000), 30) as model:
+        model.get_tide_data(start, end, -10.0, 130.0, 1)
+        assert model.model._executor is not None
+    assert model.model._executor is None
+    assert all(m.closed for m in models)
+
+
+class _ConstituentHandler(fake_pyfes.Handler):
+    """ Fake pyfes handler with a tide made up of the harmonic engine's
+    constituents (with nodal corrections), the amplitudes and phases
+    depend on the location. The long period tide of the fake handler is
+    close to, but not exactly, one of the constituents.
+    """
+
+    def calculate(self, lon, lat, dates, num_threads=0):
+        _, lp, _ = super().calculate(lon, lat, dates, num_threads)
+        count = len(CONSTITUENT_NAMES)
+        scale = 100.0 if self.tide_type == 'ocean' else 3.0
+        amplitudes = scale / (1 + np.arange(count))[:, np.newaxis] \
+            * (1.0 + 0.5 * np.cos(np.radians(lat)))
+        phases = np.radians(
+            np.arange(count)[:, np.newaxis] * 20.0 + lon + lat)
+        basis = harmonic_basis(np.asarray(dates).astype('datetime64[m]'))
+        tide = (amplitudes * np.cos(phases) * basis[:count]).sum(axis=0) \
+            + (amplitudes * np.sin(phases) * basis[count:-1]).sum(axis=0)
+        return tide, lp, np.zeros(len(tide), dtype=np.int32)
+
+
+def test_harmonic_tide_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(fake_pyfes, 'HANDLER_COST', 0.0)
+    monkeypatch.setattr(fake_pyfes, 'CALL_COST', 0.0)
+    monkeypatch.setattr(
+        tides, 'pyfes', types.SimpleNamespace(Handler=_ConstituentHandler))
+    data_folder = tmp_path.joinpath('fes')
+    data_folder.mkdir()
+    data_folder.joinpath('ocean_tide.ini').write_text("")
+    data_folder.joinpath('load_tide.ini').write_text("")
+
+    model = HarmonicTideModel.from_data_folder(
+        data_folder, tmp_path.joinpath('cache'))
+    store_reads = []
+    store_get = model.store.get
+
+    def get(latitude, longitude):
+        store_reads.append((latitude, longitude))
+        return store_get(latitude, longitude)
+
+    monkeypatch.setattr(model.store, 'get', get)
+
+    # years away from the period the constituents are fitted to, predicted
+    # in several windows
+    start, end = datetime(2031, 6, 1), datetime(2031, 6, 11)
+    locations = [(-10.0, 130.0), (-35.5, 150.2)]
+    fes = TideModel.from_data_folder(data_folder).get_tide_data_many(
+        start, end, locations, 10)
+    harmonic = [[], []]
+    for dates in iter_dates_between(start, end, 10, 500):
+        for i, series in enumerate(model.calculate_stations(dates, locations)):
+            harmonic[i].append(series.heights)
+
+    # the constituents match the FES path, apart from the part of the
+    # long period tide (up to 4.5 cm) they can't represent
+    for fes_series, heights in zip(fes, harmonic):
+        assert np.abs(np.concatenate(heights) - fes_series.heights).max() \
+            < 0.03
+    # constituents are read from the store once, then kept in memory
+    assert store_reads == locations
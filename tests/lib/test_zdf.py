@@ -1,7 +1,7 @@
 import pytest
 
 from tidetool.lib.zdf import ZdfParser, ZoneDefinitionFile, \
-    ZdfTideStation, ZdfParsingException
+    ZdfTideStation, ZdfParsingException, ZdfZone
 from tests.lib.mock_data import mock_data_01
 
 
@@ -56,6 +56,28 @@ def test_zdf_tidestation_exceptions():
         ts.from_strings(lines)
 
 
+def test_zdf_zone():
+    lines = [
+        "box01, 5",
+        "-10.434756, 134.454114",
+        "-10.434756, 135.845131",
+        "-11.5, 135.845131",
+    ]
+    zone = ZdfZone('ZONE')
+    zone.from_strings(lines)
+
+    assert zone.name == "box01"
+    # vertex count is kept as given, even when it doesn't match
+    assert zone.vertex_count == 5
+    assert zone.vertices[2] == (-11.5, 135.845131)
+    assert zone.to_strings() == lines
+
+    with pytest.raises(ZdfParsingException):
+        zone.from_strings(["box01, five", "-10.4, 134.4"])
+    with pytest.raises(ZdfParsingException):
+        zone.from_strings(["box01, 1", "-10.4, 134.4, 0.0"])
+
+
 def test_blocks_for_type():
     zdf = ZoneDefinitionFile(filename=None)
     parser = ZdfParser()
@@ -66,3 +88,59 @@ def test_blocks_for_type():
     assert len(zdf.get_blocks_by_type("ZONE")) == 2
     assert len(zdf.get_blocks_by_type("TIDE_STATION")) == 1
     assert len(zdf.get_blocks_by_type("FOO_BAR")) == 0
+
+
+def _write_zdf(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def test_zdf_read(tmp_path):
+    path = _write_zdf(tmp_path / "test.zdf", mock_data_01)
+    zdf = ZdfParser().read(path)
+
+    assert len(zdf.blocks) == 6
+    # blocks are only decoded when used
+    assert all("bytes" in repr(b) for b in zdf.blocks)
+
+    tide_stations = zdf.get_blocks_by_type("TIDE_STATION")
+    assert len(tide_stations) == 1
+    assert isinstance(tide_stations[0], ZdfTideStation)
+    assert tide_stations[0].data[1][5] == "ga0276_03_msl.tid"
+    assert repr(zdf.blocks[4]) == "type: TIDE_STATION, len: 2"
+
+    zones = zdf.get_blocks_by_type("ZONE")
+    assert len(zones) == 2
+    assert zones[1].to_strings() == [
+        "box03, 5",
+        "-10.434756, 135.845131",
+        "-10.434756, 139.670954",
+    ]
+    assert len(zdf.get_blocks_by_type("FOO_BAR")) == 0
+
+
+def test_zdf_read_matches_process_lines(tmp_path):
+    path = _write_zdf(tmp_path / "test.zdf", mock_data_01)
+    zdf = ZdfParser().read(path)
+
+    zdf_lines = ZoneDefinitionFile(filename=None)
+    parser = ZdfParser()
+    parser.zdf = zdf_lines
+    parser._process_lines(mock_data_01)
+
+    for block, block_lines in zip(zdf.blocks, zdf_lines.blocks):
+        assert block.type == block_lines.type
+        assert block.to_strings() == block_lines.to_strings()
+
+
+def test_zdf_read_lazy_exceptions(tmp_path):
+    lines = list(mock_data_01)
+    lines[21] = "tide03,-10.954652,136.787012,0.0,ga0276_03_msl.tid"
+    path = _write_zdf(tmp_path / "test.zdf", lines)
+
+    # reading succeeds, the bad block is only decoded when used
+    zdf = ZdfParser().read(path)
+    assert len(zdf.get_blocks_by_type("ZONE")) == 2
+
+    with pytest.raises(ZdfParsingException, match="line 20"):
+        zdf.get_blocks_by_type("TIDE_STATION")
@@ -0,0 +1,136 @@
+""" Module for finding the zdf files processed by a batch run, see
+`TideGenerator.generate_tides_from_zdfs`.
+
+The zdf files of a batch are given as glob patterns, or listed in a
+manifest file. Each line of a manifest is a zdf file, optionally followed
+by the start date, end date and time period used for that file;
+
+    # zdf file, start date, end date, time period (minutes)
+    block01/block01.zdf, 2005-01-01, 2005-06-30
+    block02/block02.zdf, 2005-03-01, 2005-09-30, 30
+    block03/block03.zdf
+
+Dates are given as YYYY-MM-DD, relative paths are relative to the folder
+containing the manifest. Files without a date range use the default range
+of the batch. Blank lines and lines starting with # are ignored.
+"""
+
+from datetime import datetime
+from glob import glob
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+
+MANIFEST_DATE_FORMAT = '%Y-%m-%d'
+
+
+class ZdfJob:
+    """ A zdf file along with the date range and time period (minutes) of
+    the tide files generated for it.
+    """
+
+    def __init__(
+            self,
+            zone_definition: Path,
+            start_date: datetime, end_date: datetime,
+            time_period: int) -> None:
+        self.zone_definition = zone_definition
+        self.start_date = start_date
+        self.end_date = end_date
+        self.time_period = time_period
+
+
+    def __repr__(self) -> str:
+        return (
+            f"ZdfJob({self.zone_definition}, {self.start_date} to "
+            f"{self.end_date}, {self.time_period} min)"
+        )
+
+
+def find_zdf_files(patterns: Iterable[str]) -> List[Path]:
+    """ Paths of the files matching the glob patterns (`**` matches any
+    number of folders). Each file is only included once, in the order the
+    patterns are given and sorted by name within a pattern.
+
+    Raises a ValueError if a pattern matches no files.
+    """
+    files = []
+    found = set()
+    for pattern in patterns:
+        matches = sorted(
+            Path(match).resolve()
+            for match in glob(str(pattern), recursive=True)
+            if Path(match).is_file()
+        )
+        if len(matches) == 0:
+            raise ValueError(f"No files match {pattern}")
+        for match in matches:
+            if match not in found:
+                found.add(match)
+                files.append(match)
+    return files
+
+
+def _parse_date(value: str, line_number: int) -> datetime:
+    try:
+        return datetime.strptime(value, MANIFEST_DATE_FORMAT)
+    except ValueError:
+        raise ValueError(
+            f"Invalid date '{value}' on line {line_number}, expected "
+            "YYYY-MM-DD")
+
+
+def read_manifest(
+        path: Path,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        time_period: int = 10) -> List[ZdfJob]:
+    """ Reads the jobs listed in a manifest file (see module docs).
+    start_date, end_date and time_period are used for zdf files listed
+    without their own.
+
+    Raises a ValueError if the manifest is invalid, or a zdf file has no
+    date range and no default range has been given.
+    """
+    path = Path(path)
+    jobs = []
+    for line_number, line in enumerate(path.read_text().splitlines(), 1):
+        line = line.strip()
+        if len(line) == 0 or line.startswith('#'):
+            continue
+
+        values = [value.strip() for value in line.split(',')]
+        if len(values) not in (1, 3, 4):
+            raise ValueError(
+                f"Expected a zdf file, start date, end date and (optional) "
+                f"time period on line {line_number} of {path}")
+
+        zone_definition = path.parent.joinpath(values[0]).resolve()
+        if not zone_definition.is_file():
+            raise ValueError(
+                f"File {zone_definition} on line {line_number} does not "
+                "exist")
+
+        job_start, job_end = start_date, end_date
+        if len(values) >= 3:
+            job_start = _parse_date(values[1], line_number)
+            job_end = _parse_date(values[2], line_number)
+        if job_start is None or job_end is None:
+            raise ValueError(
+                f"No date range given for {zone_definition} on line "
+                f"{line_number}")
+
+        job_time_period = time_period
+        if len(values) == 4:
+            try:
+                job_time_period = int(values[3])
+            except ValueError:
+                job_time_period = 0
+            if job_time_period < 1:
+                raise ValueError(
+                    f"Invalid time period '{values[3]}' on line "
+                    f"{line_number}")
+
+        jobs.append(ZdfJob(zone_definition, job_start, job_end, job_time_period))
+
+    return jobs
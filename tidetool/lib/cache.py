@@ -0,0 +1,274 @@
+""" Module for the on-disk caches used by the tide tool.
+
+Cached values are only valid for the AVISO FES configuration they were
+generated with, so all cache keys include a digest of the FES config files
+(see `config_digest`).
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+import hashlib
+import os
+import numpy as np
+
+from tidetool.lib.harmonics import CONSTITUENT_NAMES, HarmonicConstituents
+from tidetool.lib.tide_series import TideSeries, generate_dates_between
+
+
+def default_cache_folder() -> Path:
+    """ Folder used for cached data when one isn't specified, can be set
+    using the TIDETOOL_CACHE_FOLDER environment variable.
+    """
+    folder = os.environ.get('TIDETOOL_CACHE_FOLDER')
+    if folder is not None:
+        return Path(folder)
+    return Path.home().joinpath('.tidetool', 'cache')
+
+
+def config_digest(data_folder: Path) -> str:
+    """ Digest of the ocean_tide.ini and load_tide.ini config files found
+    in the AVISO FES data folder.
+    """
+    digest = hashlib.sha256()
+    for config_name in ['ocean_tide.ini', 'load_tide.ini']:
+        digest.update(data_folder.joinpath(config_name).read_bytes())
+    return digest.hexdigest()
+
+
+def _location_key(latitude: float, longitude: float) -> str:
+    return f"{latitude:.6f},{longitude:.6f}"
+
+
+class ConstituentStore:
+    """ On-disk store of the harmonic constituents extracted for each
+    location. Each location is saved in its own small npz file, named by a
+    hash of the location, the FES config digest and the constituent names
+    (so changes to the harmonic engine invalidate old entries).
+    """
+
+    def __init__(self, folder: Path, digest: str) -> None:
+        self.folder = folder
+        self.digest = digest
+
+
+    def _path(self, latitude: float, longitude: float) -> Path:
+        key = ":".join([
+            self.digest,
+            _location_key(latitude, longitude),
+            ",".join(CONSTITUENT_NAMES)
+        ])
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return self.folder.joinpath(name + '.npz')
+
+
+    def get(
+            self,
+            latitude: float,
+            longitude: float) -> Optional[HarmonicConstituents]:
+        """ Returns the constituents for the location, or None if they have
+        not been stored.
+        """
+        path = self._path(latitude, longitude)
+        if not path.exists():
+            return None
+
+        with np.load(path) as data:
+            return HarmonicConstituents(
+                data['amplitudes'], data['phases'], data['mean'])
+
+
+    def put(
+            self,
+            latitude: float,
+            longitude: float,
+            constituents: HarmonicConstituents) -> None:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        path = self._path(latitude, longitude)
+        # write to a temporary file first so a partially written file is
+        # never picked up by another process
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(
+            tmp_path,
+            amplitudes=constituents.amplitudes,
+            phases=constituents.phases,
+            mean=constituents.mean
+        )
+        os.replace(tmp_path, path)
+
+
+class _PredictionWriter:
+    """ Writes a cache entry incrementally, one window of the tide series at
+    a time (in date order). The entry is written to a temporary file that is
+    only moved into place by `commit`, so incomplete entries are never read
+    from the cache.
+    """
+
+    def __init__(
+            self,
+            cache: 'PredictionCache',
+            path: Path,
+            count: int) -> None:
+        self._cache = cache
+        self._path = path
+        self._tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+        self._heights = np.lib.format.open_memmap(
+            self._tmp_path, mode='w+', dtype=np.float64, shape=(count,))
+        # number of heights written so far
+        self._count = 0
+
+
+    def write(self, series: TideSeries) -> None:
+        last = self._count + len(series)
+        self._heights[self._count:last] = series.heights
+        self._count = last
+
+
+    def commit(self) -> None:
+        self._heights.flush()
+        del self._heights
+        os.replace(self._tmp_path, self._path)
+        self._cache._added(self._path)
+
+
+    def discard(self) -> None:
+        del self._heights
+        self._tmp_path.unlink()
+
+
+class PredictionCache:
+    """ On-disk cache of predicted tide heights. Entries are keyed by the
+    location, date range, time period, prediction engine and FES config
+    digest. Each entry is a npy file of float64 heights that is memory
+    mapped when read, the dates are not stored as they can be generated
+    from the key.
+
+    The total size of the cache is limited to max_size bytes, when it grows
+    beyond this the least recently used entries are removed. The folder is
+    only scanned for entries once, then whenever the entries added since
+    take the cache over max_size.
+    """
+
+    def __init__(self, folder: Path, digest: str, max_size: int) -> None:
+        self.folder = folder
+        self.digest = digest
+        self.max_size = max_size
+
+        # number of cache hits and misses, for reporting
+        self.hits = 0
+        self.misses = 0
+
+        # dates of the most recently read entry, entries for the same date
+        # range share a single dates array
+        self._dates_key = None
+        self._dates = None
+
+        # size (bytes) of the cache as of the last scan, plus the entries
+        # added since. None until the folder has been scanned.
+        self._size = None
+
+
+    def _path(
+            self,
+            latitude: float, longitude: float,
+            start_date: datetime, end_date: datetime,
+            time_period: int,
+            engine: str) -> Path:
+        key = ":".join([
+            self.digest,
+            _location_key(latitude, longitude),
+            start_date.isoformat(),
+            end_date.isoformat(),
+            str(time_period),
+            engine
+        ])
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return self.folder.joinpath(name + '.npy')
+
+
+    def get(
+            self,
+            latitude: float, longitude: float,
+            start_date: datetime, end_date: datetime,
+            time_period: int,
+            engine: str) -> Optional[TideSeries]:
+        """ Returns the cached tide series (heights are a read only memory
+        mapped array) or None if there is no cache entry.
+        """
+        path = self._path(
+            latitude, longitude, start_date, end_date, time_period, engine)
+        try:
+            heights = np.load(path, mmap_mode='r')
+            # modified time is used to track when the entry was last used
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return TideSeries(
+            self._get_dates(start_date, end_date, time_period), heights)
+
+
+    def _get_dates(
+            self,
+            start_date: datetime, end_date: datetime,
+            time_period: int) -> np.ndarray:
+        key = (start_date, end_date, time_period)
+        if key != self._dates_key:
+            self._dates = generate_dates_between(
+                start_date, end_date, time_period)
+            self._dates_key = key
+        return self._dates
+
+
+    def writer(
+            self,
+            latitude: float, longitude: float,
+            start_date: datetime, end_date: datetime,
+            time_period: int,
+            engine: str,
+            count: int) -> _PredictionWriter:
+        """ Returns a writer for a new cache entry of count heights """
+        self.folder.mkdir(parents=True, exist_ok=True)
+        path = self._path(
+            latitude, longitude, start_date, end_date, time_period, engine)
+        return _PredictionWriter(self, path, count)
+
+
+    def _added(self, path: Path) -> None:
+        """ Called when the entry at path is added to the cache """
+        if self._size is not None:
+            self._size += path.stat().st_size
+            if self._size <= self.max_size:
+                return
+        self.evict()
+
+
+    def evict(self) -> None:
+        """ Removes the least recently used entries until the cache is no
+        larger than max_size.
+        """
+        entries = []
+        for path in self.folder.glob('*.npy'):
+            if '.tmp' in path.suffixes:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                # removed by another process, or still in use (windows
+                # will not remove files that are memory mapped)
+                continue
+            total_size -= size
+        self._size = total_size
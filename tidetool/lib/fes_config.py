@@ -0,0 +1,357 @@
+""" Module for working with the AVISO FES config files, and the cropped
+(regional) copies of the FES grids used to speed up loading the model.
+
+The ocean_tide.ini and load_tide.ini config files list the NetCDF grid of
+each constituent, eg;
+
+    TIDE_M2_FILE = ./ocean_tide/m2.nc
+    TIDE_M2_LATITUDE = lat
+    TIDE_M2_LONGITUDE = lon
+    TIDE_M2_AMPLITUDE = amplitude
+    TIDE_M2_PHASE = phase
+
+The global FES2014 grids run to several GB, but all the tide stations of a
+survey fall within a small region. `regional_data_folder` crops every grid
+to the region around the stations and writes them, with rewritten config
+files, to a data folder in the cache. These are small enough for pyfes to
+load into memory, and are reused by later runs over the same region.
+
+Cropping the grids requires the netCDF4 package, it's only imported when
+a regional data folder is created.
+
+Relative grid paths in a config file are relative to the folder containing
+it, which pyfes doesn't always get right. Rather than changing the working
+directory (which would affect every thread of the process) `resolve_config`
+gives a copy of the config file with absolute grid paths.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import math
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+
+from tidetool.lib.cache import config_digest, default_cache_folder
+
+
+CONFIG_NAMES = ['ocean_tide.ini', 'load_tide.ini']
+
+# margin (degrees) added around the tide stations, FES interpolates from
+# the surrounding grid cells so this must be at least a few cells
+DEFAULT_REGION_MARGIN = 1.0
+
+# region bounds are rounded out to a multiple of this (degrees), so runs
+# over nearby stations share the same regional grids
+REGION_ALIGNMENT = 1.0
+
+
+def read_fes_config(path: Path) -> Dict[str, str]:
+    """ Reads the KEY = VALUE entries of an AVISO FES config file, in the
+    order they're given. Comments (starting with #) are ignored.
+    """
+    config = {}
+    for line in Path(path).read_text().splitlines():
+        line = line.split('#', 1)[0].strip()
+        if len(line) == 0:
+            continue
+        if '=' not in line:
+            raise ValueError(f"Invalid line in {path}: {line}")
+        key, value = line.split('=', 1)
+        config[key.strip()] = value.strip()
+    return config
+
+
+def _format_config(config: Dict[str, str]) -> str:
+    return "".join(f"{key} = {value}\n" for key, value in config.items())
+
+
+def write_fes_config(path: Path, config: Dict[str, str]) -> None:
+    path.write_text(_format_config(config))
+
+
+def config_grids(config: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+    """ Grids listed in a config, by constituent key (eg; TIDE_M2). Each
+    includes the file and the names of its latitude and longitude
+    variables.
+    """
+    grids = {}
+    for key, value in config.items():
+        if not key.endswith('_FILE'):
+            continue
+        name = key[:-len('_FILE')]
+        grids[name] = {
+            'file': value,
+            'latitude': config.get(f"{name}_LATITUDE", 'lat'),
+            'longitude': config.get(f"{name}_LONGITUDE", 'lon'),
+        }
+    return grids
+
+
+def _grid_path(config_path: Path, value: str) -> Path:
+    # file paths may use environment variables (eg; ${FES_DATA}), relative
+    # paths are relative to the folder of the config file
+    path = Path(os.path.expandvars(value))
+    if not path.is_absolute():
+        path = config_path.parent.joinpath(path)
+    return path
+
+
+def resolve_config(config_path: Path, folder: Optional[Path] = None) -> Path:
+    """ Path of a config file equivalent to the one at config_path, but with
+    absolute paths to all the grids. If any grid paths are relative a copy
+    of the config file is written to folder (the tidetool-configs folder
+    within the temp folder by default), otherwise config_path is returned.
+    """
+    config_path = Path(config_path).resolve()
+    config = read_fes_config(config_path)
+
+    relative = False
+    for name, grid in config_grids(config).items():
+        path = str(_grid_path(config_path, grid['file']))
+        if path != grid['file']:
+            config[f"{name}_FILE"] = path
+            relative = True
+    if not relative:
+        return config_path
+
+    # copies are named by their contents, so each is only written once and
+    # can be shared by any number of threads and processes
+    text = _format_config(config)
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+    if folder is None:
+        folder = Path(tempfile.gettempdir()).joinpath('tidetool-configs')
+    path = folder.joinpath(f"{config_path.stem}-{digest}.ini")
+    if not path.exists():
+        folder.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(
+            f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(text)
+        os.replace(tmp_path, path)
+    return path
+
+
+class Region:
+    """ Latitude and longitude bounds (degrees) of a region. Longitudes are
+    0 to 360 as used by the FES grids, the region may wrap across 0 in
+    which case lon_max is greater than 360.
+    """
+
+    def __init__(
+            self,
+            lat_min: float, lat_max: float,
+            lon_min: float, lon_max: float) -> None:
+        self.lat_min = lat_min
+        self.lat_max = lat_max
+        self.lon_min = lon_min
+        self.lon_max = lon_max
+
+
+    @classmethod
+    def from_locations(
+            cls,
+            locations: List[Tuple[float, float]],
+            margin: float = DEFAULT_REGION_MARGIN) -> 'Region':
+        """ Smallest region (rounded out to REGION_ALIGNMENT) containing
+        all the (latitude, longitude) locations plus the margin.
+        """
+        if len(locations) == 0:
+            raise ValueError("Can't create a region without locations")
+        latitudes = [lat for lat, _ in locations]
+        longitudes = sorted(lon % 360.0 for _, lon in locations)
+
+        # the region starts after the largest gap between longitudes, so a
+        # survey across 0 degrees isn't given a region around the globe
+        gaps = [
+            (longitudes[(i + 1) % len(longitudes)] - lon) % 360.0
+            for i, lon in enumerate(longitudes)
+        ]
+        start = (gaps.index(max(gaps)) + 1) % len(longitudes)
+        lon_min = longitudes[start]
+        lon_max = lon_min + 360.0 - max(gaps)
+        if len(longitudes) == 1:
+            lon_max = lon_min
+
+        def round_down(value):
+            return math.floor(value / REGION_ALIGNMENT) * REGION_ALIGNMENT
+
+        def round_up(value):
+            return math.ceil(value / REGION_ALIGNMENT) * REGION_ALIGNMENT
+
+        lon_min = round_down(lon_min - margin)
+        lon_max = round_up(lon_max + margin)
+        if lon_max - lon_min >= 360.0:
+            lon_min, lon_max = 0.0, 360.0
+        elif lon_min < 0:
+            lon_min += 360.0
+            lon_max += 360.0
+
+        return cls(
+            max(-90.0, round_down(min(latitudes) - margin)),
+            min(90.0, round_up(max(latitudes) + margin)),
+            lon_min, lon_max
+        )
+
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        if not self.lat_min <= latitude <= self.lat_max:
+            return False
+        return (longitude - self.lon_min) % 360.0 <= \
+            self.lon_max - self.lon_min
+
+
+    def key(self) -> str:
+        return (
+            f"{self.lat_min:.4f},{self.lat_max:.4f},"
+            f"{self.lon_min:.4f},{self.lon_max:.4f}"
+        )
+
+
+    def __repr__(self) -> str:
+        return (
+            f"Region(lat {self.lat_min} to {self.lat_max}, "
+            f"lon {self.lon_min} to {self.lon_max})"
+        )
+
+
+def _longitude_indices(longitudes, region: Region):
+    """ Indices of the grid longitudes within the region, in increasing
+    order of longitude from lon_min (wrapping around the grid if needed),
+    and their longitudes.
+    """
+    # longitudes relative to the start of the region, 0 to 360
+    relative = (np.asarray(longitudes) - region.lon_min) % 360.0
+    indices = np.flatnonzero(relative <= region.lon_max - region.lon_min)
+    indices = indices[np.argsort(relative[indices], kind='stable')]
+    return indices, region.lon_min + relative[indices]
+
+
+def crop_grid(
+        source: Path,
+        destination: Path,
+        latitude: str, longitude: str,
+        region: Region) -> None:
+    """ Writes a copy of the NetCDF grid at source cropped to the region.
+    Variables on the latitude and longitude dimensions are cropped, all
+    others are copied as they are.
+    """
+    try:
+        import netCDF4
+    except ImportError:
+        raise RuntimeError(
+            "The netCDF4 package is needed to create regional FES grids")
+
+    with netCDF4.Dataset(source) as src, \
+            netCDF4.Dataset(destination, 'w', format=src.data_model) as dst:
+        lats = src.variables[latitude][:]
+        lat_indices = np.flatnonzero(
+            (lats >= region.lat_min) & (lats <= region.lat_max))
+        lon_indices, lons = _longitude_indices(
+            src.variables[longitude][:], region)
+        if len(lat_indices) == 0 or len(lon_indices) == 0:
+            raise ValueError(f"{source} does not cover {region}")
+
+        lat_dim = src.variables[latitude].dimensions[0]
+        lon_dim = src.variables[longitude].dimensions[0]
+        sizes = {lat_dim: len(lat_indices), lon_dim: len(lon_indices)}
+
+        dst.setncatts({a: src.getncattr(a) for a in src.ncattrs()})
+        for name, dimension in src.dimensions.items():
+            size = sizes.get(name, len(dimension))
+            dst.createDimension(
+                name, None if dimension.isunlimited() else size)
+
+        for name, variable in src.variables.items():
+            attributes = {a: variable.getncattr(a) for a in variable.ncattrs()}
+            fill_value = attributes.pop('_FillValue', None)
+            out = dst.createVariable(
+                name, variable.datatype, variable.dimensions,
+                fill_value=fill_value, zlib=True)
+            out.setncatts(attributes)
+            # read the raw values, scale and offset (if any) are copied as
+            # attributes
+            variable.set_auto_maskandscale(False)
+            out.set_auto_maskandscale(False)
+
+            if name == longitude:
+                out[:] = lons.astype(variable.datatype)
+                continue
+            index = tuple(
+                lat_indices if d == lat_dim else
+                lon_indices if d == lon_dim else
+                slice(None)
+                for d in variable.dimensions
+            )
+            if len(variable.dimensions) == 0:
+                out.assignValue(variable.getValue())
+            elif lon_dim in variable.dimensions:
+                # wrapped longitude indices aren't in increasing order, so
+                # read the full rows and index them in memory
+                rows = variable[tuple(
+                    lat_indices if d == lat_dim else slice(None)
+                    for d in variable.dimensions
+                )]
+                axis = variable.dimensions.index(lon_dim)
+                out[:] = np.take(rows, lon_indices, axis=axis)
+            else:
+                out[:] = variable[index]
+
+
+def regional_data_folder(
+        data_folder: Path,
+        region: Region,
+        cache_folder: Optional[Path] = None,
+        log_function=None) -> Path:
+    """ Data folder with config files and grids cropped to the region, the
+    folder is created (in the regional_grids folder of the cache) the first
+    time the region is used. Returns the path of the folder.
+    """
+    if cache_folder is None:
+        cache_folder = default_cache_folder()
+    digest = hashlib.sha256(
+        f"{config_digest(data_folder)}:{region.key()}".encode('utf-8')
+    ).hexdigest()[:32]
+    folder = cache_folder.joinpath('regional_grids', digest)
+    if folder.exists():
+        return folder
+
+    if log_function is not None:
+        log_function(f"Creating regional AVISO FES grids in {folder}")
+
+    # grids are written to a temporary folder that is renamed once
+    # complete, so an interrupted run never leaves a partial folder
+    tmp_folder = folder.with_name(f"{digest}.{os.getpid()}.tmp")
+    tmp_folder.mkdir(parents=True, exist_ok=True)
+    try:
+        for config_name in CONFIG_NAMES:
+            config_path = data_folder.joinpath(config_name)
+            config = read_fes_config(config_path)
+            grid_folder = Path(config_name).stem
+            tmp_folder.joinpath(grid_folder).mkdir(exist_ok=True)
+
+            for name, grid in config_grids(config).items():
+                source = _grid_path(config_path, grid['file'])
+                relative = f"{grid_folder}/{source.name}"
+                crop_grid(
+                    source, tmp_folder.joinpath(relative),
+                    grid['latitude'], grid['longitude'],
+                    region)
+                config[f"{name}_FILE"] = f"./{relative}"
+
+            write_fes_config(tmp_folder.joinpath(config_name), config)
+
+        try:
+            os.replace(tmp_folder, folder)
+        except OSError:
+            # created by another process in the meantime
+            if not folder.exists():
+                raise
+            shutil.rmtree(tmp_folder)
+    except BaseException:
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        raise
+
+    return folder
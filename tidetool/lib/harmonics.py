@@ -0,0 +1,268 @@
+""" Module for predicting tides from harmonic constituents.
+
+A tide at a single location can be described by the amplitude and phase of
+a set of harmonic constituents. Once these have been extracted (see
+`fit_constituents`) the tide can be predicted for any time range using only
+numpy, without needing the AVISO FES grids.
+
+Each constituent is defined by its Doodson numbers, these multiply the
+astronomical arguments (lunar time, mean longitudes of the moon and sun,
+lunar perigee, lunar node and solar perigee) to give the equilibrium
+argument V. The amplitude and phase of the lunar constituents are modulated
+over the 18.6 year nodal cycle, this is handled by the nodal factor (f) and
+nodal angle (u) corrections. The prediction for a constituent is then
+
+    height = f * amplitude * cos(V + u - phase)
+"""
+
+from typing import Dict, List, Tuple
+import numpy as np
+
+
+# Constituents used by the harmonic engine. Each entry is the Doodson
+# numbers (tau, s, h, p, N', p1), a phase offset (degrees) and the nodal
+# correction as a combination of the base nodal corrections (see
+# `_base_nodal_corrections`), eg; M4 is M2 * M2 so {'M2': 2}.
+CONSTITUENTS: Dict[str, Tuple[Tuple[int, ...], float, Dict[str, int]]] = {
+    # long period
+    'Sa': ((0, 0, 1, 0, 0, -1), 0, {}),
+    'Ssa': ((0, 0, 2, 0, 0, 0), 0, {}),
+    'Mm': ((0, 1, 0, -1, 0, 0), 0, {'Mm': 1}),
+    'Msf': ((0, 2, -2, 0, 0, 0), 0, {'M2': -1}),
+    'Mf': ((0, 2, 0, 0, 0, 0), 0, {'Mf': 1}),
+    'Mtm': ((0, 3, 0, -1, 0, 0), 0, {'Mf': 1}),
+    # diurnal
+    '2Q1': ((1, -3, 0, 2, 0, 0), -90, {'O1': 1}),
+    'Sigma1': ((1, -3, 2, 0, 0, 0), -90, {'O1': 1}),
+    'Q1': ((1, -2, 0, 1, 0, 0), -90, {'O1': 1}),
+    'Rho1': ((1, -2, 2, -1, 0, 0), -90, {'O1': 1}),
+    'O1': ((1, -1, 0, 0, 0, 0), -90, {'O1': 1}),
+    'M1': ((1, 0, 0, 0, 0, 0), 90, {'J1': 1}),
+    'Chi1': ((1, 0, 2, -1, 0, 0), 90, {'J1': 1}),
+    'Pi1': ((1, 1, -3, 0, 0, 1), -90, {}),
+    'P1': ((1, 1, -2, 0, 0, 0), -90, {}),
+    'S1': ((1, 1, -1, 0, 0, 0), 180, {}),
+    'K1': ((1, 1, 0, 0, 0, 0), 90, {'K1': 1}),
+    'Phi1': ((1, 1, 1, 0, 0, 0), 90, {}),
+    'Theta1': ((1, 2, -2, 1, 0, 0), 90, {'J1': 1}),
+    'J1': ((1, 2, 0, -1, 0, 0), 90, {'J1': 1}),
+    'OO1': ((1, 3, 0, 0, 0, 0), 90, {'OO1': 1}),
+    # semi-diurnal
+    'Eps2': ((2, -3, 2, 1, 0, 0), 0, {'M2': 1}),
+    '2N2': ((2, -2, 0, 2, 0, 0), 0, {'M2': 1}),
+    'Mu2': ((2, -2, 2, 0, 0, 0), 0, {'M2': 1}),
+    'N2': ((2, -1, 0, 1, 0, 0), 0, {'M2': 1}),
+    'Nu2': ((2, -1, 2, -1, 0, 0), 0, {'M2': 1}),
+    'M2': ((2, 0, 0, 0, 0, 0), 0, {'M2': 1}),
+    'MKS2': ((2, 0, 2, 0, 0, 0), 0, {'M2': 1, 'K2': 1}),
+    'Lambda2': ((2, 1, -2, 1, 0, 0), 180, {'M2': 1}),
+    'L2': ((2, 1, 0, -1, 0, 0), 180, {'M2': 1}),
+    'T2': ((2, 2, -3, 0, 0, 1), 0, {}),
+    'S2': ((2, 2, -2, 0, 0, 0), 0, {}),
+    'R2': ((2, 2, -1, 0, 0, -1), 180, {}),
+    'K2': ((2, 2, 0, 0, 0, 0), 0, {'K2': 1}),
+    # shallow water and higher harmonics
+    'M3': ((3, 0, 0, 0, 0, 0), 180, {'M2': 1.5}),
+    'MN4': ((4, -1, 0, 1, 0, 0), 0, {'M2': 2}),
+    'N4': ((4, -2, 0, 2, 0, 0), 0, {'M2': 2}),
+    'M4': ((4, 0, 0, 0, 0, 0), 0, {'M2': 2}),
+    'MS4': ((4, 2, -2, 0, 0, 0), 0, {'M2': 1}),
+    'S4': ((4, 4, -4, 0, 0, 0), 0, {}),
+    'M6': ((6, 0, 0, 0, 0, 0), 0, {'M2': 3}),
+    'M8': ((8, 0, 0, 0, 0, 0), 0, {'M2': 4}),
+}
+
+CONSTITUENT_NAMES: List[str] = list(CONSTITUENTS.keys())
+
+_DOODSON = np.array([CONSTITUENTS[n][0] for n in CONSTITUENT_NAMES], dtype=float)
+_PHASE_OFFSET = np.array([CONSTITUENTS[n][1] for n in CONSTITUENT_NAMES], dtype=float)
+
+# J2000 epoch, astronomical arguments are calculated relative to this
+_J2000 = np.datetime64('2000-01-01T12:00', 'm')
+
+
+def astronomical_arguments(dates: np.ndarray) -> np.ndarray:
+    """ Calculates the astronomical arguments (degrees) for each of the
+    datetime64 dates. Returns an array of shape (6, len(dates)) containing
+    lunar time (tau), mean longitude of the moon (s), mean longitude of the
+    sun (h), longitude of lunar perigee (p), negative longitude of the lunar
+    ascending node (N') and longitude of solar perigee (p1).
+    """
+    minutes = (dates.astype('datetime64[m]') - _J2000).astype(np.int64)
+    # julian centuries since J2000
+    t = minutes / (36525.0 * 1440.0)
+
+    s = 218.3164477 + 481267.88123421 * t
+    h = 280.4664567 + 36000.76983 * t
+    p = 83.3532465 + 4069.0137287 * t
+    n = 125.04452 - 1934.136261 * t
+    p1 = 282.93735 + 1.71946 * t
+
+    # hour angle of the mean sun, the J2000 epoch is at noon so mean sun is
+    # at upper transit (hour angle of zero). Integer minutes of the day are
+    # used to avoid losing precision for dates far from the epoch.
+    solar_time = (minutes % 1440) * (360.0 / 1440.0)
+    tau = solar_time + h - s
+
+    return np.remainder(np.stack([tau, s, h, p, -n, p1]), 360.0)
+
+
+def _base_nodal_corrections(
+        n: np.ndarray) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """ Nodal factor (f) and angle (u, degrees) of the base constituents
+    for the given longitude of the lunar ascending node (n, degrees). All
+    other lunar constituents are derived from these (Schureman, 1958).
+    """
+    n = np.radians(n)
+    cos1, cos2, cos3 = np.cos(n), np.cos(2 * n), np.cos(3 * n)
+    sin1, sin2, sin3 = np.sin(n), np.sin(2 * n), np.sin(3 * n)
+
+    return {
+        'M2': (
+            1.0004 - 0.0373 * cos1 + 0.0002 * cos2,
+            -2.14 * sin1
+        ),
+        'K1': (
+            1.0060 + 0.1150 * cos1 - 0.0088 * cos2 + 0.0006 * cos3,
+            -8.86 * sin1 + 0.68 * sin2 - 0.07 * sin3
+        ),
+        'O1': (
+            1.0089 + 0.1871 * cos1 - 0.0147 * cos2 + 0.0014 * cos3,
+            10.80 * sin1 - 1.34 * sin2 + 0.19 * sin3
+        ),
+        'K2': (
+            1.0241 + 0.2863 * cos1 + 0.0083 * cos2 - 0.0015 * cos3,
+            -17.74 * sin1 + 0.68 * sin2 - 0.04 * sin3
+        ),
+        'J1': (
+            1.0129 + 0.1676 * cos1 - 0.0170 * cos2 + 0.0016 * cos3,
+            -12.94 * sin1 + 1.34 * sin2 - 0.19 * sin3
+        ),
+        'OO1': (
+            1.1027 + 0.6504 * cos1 + 0.0317 * cos2 - 0.0014 * cos3,
+            -36.68 * sin1 + 4.02 * sin2 - 0.57 * sin3
+        ),
+        'Mf': (
+            1.0429 + 0.4135 * cos1 - 0.0040 * cos2,
+            -23.74 * sin1 + 2.68 * sin2 - 0.38 * sin3
+        ),
+        'Mm': (
+            1.0000 - 0.1300 * cos1 + 0.0013 * cos2,
+            np.zeros_like(n)
+        ),
+    }
+
+
+def nodal_corrections(n: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ Nodal factor (f) and angle (u, degrees) for all constituents, each
+    returned array has shape (len(CONSTITUENT_NAMES), len(n)).
+    """
+    base = _base_nodal_corrections(n)
+    f = np.ones((len(CONSTITUENT_NAMES), len(n)))
+    u = np.zeros((len(CONSTITUENT_NAMES), len(n)))
+
+    for i, name in enumerate(CONSTITUENT_NAMES):
+        for base_name, power in CONSTITUENTS[name][2].items():
+            base_f, base_u = base[base_name]
+            f[i] *= base_f ** abs(power)
+            u[i] += base_u * power
+
+    return f, u
+
+
+def harmonic_basis(dates: np.ndarray) -> np.ndarray:
+    """ Builds the basis functions for the harmonic prediction at each of the
+    datetime64 dates. Returns an array of shape
+    (2 * len(CONSTITUENT_NAMES) + 1, len(dates)) made up of the nodally
+    corrected cos terms, sin terms and a constant term (mean level).
+    """
+    args = astronomical_arguments(dates)
+    # -N' is the longitude of the lunar node
+    f, u = nodal_corrections(-args[4])
+
+    v = _DOODSON @ args + _PHASE_OFFSET[:, np.newaxis]
+    angle = np.radians(v + u)
+
+    return np.concatenate([
+        f * np.cos(angle),
+        f * np.sin(angle),
+        np.ones((1, len(dates)))
+    ])
+
+
+class HarmonicConstituents:
+    """ Amplitude (m) and phase (degrees) for each harmonic constituent
+    (see CONSTITUENT_NAMES) at a single location, along with the mean
+    level (m).
+    """
+
+    def __init__(
+            self,
+            amplitudes: np.ndarray,
+            phases: np.ndarray,
+            mean: float = 0.0) -> None:
+        self.amplitudes = np.asarray(amplitudes, dtype=float)
+        self.phases = np.asarray(phases, dtype=float)
+        self.mean = float(mean)
+
+
+    @classmethod
+    def from_coefficients(
+            cls, coefficients: np.ndarray) -> 'HarmonicConstituents':
+        """ Creates the constituents from the coefficients that multiply
+        the harmonic basis functions (see `harmonic_basis`)
+        """
+        count = len(CONSTITUENT_NAMES)
+        cos_terms = coefficients[:count]
+        sin_terms = coefficients[count:2 * count]
+        return cls(
+            np.hypot(cos_terms, sin_terms),
+            np.degrees(np.arctan2(sin_terms, cos_terms)),
+            coefficients[-1]
+        )
+
+
+    def coefficients(self) -> np.ndarray:
+        """ Coefficients that multiply the harmonic basis functions, see
+        `harmonic_basis`
+        """
+        phases = np.radians(self.phases)
+        return np.concatenate([
+            self.amplitudes * np.cos(phases),
+            self.amplitudes * np.sin(phases),
+            [self.mean]
+        ])
+
+
+def fit_constituents(
+        dates: np.ndarray,
+        heights: np.ndarray) -> List[HarmonicConstituents]:
+    """ Least squares fit of the harmonic constituents to a tide record.
+    heights is a 2D array of shape (number of stations, len(dates)), all
+    stations must share the same dates. The record should cover at least a
+    year so that the annual constituents (and those seperated by a year,
+    such as P1 and K1) can be resolved.
+    """
+    basis = harmonic_basis(dates)
+    coefficients, _, _, _ = np.linalg.lstsq(
+        basis.T, np.atleast_2d(heights).T, rcond=None)
+
+    return [
+        HarmonicConstituents.from_coefficients(c)
+        for c in coefficients.T
+    ]
+
+
+def predict(
+        constituents: List[HarmonicConstituents],
+        dates: np.ndarray) -> np.ndarray:
+    """ Predicts the tide height (m) at each of the datetime64 dates for
+    each set of constituents. Returns an array of shape
+    (len(constituents), len(dates)).
+
+    The basis functions are the same for every location, so they are
+    calculated once and the prediction for all locations is a single
+    matrix multiplication.
+    """
+    coefficients = np.array([c.coefficients() for c in constituents])
+    return coefficients @ harmonic_basis(dates)
@@ -0,0 +1,74 @@
+""" Module for interpolating tide heights predicted at a coarse time step to
+the dates of a finer tide series.
+
+Tide curves are smooth, so the tide model only needs to be evaluated every
+model step (eg; 30 minutes) with the heights in between found by cubic
+interpolation. The coarse dates are aligned to multiples of the model step
+(since 1970), so the same coarse dates are used no matter how the dates of
+a run are split into windows.
+
+Each interpolated height is the cubic through the four coarse heights that
+surround it (two either side). For a semi-diurnal tide of 1m amplitude and a
+30 minute model step the error is around 0.1mm, shallow water constituents
+increase this (see `InterpolatedTideModel` for the error check).
+"""
+
+from typing import Tuple
+import numpy as np
+
+
+def _to_microseconds(dates: np.ndarray) -> np.ndarray:
+    return dates.astype('datetime64[us]').astype(np.int64)
+
+
+def coarse_dates(dates: np.ndarray, model_step: int) -> np.ndarray:
+    """ Dates at model_step (minute) intervals that cover the dates, with
+    the two extra dates either side needed by the cubic interpolation.
+    """
+    step = model_step * 60_000_000
+    us = _to_microseconds(dates)
+    first = us.min() // step - 1
+    last = us.max() // step + 2
+    return (np.arange(first, last + 1, dtype=np.int64) * step) \
+        .astype('datetime64[us]')
+
+
+def off_step(dates: np.ndarray, model_step: int) -> np.ndarray:
+    """ Boolean array, True for the dates that don't fall on a multiple of
+    the model step (and so are interpolated).
+    """
+    return _to_microseconds(dates) % (model_step * 60_000_000) != 0
+
+
+def cubic_weights(fraction: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """ Lagrange weights of the four coarse heights around each point, for
+    the fraction of a model step the point is past the second of them.
+    """
+    f = fraction
+    return (
+        -f * (f - 1) * (f - 2) / 6,
+        (f + 1) * (f - 1) * (f - 2) / 2,
+        -(f + 1) * f * (f - 2) / 2,
+        (f + 1) * f * (f - 1) / 6,
+    )
+
+
+def interpolate(
+        coarse: np.ndarray,
+        coarse_heights: np.ndarray,
+        dates: np.ndarray) -> np.ndarray:
+    """ Interpolates the heights (predicted at the coarse dates, see
+    `coarse_dates`) to the dates. coarse_heights may be 2D, with one row of
+    heights per station.
+    """
+    coarse_us = _to_microseconds(coarse)
+    step = coarse_us[1] - coarse_us[0]
+    offset = _to_microseconds(dates) - coarse_us[0]
+    index = offset // step
+    fraction = (offset - index * step) / step
+
+    weights = cubic_weights(fraction)
+    heights = np.zeros(coarse_heights.shape[:-1] + (len(dates),))
+    for i, weight in enumerate(weights):
+        heights += weight * coarse_heights[..., index - 1 + i]
+    return heights
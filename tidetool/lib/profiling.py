@@ -0,0 +1,257 @@
+""" Module for profiling where the time goes in a tide generation run.
+
+The tide tool records the time taken by each phase of a run (loading the
+tide model, generating dates, predicting, writing files, ...) using `phase`;
+
+    with profiling.phase('write', points=len(heights), stations=[path]):
+        writer.write(series)
+
+When profiling has not been started `phase` returns a shared no-op context
+manager, so the hooks cost next to nothing in a normal run. Profiling is
+started with `start` and `stop` returns the report, or `profile_run`
+profiles a block of code and saves the report to a json file.
+
+Peak memory is reported as the peak RSS of the process (where available)
+and optionally the peak memory traced by tracemalloc. Tracing memory slows
+down code that allocates many small objects (eg; formatting the tide file
+lines), so phase times are less accurate when it's used.
+
+Phases can be recorded within other phases (eg; each pyfes calculate call
+is within the predict phase), the time is then included in both. Time
+spent by a phase that covers more than one station is shared evenly among
+those stations for the per station times.
+"""
+
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+import json
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak RSS is not reported
+    resource = None
+
+
+# returned by phase when profiling is off
+_NULL_PHASE = nullcontext()
+
+
+def _peak_rss(children: bool = False) -> Optional[int]:
+    """ Peak resident set size (bytes) of this process, or the largest of
+    its (finished) child processes.
+    """
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    rss = resource.getrusage(who).ru_maxrss
+    # macos gives bytes, linux gives KB
+    if sys.platform == 'darwin':
+        return rss
+    return rss * 1024
+
+
+class Profiler:
+    """ Accumulates the time (and number of points processed) by each phase
+    and station.
+    """
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        # name: [calls, seconds, points]
+        self.phases: Dict[str, list] = {}
+        # station name: seconds
+        self.stations: Dict[str, float] = {}
+        # peak traced memory of worker processes
+        self.worker_peak_memory = None
+        # phases are recorded by the tide file writer thread too
+        self._lock = threading.Lock()
+
+        self._start_time = time.perf_counter()
+        self.trace_memory = trace_memory
+        # tracing is only stopped on close if it was started here
+        self._started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+
+    def _peak_traced_memory(self) -> Optional[int]:
+        if not self.trace_memory:
+            return None
+        return tracemalloc.get_traced_memory()[1]
+
+
+    @contextmanager
+    def phase(
+            self,
+            name: str,
+            points: int = 0,
+            stations: Optional[Iterable] = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, points, stations)
+
+
+    def add(
+            self,
+            name: str,
+            seconds: float,
+            points: int = 0,
+            stations: Optional[Iterable] = None,
+            calls: int = 1) -> None:
+        if stations is not None:
+            stations = [str(s) for s in stations]
+
+        with self._lock:
+            totals = self.phases.get(name)
+            if totals is None:
+                totals = self.phases[name] = [0, 0.0, 0]
+            totals[0] += calls
+            totals[1] += seconds
+            totals[2] += points
+
+            if stations is not None:
+                for station in stations:
+                    self.stations[station] = self.stations.get(
+                        station, 0.0) + seconds / len(stations)
+
+
+    def take_snapshot(self) -> Dict:
+        """ Returns the phase and station times recorded since the last
+        snapshot, these are cleared. Used to pass the times recorded by a
+        worker process back to the main process (see `merge`).
+        """
+        with self._lock:
+            snapshot = {
+                'phases': self.phases,
+                'stations': self.stations,
+                'peak_memory': self._peak_traced_memory(),
+            }
+            self.phases = {}
+            self.stations = {}
+        return snapshot
+
+
+    def merge(self, snapshot: Dict) -> None:
+        for name, (calls, seconds, points) in snapshot['phases'].items():
+            self.add(name, seconds, points, calls=calls)
+        for station, seconds in snapshot['stations'].items():
+            self.stations[station] = self.stations.get(station, 0.0) + seconds
+        if snapshot['peak_memory'] is not None:
+            self.worker_peak_memory = max(
+                self.worker_peak_memory or 0, snapshot['peak_memory'])
+
+
+    def report(self) -> Dict:
+        """ Profile report, a dict that can be saved as json """
+        total_time = time.perf_counter() - self._start_time
+
+        def rate(points, seconds):
+            if points == 0 or seconds == 0:
+                return None
+            return points / seconds
+
+        # all points are predicted within the predict phase
+        points = self.phases.get('predict', [0, 0.0, 0])[2]
+        return {
+            'total_time': total_time,
+            'points': points,
+            'points_per_second': rate(points, total_time),
+            'phases': {
+                name: {
+                    'calls': calls,
+                    'time': seconds,
+                    'points': phase_points,
+                    'points_per_second': rate(phase_points, seconds),
+                }
+                for name, (calls, seconds, phase_points)
+                in sorted(self.phases.items(), key=lambda p: -p[1][1])
+            },
+            'stations': self.stations,
+            'peak_traced_memory': self._peak_traced_memory(),
+            'peak_traced_memory_workers': self.worker_peak_memory,
+            'peak_rss': _peak_rss(),
+            'peak_rss_workers': _peak_rss(children=True),
+        }
+
+
+    def close(self) -> None:
+        if self._started_tracing:
+            tracemalloc.stop()
+
+
+# profiler used by the phase hooks, None when not profiling
+_profiler: Optional[Profiler] = None
+
+
+def start(trace_memory: bool = False) -> Profiler:
+    """ Starts profiling, if trace_memory is True memory allocations are
+    traced using tracemalloc. Anything recorded by a profiler that was
+    already running (eg; inherited by a forked worker process) is discarded.
+    """
+    global _profiler
+    _profiler = Profiler(trace_memory)
+    return _profiler
+
+
+def stop() -> Optional[Dict]:
+    """ Stops profiling, returning the report (or None if profiling had not
+    been started).
+    """
+    global _profiler
+    if _profiler is None:
+        return None
+    report = _profiler.report()
+    _profiler.close()
+    _profiler = None
+    return report
+
+
+@contextmanager
+def profile_run(
+        path: Optional[Path],
+        trace_memory: bool = False,
+        log_function: Optional[Callable[[str], None]] = None):
+    """ Context manager that profiles the code within it and saves the report
+    as json to path. The report is saved even if the code raises, so failed
+    runs can be profiled too. Nothing is profiled when path is None.
+    """
+    if path is None:
+        yield
+        return
+
+    start(trace_memory)
+    try:
+        yield
+    finally:
+        report = stop()
+        Path(path).write_text(json.dumps(report, indent=2))
+        if log_function is not None:
+            log_function(f"Profile report saved to {path}")
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+def phase(
+        name: str,
+        points: int = 0,
+        stations: Optional[Iterable] = None):
+    """ Context manager that records the time taken by a phase of the run,
+    along with the number of points (eg; dates x stations) it processed.
+    stations is the list of stations the time is recorded against.
+    """
+    if _profiler is None:
+        return _NULL_PHASE
+    return _profiler.phase(name, points, stations)
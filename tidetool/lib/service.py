@@ -0,0 +1,659 @@
+""" Module for the tide prediction service, a long running process that
+keeps the AVISO FES grids loaded and answers prediction requests from other
+processes (see `tidetool serve`).
+
+Creating the pyfes handlers takes far longer than predicting a short tide
+window, so tools that make many small predictions can ask the service
+rather than loading the model for each one;
+
+    from tidetool.lib.service import PredictionClient
+
+    with PredictionClient() as client:
+        series = client.get_tide_data(start_date, end_date, -11.2, 134.7)
+
+Requests that arrive at the same time (from any number of clients) are
+coalesced into shared calls to the tide model, see `PredictionBatcher`.
+
+Clients connect over TCP (localhost by default) or a unix socket. Each
+request and response is a single line of json, arrays are sent as base64
+encoded little endian bytes (see `_encode_array`). Request types are;
+
+    series: {"type": "series", "locations": [[lat, lon], ...],
+             "start": iso date, "end": iso date, "time_period": minutes}
+        responds with {"heights": array} of shape (locations, dates)
+    points: {"type": "points", "times": array, "latitudes": array,
+             "longitudes": array}
+        responds with {"heights": array} of the same shape as times
+    stats: {"type": "stats"}
+        responds with the number of requests, model calls and points
+        predicted so far
+
+Failed requests are given an {"error": message} response, including
+requests longer than MAX_REQUEST_SIZE bytes and series requests of more
+than MAX_SERIES_POINTS points.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import base64
+import json
+import math
+import socket
+import threading
+import numpy as np
+
+from tidetool.lib.tide_series import TideSeries, count_dates_between, \
+    generate_dates_between
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# seconds the batcher waits after a request arrives for other requests to
+# share the model call with
+DEFAULT_BATCH_DELAY = 0.002
+
+# requests are added to a batch until it holds at least this many points,
+# and batches are predicted in model calls of at most this many points.
+# Matches `tides.MAX_POINTS_PER_CALL` (not imported as it imports pyfes).
+DEFAULT_MAX_BATCH_POINTS = 1_000_000
+
+# largest request line accepted by the server (bytes). A points request
+# takes 32 bytes per point (base64 encoded), so this allows about two
+# million points.
+MAX_REQUEST_SIZE = 64 * 1024 * 1024
+
+# most points (locations * dates) of a series request. Series requests are
+# small however many points they ask for, so they're limited separately;
+# about 300MB of arrays are built for a request this size.
+MAX_SERIES_POINTS = 10_000_000
+
+
+class PredictionServiceError(Exception):
+    """ Raised by the client when the service fails to answer a request """
+    pass
+
+
+def _encode_array(array: np.ndarray) -> Dict:
+    array = np.ascontiguousarray(array)
+    dtype = array.dtype.newbyteorder('<')
+    data = base64.b64encode(array.astype(dtype).tobytes())
+    return {
+        'dtype': dtype.str,
+        'shape': list(array.shape),
+        'data': data.decode('ascii'),
+    }
+
+
+def _decode_array(value: Dict) -> np.ndarray:
+    data = base64.b64decode(value['data'])
+    return np.frombuffer(data, dtype=np.dtype(value['dtype'])) \
+        .reshape(value['shape'])
+
+
+class PredictionBatcher:
+    """ Coalesces predictions requested at the same time into shared calls
+    to the tide model.
+
+    The model must provide `calculate(dates, latitudes, longitudes)` (see
+    `tides.TideModel`). It's called from a single worker thread so the
+    event loop keeps accepting requests while a batch is predicted; all
+    requests that arrive during a model call are predicted together in the
+    next call. Batches (and single requests) larger than max_batch_points
+    are split over several model calls.
+    """
+
+    def __init__(
+            self,
+            model,
+            batch_delay: float = DEFAULT_BATCH_DELAY,
+            max_batch_points: int = DEFAULT_MAX_BATCH_POINTS) -> None:
+        self.model = model
+        self.batch_delay = batch_delay
+        self.max_batch_points = max_batch_points
+
+        # number of requests, model calls and points predicted
+        self.requests = 0
+        self.calls = 0
+        self.points = 0
+
+        # (dates, latitudes, longitudes, future) of each waiting request
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._task = None
+
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for _, _, _, future in self._pending:
+            future.cancel()
+        self._pending = []
+        self._executor.shutdown(wait=True)
+
+
+    async def calculate(
+            self,
+            dates: np.ndarray,
+            latitudes: np.ndarray,
+            longitudes: np.ndarray) -> np.ndarray:
+        """ Tide heights (m) for each of the dates, latitudes and longitudes
+        (1D arrays of the same length).
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((dates, latitudes, longitudes, future))
+        self.requests += 1
+        self._wakeup.set()
+        return await future
+
+
+    def _take_batch(self) -> List[Tuple]:
+        batch = []
+        points = 0
+        while len(self._pending) > 0 and points < self.max_batch_points:
+            request = self._pending.pop(0)
+            if request[3].cancelled():
+                # client went away
+                continue
+            batch.append(request)
+            points += len(request[0])
+        if len(self._pending) == 0:
+            self._wakeup.clear()
+        return batch
+
+
+    def _predict(self, batch: List[Tuple]) -> List[np.ndarray]:
+        """ Heights of each request in the batch, run in the worker thread.
+        The batch is predicted in model calls of at most max_batch_points.
+        """
+        dates = np.concatenate([r[0] for r in batch])
+        latitudes = np.concatenate([r[1] for r in batch])
+        longitudes = np.concatenate([r[2] for r in batch])
+
+        heights = np.concatenate([
+            self.model.calculate(
+                dates[first:first + self.max_batch_points],
+                latitudes[first:first + self.max_batch_points],
+                longitudes[first:first + self.max_batch_points])
+            for first in range(0, len(dates), self.max_batch_points)
+        ])
+        splits = np.cumsum([len(r[0]) for r in batch])[:-1]
+        return np.split(heights, splits)
+
+
+    async def _predict_batch(self, batch: List[Tuple]) -> None:
+        """ Predicts the batch and sets the result of each request. If the
+        batch fails each of its requests is predicted on its own, so one bad
+        request doesn't fail the requests it was batched with.
+        """
+        points = sum(len(r[0]) for r in batch)
+        self.calls += math.ceil(points / self.max_batch_points)
+        self.points += points
+        try:
+            heights = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._predict, batch)
+        except Exception as ex:
+            if len(batch) == 1:
+                if not batch[0][3].done():
+                    batch[0][3].set_exception(ex)
+                return
+            for request in batch:
+                if not request[3].done():
+                    await self._predict_batch([request])
+            return
+
+        for request, request_heights in zip(batch, heights):
+            if not request[3].done():
+                request[3].set_result(request_heights)
+
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if self.batch_delay > 0:
+                await asyncio.sleep(self.batch_delay)
+
+            batch = self._take_batch()
+            if len(batch) == 0:
+                continue
+            await self._predict_batch(batch)
+
+
+async def _read_line(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """ Reads the next line, or returns None if it's longer than the limit
+    of the reader (the line is skipped). At the end of the stream returns
+    whatever is left, an empty line once there's nothing left.
+    """
+    try:
+        return await reader.readuntil(b'\n')
+    except asyncio.IncompleteReadError as ex:
+        return ex.partial
+    except asyncio.LimitOverrunError as ex:
+        consumed = ex.consumed
+
+    # discards the line, the part read so far then up to the next newline
+    while True:
+        await reader.readexactly(consumed)
+        try:
+            await reader.readuntil(b'\n')
+            return None
+        except asyncio.LimitOverrunError as ex:
+            consumed = ex.consumed
+
+
+class PredictionServer:
+    """ Serves tide predictions from a single tide model, see module docs
+    for the protocol.
+    """
+
+    def __init__(
+            self,
+            model,
+            batch_delay: float = DEFAULT_BATCH_DELAY,
+            max_batch_points: int = DEFAULT_MAX_BATCH_POINTS) -> None:
+        self.model = model
+        self.batch_delay = batch_delay
+        self.max_batch_points = max_batch_points
+        self.batcher = None
+        self._server = None
+
+
+    async def start(
+            self,
+            host: str = DEFAULT_HOST,
+            port: int = DEFAULT_PORT,
+            socket_path: Optional[Path] = None) -> None:
+        """ Starts listening on the TCP host and port, or the unix socket
+        if socket_path is given. A port of 0 picks a free port, see
+        `address`.
+        """
+        self.batcher = PredictionBatcher(
+            self.model, self.batch_delay, self.max_batch_points)
+        self.batcher.start()
+        if socket_path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection, str(socket_path),
+                limit=MAX_REQUEST_SIZE)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection, host, port,
+                limit=MAX_REQUEST_SIZE)
+
+
+    @property
+    def address(self) -> Union[Tuple[str, int], str]:
+        """ (host, port) the server is listening on, or the unix socket
+        path.
+        """
+        address = self._server.sockets[0].getsockname()
+        if isinstance(address, str):
+            return address
+        return tuple(address[:2])
+
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.batcher is not None:
+            await self.batcher.close()
+
+
+    async def _handle_connection(
+            self,
+            reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter) -> None:
+        # requests on a connection are answered in order, clients that
+        # want requests predicted together use a connection for each
+        try:
+            while True:
+                line = await _read_line(reader)
+                if line is None:
+                    response = {'error': (
+                        f"Request is larger than the limit of "
+                        f"{MAX_REQUEST_SIZE} bytes")}
+                elif len(line) == 0:
+                    break
+                else:
+                    response = await self._handle_request(line)
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def _in_thread(self, function: Callable, *args):
+        """ Runs function in a thread of the default executor, so parsing
+        and building large arrays doesn't hold up the event loop.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, function, *args)
+
+
+    async def _encode(self, heights: np.ndarray) -> Dict:
+        return await self._in_thread(_encode_array, heights)
+
+
+    async def _handle_request(self, line: bytes) -> Dict:
+        try:
+            request = await self._in_thread(json.loads, line)
+            request_type = request.get('type')
+            if request_type == 'series':
+                heights = await self._series(request)
+                return {'heights': await self._encode(heights)}
+            elif request_type == 'points':
+                heights = await self._points(request)
+                return {'heights': await self._encode(heights)}
+            elif request_type == 'stats':
+                return {
+                    'requests': self.batcher.requests,
+                    'calls': self.batcher.calls,
+                    'points': self.batcher.points,
+                }
+            raise ValueError(f"Unknown request type {request_type}")
+        except Exception as ex:
+            return {'error': f"{type(ex).__name__}: {ex}"}
+
+
+    async def _series(self, request: Dict) -> np.ndarray:
+        dates, latitudes, longitudes, shape = \
+            await self._in_thread(_series_points, request)
+        if len(dates) == 0:
+            return np.zeros(shape)
+        heights = await self.batcher.calculate(dates, latitudes, longitudes)
+        return heights.reshape(shape)
+
+
+    async def _points(self, request: Dict) -> np.ndarray:
+        times, latitudes, longitudes = \
+            await self._in_thread(_request_points, request)
+        if times.size == 0:
+            return np.zeros(times.shape)
+
+        heights = await self.batcher.calculate(
+            times.ravel(), latitudes.ravel(), longitudes.ravel())
+        return heights.reshape(times.shape)
+
+
+def _series_points(
+        request: Dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Tuple]:
+    """ Dates, latitudes and longitudes of every point of a series request,
+    and the (locations, dates) shape of its heights.
+    """
+    locations = request['locations']
+    start = datetime.fromisoformat(request['start'])
+    end = datetime.fromisoformat(request['end'])
+    time_period = int(request['time_period'])
+    if time_period < 1:
+        raise ValueError(f"Invalid time period {time_period}")
+
+    # checked before any arrays are built
+    points = count_dates_between(start, end, time_period) * len(locations)
+    if points > MAX_SERIES_POINTS:
+        raise ValueError(
+            f"Series request of {points} points is larger than the limit "
+            f"of {MAX_SERIES_POINTS} points")
+
+    dates = generate_dates_between(start, end, time_period)
+    shape = (len(locations), len(dates))
+    if len(locations) == 0 or len(dates) == 0:
+        dates = dates[:0]
+        return dates, np.zeros(0), np.zeros(0), shape
+
+    latitudes = np.repeat([lat for lat, _ in locations], len(dates))
+    longitudes = np.repeat([lon for _, lon in locations], len(dates))
+    return np.tile(dates, len(locations)), latitudes, longitudes, shape
+
+
+def _request_points(
+        request: Dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Times, latitudes and longitudes of a points request """
+    times = _decode_array(request['times']).astype('datetime64[us]')
+    latitudes = _decode_array(request['latitudes']).astype(np.float64)
+    longitudes = _decode_array(request['longitudes']).astype(np.float64)
+    if times.shape != latitudes.shape or times.shape != longitudes.shape:
+        raise ValueError(
+            "times, latitudes and longitudes must be the same shape")
+    return times, latitudes, longitudes
+
+
+def run_server(
+        model,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        socket_path: Optional[Path] = None,
+        batch_delay: float = DEFAULT_BATCH_DELAY,
+        log_function: Optional[Callable[[str], None]] = None) -> None:
+    """ Serves predictions from the model until interrupted """
+    async def serve():
+        server = PredictionServer(model, batch_delay)
+        await server.start(host, port, socket_path)
+        if log_function is not None:
+            log_function(f"Serving tide predictions on {server.address}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+class ServerThread:
+    """ Runs a PredictionServer on its own event loop in a background
+    thread, for applications (and tests) that host the service themselves.
+    The server is listening once this has been created, a port of 0 picks
+    a free port (see `address`).
+    """
+
+    def __init__(
+            self,
+            model,
+            host: str = DEFAULT_HOST,
+            port: int = DEFAULT_PORT,
+            socket_path: Optional[Path] = None,
+            batch_delay: float = DEFAULT_BATCH_DELAY) -> None:
+        self.server = PredictionServer(model, batch_delay)
+        self._loop = asyncio.new_event_loop()
+        # set once the server has started (or failed to start)
+        started = threading.Event()
+        error = []
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._loop.run_until_complete(
+                    self.server.start(host, port, socket_path))
+            except Exception as ex:
+                error.append(ex)
+                return
+            finally:
+                started.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        if len(error) > 0:
+            raise error[0]
+
+
+    @property
+    def address(self) -> Union[Tuple[str, int], str]:
+        return self.server.address
+
+
+    def close(self) -> None:
+        asyncio.run_coroutine_threadsafe(
+            self.server.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class PredictionClient:
+    """ Client of the prediction service, the connection is opened on the
+    first request and reused until the client is closed.
+    """
+
+    def __init__(
+            self,
+            host: str = DEFAULT_HOST,
+            port: int = DEFAULT_PORT,
+            socket_path: Optional[Path] = None,
+            timeout: Optional[float] = None) -> None:
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._socket = None
+        self._file = None
+
+
+    def __enter__(self) -> 'PredictionClient':
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+    def _connect(self) -> None:
+        if self.socket_path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(self.timeout)
+            self._socket.connect(str(self.socket_path))
+        else:
+            self._socket = socket.create_connection(
+                (self.host, self.port), self.timeout)
+            self._socket.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._socket.makefile('rb')
+
+
+    def close(self) -> None:
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = None
+            self._file = None
+
+
+    def _request(self, request: Dict) -> Dict:
+        if self._socket is None:
+            self._connect()
+        try:
+            self._socket.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            line = self._file.readline()
+        except OSError:
+            self.close()
+            raise
+        if len(line) == 0:
+            self.close()
+            raise PredictionServiceError("Connection closed by the service")
+
+        response = json.loads(line)
+        if 'error' in response:
+            raise PredictionServiceError(response['error'])
+        return response
+
+
+    def calculate(
+            self,
+            dates: np.ndarray,
+            latitudes: np.ndarray,
+            longitudes: np.ndarray) -> np.ndarray:
+        """ Tide heights (m) for each of the dates (datetime64), latitudes
+        and longitudes given. All three arrays must be the same shape.
+        """
+        response = self._request({
+            'type': 'points',
+            'times': _encode_array(
+                np.asarray(dates).astype('datetime64[us]')),
+            'latitudes': _encode_array(np.asarray(latitudes, np.float64)),
+            'longitudes': _encode_array(np.asarray(longitudes, np.float64)),
+        })
+        return _decode_array(response['heights'])
+
+
+    def get_tide_data_many(
+            self,
+            start_date: datetime, end_date: datetime,
+            locations: List[Tuple[float, float]],
+            time_period: int = 10,
+            dtype: np.dtype = np.float64) -> List[TideSeries]:
+        """ Same as `tides.get_tide_data_many`, predicted by the service """
+        response = self._request({
+            'type': 'series',
+            'locations': [[lat, lon] for lat, lon in locations],
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'time_period': time_period,
+        })
+        dates = generate_dates_between(start_date, end_date, time_period)
+        return [
+            TideSeries(dates, heights, dtype)
+            for heights in _decode_array(response['heights'])
+        ]
+
+
+    def get_tide_data(
+            self,
+            start_date: datetime, end_date: datetime,
+            latitude: float, longitude: float,
+            time_period: int = 10,
+            dtype: np.dtype = np.float64) -> TideSeries:
+        """ Same as `tides.get_tide_data`, predicted by the service """
+        return self.get_tide_data_many(
+            start_date, end_date,
+            [(latitude, longitude)],
+            time_period,
+            dtype
+        )[0]
+
+
+    def stats(self) -> Dict:
+        """ Number of requests, model calls and points predicted by the
+        service so far.
+        """
+        return self._request({'type': 'stats'})
+
+
+def request_tide_data(
+        start_date: datetime, end_date: datetime,
+        latitude: float, longitude: float,
+        time_period: int = 10,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        socket_path: Optional[Path] = None) -> TideSeries:
+    """ Same as `tides.get_tide_data` but predicted by a running service
+    (see `tidetool serve`) rather than loading the tide model.
+    """
+    with PredictionClient(host, port, socket_path) as client:
+        return client.get_tide_data(
+            start_date, end_date,
+            latitude, longitude,
+            time_period
+        )
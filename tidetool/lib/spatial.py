@@ -0,0 +1,53 @@
+""" Module for grouping locations that can share a single tide prediction.
+"""
+
+from typing import List, Tuple
+import math
+
+
+# resolution (degrees) of the FES2014 model grids
+FES2014_GRID_SIZE = 1 / 16
+
+
+class LocationIndex:
+    """ Spatial index that groups together locations that share a tide
+    prediction.
+
+    If cell_size is zero only locations with exactly the same coordinates
+    are grouped. Otherwise locations are snapped to a grid of cell_size
+    degrees, and all locations within the same grid cell are grouped. The
+    first location added to a group is used as the location of the group.
+    """
+
+    def __init__(self, cell_size: float = 0.0) -> None:
+        if cell_size < 0:
+            raise ValueError("Cell size must not be negative")
+        self.cell_size = cell_size
+        # location of each group, in the order the groups were created
+        self.locations: List[Tuple[float, float]] = []
+        # lookup of the group index by cell key
+        self._groups = {}
+
+
+    def _key(self, latitude: float, longitude: float) -> Tuple:
+        # -180 and 180 (or 0 and 360) are the same longitude
+        longitude = longitude % 360.0
+        if self.cell_size == 0:
+            return (latitude, longitude)
+        return (
+            math.floor(latitude / self.cell_size),
+            math.floor(longitude / self.cell_size)
+        )
+
+
+    def add(self, latitude: float, longitude: float) -> int:
+        """ Adds a location to the index, returning the index of the group
+        it belongs to.
+        """
+        key = self._key(latitude, longitude)
+        group = self._groups.get(key)
+        if group is None:
+            group = len(self.locations)
+            self._groups[key] = group
+            self.locations.append((latitude, longitude))
+        return group
@@ -0,0 +1,465 @@
+""" Module for reading and writing CARIS tide data files (.tid).
+
+A tide data file starts with a line of dashes, followed by one line per
+tide height. Each line has a UTC timestamp and a height (m) that is always
+6 chars wide, right justified; eg.
+
+    --------
+    2005/01/01 00:00  -0.61
+    2005/01/01 00:10  -0.58
+
+Every station in a run uses the same timestamps, so the timestamp column is
+formatted once (`format_timestamps`) and reused for each file written.
+
+A tide data file can optionally be written with a binary sidecar file (the
+tide file name with an additional .npy extension). The sidecar is a numpy
+npy file of (time, height) records that can be memory mapped, so the tide
+data can be loaded without parsing the text (see `read_tid_sidecar`).
+"""
+
+from pathlib import Path
+from typing import Optional, Tuple
+import os
+import struct
+import numpy as np
+
+from tidetool.lib.tide_series import TideSeries
+
+
+# all tide files start with this line
+TID_HEADER = '--------\n'
+
+# tide files are written as bytes, with the platform's line ending (as they
+# were when written as text)
+_NEWLINE = os.linesep.encode('ascii')
+_HEADER_BYTES = TID_HEADER.encode('ascii').replace(b'\n', _NEWLINE)
+
+# number of lines joined together and passed to each write call
+LINES_PER_WRITE = 200_000
+
+# records of the sidecar file, time (minute resolution) and height (m)
+SIDECAR_DTYPE = np.dtype([('time', 'datetime64[m]'), ('height', np.float32)])
+
+# size of the sidecar npy file header. It's a fixed size so the header can
+# be rewritten with the final record count once all records are written.
+_SIDECAR_HEADER_SIZE = 128
+
+# a tide data line is 23 chars, plus the new line (\n or \r\n)
+_LINE_WIDTHS = (24, 25)
+
+
+def _tmp_path(path: Path) -> Path:
+    """ Path a file is written to before being moved into place """
+    return path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+
+def sidecar_path(path: Path) -> Path:
+    """ Path of the binary sidecar file for the tide data file at path """
+    return path.with_name(path.name + '.npy')
+
+
+def format_timestamps(dates: np.ndarray) -> np.ndarray:
+    """ Formats an array of datetime64 dates into the timestamp column of
+    a tide data file. CARIS tide files use UTC so don't need to include
+    zone, each formatted timestamp includes the space separating it from
+    the height value. Timestamps are ascii bytes, as written to the file.
+    """
+    # ISO formatted dates (YYYY-MM-DDTHH:MM) as a 2D array of chars, these
+    # are then modified in place to match the CARIS format of
+    # "YYYY/MM/DD HH:MM "
+    iso = np.datetime_as_string(dates.astype('datetime64[m]'), unit='m')
+    chars = np.empty((len(dates), 17), dtype=np.uint8)
+    chars[:, :16] = np.asarray(iso, dtype='S16').view(np.uint8).reshape(-1, 16)
+    chars[:, 4] = ord('/')
+    chars[:, 7] = ord('/')
+    chars[:, 10] = ord(' ')
+    chars[:, 16] = ord(' ')
+
+    return chars.view('S17').ravel()
+
+
+def format_heights(heights: np.ndarray) -> np.ndarray:
+    """ Formats an array of tide heights into the height column of a tide
+    data file. Height is always 6 chars wide, right justified, with a
+    leading space for positive values.
+    """
+    return np.char.mod('% 6.2f', np.asarray(heights, dtype=np.float64))
+
+
+def _format_lines(timestamps: np.ndarray, heights: np.ndarray) -> bytes:
+    """ Joins formatted timestamps (bytes) and heights (str) into the lines
+    of a tide data file, including the final new line.
+    """
+    if heights.dtype.itemsize != 4 * 6:
+        # a height too large for the 6 char column, lines aren't all the
+        # same width so join them one at a time
+        lines = np.char.add(timestamps, heights.astype(np.bytes_))
+        return _NEWLINE.join(lines.tolist()) + _NEWLINE
+
+    # every line is the same width, so the lines are assembled as columns
+    # of a 2D array of chars. Heights are ascii, so their code points
+    # (uint32) convert straight to bytes.
+    newline = np.frombuffer(_NEWLINE, dtype=np.uint8)
+    chars = np.empty((len(heights), 17 + 6 + len(newline)), dtype=np.uint8)
+    chars[:, :17] = timestamps.view(np.uint8).reshape(-1, 17)
+    chars[:, 17:23] = heights.view(np.uint32).reshape(-1, 6)
+    chars[:, 23:] = newline
+    return chars.tobytes()
+
+
+class TidWriter:
+    """ Writes a tide data file incrementally, one block of tide heights at
+    a time. Can be used as a context manager;
+
+        with TidWriter(path) as writer:
+            for series in windows:
+                writer.write(series)
+
+    New tide files are written to a temporary file that is only moved into
+    place by `close`, so an interrupted write never leaves a partial tide
+    file (or replaces an existing one). When appending, `discard` truncates
+    the file back to its original length.
+    """
+
+    def __init__(
+            self,
+            path: Path,
+            append: bool = False,
+            sidecar: bool = False) -> None:
+        """ If append is True lines are added to the end of an existing
+        tide data file, otherwise a new file is created. If sidecar is True
+        the binary sidecar file is written along with the tide data file.
+        """
+        self.path = path
+        self._append = append
+
+        self._sidecar = None
+        if sidecar:
+            self._sidecar = _SidecarWriter(sidecar_path(path), path, append)
+
+        if append:
+            # length of the file before anything was appended
+            self._size = path.stat().st_size
+            self._output = path.open('ab')
+        else:
+            self._tmp_path = _tmp_path(path)
+            self._output = self._tmp_path.open('wb')
+            self._output.write(_HEADER_BYTES)
+
+
+    def write(
+            self,
+            series: TideSeries,
+            timestamps: Optional[np.ndarray] = None) -> None:
+        """ Appends the tide series to the tide data file. timestamps is the
+        already formatted timestamp column for the series times (see
+        `format_timestamps`), if not given the series times are formatted.
+        """
+        heights = series.heights
+        if timestamps is None:
+            timestamps = format_timestamps(series.times)
+        if len(timestamps) != len(heights):
+            raise ValueError(
+                f"Got {len(timestamps)} timestamps for {len(heights)} heights")
+
+        for first in range(0, len(heights), LINES_PER_WRITE):
+            last = first + LINES_PER_WRITE
+            self._output.write(_format_lines(
+                timestamps[first:last], format_heights(heights[first:last])))
+
+        if self._sidecar is not None:
+            self._sidecar.write(series)
+
+
+    @property
+    def created_sidecar(self) -> bool:
+        """ True if a sidecar is written that didn't exist before """
+        return self._sidecar is not None and self._sidecar.created
+
+
+    def close(self) -> None:
+        """ Finishes the tide data file, moving it into place """
+        self._output.close()
+        if not self._append:
+            os.replace(self._tmp_path, self.path)
+        # sidecar is closed last, so it's never older than the tide file
+        if self._sidecar is not None:
+            self._sidecar.close()
+
+
+    def discard(self) -> None:
+        """ Abandons the write, leaving the tide data file (and sidecar) as
+        they were before the writer was created.
+        """
+        self._output.close()
+        if self._append:
+            with self.path.open('r+b') as output:
+                output.truncate(self._size)
+        else:
+            self._tmp_path.unlink()
+        if self._sidecar is not None:
+            self._sidecar.discard()
+
+
+    def __enter__(self) -> 'TidWriter':
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class _SidecarWriter:
+    """ Writes the sidecar file of a tide data file incrementally. The npy
+    header is written with the final record count when closed. As with
+    tide data files, new sidecars are written to a temporary file and
+    appended sidecars can be restored by `discard`.
+    """
+
+    def __init__(self, path: Path, tid_path: Path, append: bool) -> None:
+        self.path = path
+        # there was no sidecar before this one was written
+        self.created = not path.exists()
+        self._count = 0
+        # temporary file the sidecar is written to, None if it's appended
+        # to in place
+        self._tmp_path = None
+        if append and _sidecar_is_current(path, tid_path):
+            self._output = path.open('r+b')
+            self._count = _read_sidecar_count(self._output)
+            # drop anything past the last record (eg; an interrupted write)
+            self._output.seek(
+                _SIDECAR_HEADER_SIZE + self._count * SIDECAR_DTYPE.itemsize)
+            self._output.truncate()
+            self._initial_count = self._count
+        else:
+            self._tmp_path = _tmp_path(path)
+            self._output = self._tmp_path.open('wb')
+            self._output.write(_sidecar_header(0))
+            if append:
+                # tide data file was written without a sidecar (or has been
+                # changed since), so the sidecar starts with its contents
+                self.write(read_tid_file(tid_path, use_sidecar=False))
+
+
+    def write(self, series: TideSeries) -> None:
+        records = np.empty(len(series), dtype=SIDECAR_DTYPE)
+        records['time'] = series.times
+        records['height'] = series.heights
+        self._output.write(records.tobytes())
+        self._count += len(records)
+
+
+    def close(self) -> None:
+        self._output.seek(0)
+        self._output.write(_sidecar_header(self._count))
+        self._output.close()
+        if self._tmp_path is not None:
+            os.replace(self._tmp_path, self.path)
+
+
+    def discard(self) -> None:
+        if self._tmp_path is not None:
+            self._output.close()
+            self._tmp_path.unlink()
+            return
+        self._output.truncate(
+            _SIDECAR_HEADER_SIZE
+            + self._initial_count * SIDECAR_DTYPE.itemsize)
+        self._output.seek(0)
+        self._output.write(_sidecar_header(self._initial_count))
+        self._output.close()
+
+
+def _sidecar_header(count: int) -> bytes:
+    header = repr({
+        'descr': np.lib.format.dtype_to_descr(SIDECAR_DTYPE),
+        'fortran_order': False,
+        'shape': (count,)
+    })
+    # npy version 1.0 header, padded with spaces and ending in a new line
+    header_size = _SIDECAR_HEADER_SIZE - len(np.lib.format.MAGIC_PREFIX) - 4
+    header = header.ljust(header_size - 1) + '\n'
+    return np.lib.format.MAGIC_PREFIX + b'\x01\x00' + \
+        struct.pack('<H', header_size) + header.encode('latin1')
+
+
+def _read_sidecar_count(sidecar_file) -> int:
+    sidecar_file.seek(0)
+    np.lib.format.read_magic(sidecar_file)
+    shape, _, _ = np.lib.format.read_array_header_1_0(sidecar_file)
+    return shape[0]
+
+
+def _sidecar_is_current(path: Path, tid_path: Path) -> bool:
+    """ True if the sidecar exists and has been written since the tide data
+    file was last modified.
+    """
+    try:
+        return path.stat().st_mtime >= tid_path.stat().st_mtime
+    except FileNotFoundError:
+        return False
+
+
+def write_tid_file(
+        path: Path,
+        series: TideSeries,
+        timestamps: Optional[np.ndarray] = None,
+        sidecar: bool = False) -> None:
+    """ Writes the tide series to a tide data file at path, see
+    `TidWriter.write` for timestamps. If sidecar is True the binary sidecar
+    file is also written.
+    """
+    with TidWriter(path, sidecar=sidecar) as writer:
+        writer.write(series, timestamps)
+
+
+def _parse_tid_fixed_width(data: bytes) -> Optional[TideSeries]:
+    """ Parses the tide data lines of a tide data file, all of which must
+    be the standard width. None is returned if they're not, the lines then
+    need to be parsed by `_parse_tid_tokens`.
+    """
+    width = data.find(b'\n') + 1
+    if width not in _LINE_WIDTHS or len(data) % width != 0:
+        return None
+
+    rows = np.frombuffer(data, dtype=np.uint8).reshape(-1, width)
+    # separators and line endings of every line must be in place
+    if not (
+            np.all(rows[:, [4, 7]] == ord('/')) and
+            np.all(rows[:, [10, 16]] == ord(' ')) and
+            np.all(rows[:, 13] == ord(':')) and
+            np.all(rows[:, width - 1] == ord('\n')) and
+            (width == 24 or np.all(rows[:, 23] == ord('\r')))):
+        return None
+
+    digits = rows[:, [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15]].astype(np.int64)
+    digits -= ord('0')
+    if np.any((digits < 0) | (digits > 9)):
+        return None
+
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + \
+        digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    hour = digits[:, 8] * 10 + digits[:, 9]
+    minute = digits[:, 10] * 10 + digits[:, 11]
+
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    times = months.astype('datetime64[m]') + \
+        ((day - 1) * 1440 + hour * 60 + minute).astype('timedelta64[m]')
+
+    try:
+        heights = np.ascontiguousarray(rows[:, 17:23]).view('S6').ravel() \
+            .astype(np.float64)
+    except ValueError:
+        return None
+
+    return TideSeries(times, heights)
+
+
+def _parse_tid_tokens(data: bytes, path: Path) -> TideSeries:
+    """ Parses the tide data lines of a tide data file of any width """
+    tokens = data.decode('ascii', errors='replace').split()
+    if len(tokens) % 3 != 0:
+        raise ValueError(f"{path} includes incomplete lines of tide data")
+    if len(tokens) == 0:
+        return TideSeries(
+            np.empty(0, dtype='datetime64[m]'), np.empty(0, dtype=np.float64))
+
+    tokens = np.array(tokens).reshape(-1, 3)
+    iso = np.char.add(
+        np.char.add(np.char.replace(tokens[:, 0], '/', '-'), 'T'),
+        tokens[:, 1]
+    )
+    try:
+        return TideSeries(
+            iso.astype('datetime64[m]'), tokens[:, 2].astype(np.float64))
+    except ValueError as ex:
+        raise ValueError(f"{path} is not a valid tide data file: {ex}")
+
+
+def read_tid_sidecar(path: Path, mmap_mode: Optional[str] = 'r') -> TideSeries:
+    """ Reads the binary sidecar file of the tide data file at path. By
+    default the sidecar is memory mapped, so the times and heights of the
+    series are only read from disk as they're used.
+    """
+    records = np.load(sidecar_path(path), mmap_mode=mmap_mode)
+    if records.dtype != SIDECAR_DTYPE:
+        raise ValueError(f"{sidecar_path(path)} is not a tide sidecar file")
+    return TideSeries(records['time'], records['height'])
+
+
+def read_tid_file(path: Path, use_sidecar: bool = True) -> TideSeries:
+    """ Reads a tide data file into a TideSeries.
+
+    If use_sidecar is True and the tide data file has a sidecar that is
+    up to date, the (memory mapped) sidecar is read instead. Note the sidecar
+    heights are float32 and are not rounded to cm as they are in the tide
+    data file.
+
+    Raises a ValueError if the file is not a valid tide data file.
+    """
+    if use_sidecar and _sidecar_is_current(sidecar_path(path), path):
+        return read_tid_sidecar(path)
+
+    data = path.read_bytes()
+    header_end = data.find(b'\n') + 1
+    header = data[:header_end].strip()
+    if header_end == 0 or header != TID_HEADER.strip().encode():
+        raise ValueError(f"{path} is not a tide data file")
+    data = data[header_end:]
+
+    # nearly all tide data files are made up of fixed width lines that
+    # are parsed directly from the bytes of the file
+    series = _parse_tid_fixed_width(data)
+    if series is None:
+        series = _parse_tid_tokens(data, path)
+    return series
+
+
+def _parse_timestamp(line: str) -> np.datetime64:
+    """ Parses the timestamp at the start of a tide data file line """
+    timestamp = line[:16]
+    if len(timestamp) != 16 or timestamp[4] != '/' or timestamp[10] != ' ':
+        raise ValueError(f"Bad tide data line \"{line.strip()}\"")
+    iso = timestamp.replace('/', '-').replace(' ', 'T')
+    return np.datetime64(iso, 'm')
+
+
+def read_tid_extent(
+        path: Path
+        ) -> Tuple[np.datetime64, np.datetime64, np.timedelta64]:
+    """ Reads the first and last timestamps of a tide data file, along with
+    the time between the last two lines. Only the start and end of the file
+    are read.
+
+    Raises a ValueError if the file does not contain at least two lines of
+    tide data, or is not terminated by a new line (eg; an incomplete write).
+    """
+    with path.open('rb') as tid_file:
+        header = tid_file.readline()
+        first_line = tid_file.readline()
+        if header.strip() != TID_HEADER.strip().encode() or not first_line:
+            raise ValueError(f"{path} is not a tide data file")
+
+        # the last two lines are well within the last 256 bytes
+        tid_file.seek(0, 2)
+        size = tid_file.tell()
+        tid_file.seek(max(0, size - 256))
+        tail = tid_file.read()
+
+    if not tail.endswith(b'\n'):
+        raise ValueError(f"{path} does not end with a complete line")
+    lines = tail.decode().splitlines()
+    if len(lines) < 2 or lines[-2].strip() == TID_HEADER.strip():
+        raise ValueError(f"{path} includes less than two lines of tide data")
+
+    first = _parse_timestamp(first_line.decode())
+    last = _parse_timestamp(lines[-1])
+    spacing = last - _parse_timestamp(lines[-2])
+
+    return first, last, spacing
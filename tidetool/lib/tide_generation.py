@@ -3,11 +3,387 @@ a Zone Definition File.
 """
 
 
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import math
+import os
+import queue
+import threading
+import numpy as np
 
+from tidetool.lib import profiling
+from tidetool.lib.batch import ZdfJob
+from tidetool.lib.cache import PredictionCache, config_digest, \
+    default_cache_folder
+from tidetool.lib.fes_config import DEFAULT_REGION_MARGIN, Region, \
+    regional_data_folder
+from tidetool.lib.spatial import LocationIndex
 from tidetool.lib.zdf import ZdfParser
-from tidetool.lib.tides import get_tide_data
+from tidetool.lib.tide_file import format_timestamps, read_tid_extent, \
+    sidecar_path, TidWriter
+from tidetool.lib.tide_series import DEFAULT_CHUNK_SIZE, TideSeries, \
+    count_dates_between, iter_dates_between
+from tidetool.lib.tides import DEFAULT_INTERPOLATION_TOLERANCE, \
+    MAX_POINTS_PER_CALL, create_tide_model
+
+
+# maximum number of predicted windows waiting to be written, bounds the
+# memory used when predicting is faster than writing. One window can be
+# predicted while another is written, so this is all that's needed for the
+# two to overlap.
+WRITE_QUEUE_SIZE = 1
+
+# most files (tide files, sidecars and prediction cache entries) a process
+# holds open while writing a group of locations. Short date ranges give
+# large groups, this keeps them well within the default open file limits
+# (1024 on linux, 512 on windows).
+MAX_OPEN_FILES = 128
+
+# most formatted timestamps kept for reuse by later groups of stations, 17
+# bytes each (about 34 MB, or 4 years of dates at 1 minute)
+MAX_CACHED_TIMESTAMPS = 2_000_000
+
+
+class _WriterThread:
+    """ Background thread that runs the write jobs submitted to it, in the
+    order they were submitted. This lets the next window of tide data be
+    predicted while the last one is written. At most max_pending jobs wait
+    in the queue, `submit` blocks until there is room.
+
+    An error raised by a job is raised again by the next call to `submit`
+    or `close`, any jobs after it are skipped.
+    """
+
+    def __init__(self, max_pending: int = WRITE_QUEUE_SIZE) -> None:
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            if self._error is not None or self._stopped:
+                continue
+            function, args = job
+            try:
+                function(*args)
+            except BaseException as ex:
+                self._error = ex
+
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+
+    def submit(self, function: Callable, *args) -> None:
+        self._raise_error()
+        self._queue.put((function, args))
+
+
+    def close(self) -> None:
+        """ Waits for all jobs to finish """
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+
+    def stop(self) -> None:
+        """ Skips any jobs that haven't been started, and waits for the
+        current job to finish. Errors are not raised.
+        """
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join()
+
+
+def _write_window(
+        writes: List[Tuple[TidWriter, TideSeries]],
+        cache_writes: List[Tuple[object, TideSeries]],
+        timestamps: np.ndarray) -> None:
+    """ Writes a window of tide data to each of the tide files and cache
+    entries, run by the writer thread.
+    """
+    for writer, series in writes:
+        with profiling.phase('write', len(series), [writer.path]):
+            writer.write(series, timestamps)
+    for cache_writer, series in cache_writes:
+        with profiling.phase('cache_write', len(series)):
+            cache_writer.write(series)
+
+
+class _TimestampCache:
+    """ Formatted timestamps of each window of dates, keyed by the window's
+    first date. Every group of stations is written in the same windows, so
+    each window is only formatted once per run. Windows are cached until
+    they hold MAX_CACHED_TIMESTAMPS timestamps, windows after that are
+    formatted each time they're used.
+    """
+
+    def __init__(self) -> None:
+        # (first date, length): timestamps of each window
+        self._windows = {}
+        self._count = 0
+
+
+    def get(self, dates: np.ndarray) -> np.ndarray:
+        key = (dates[0], len(dates))
+        timestamps = self._windows.get(key)
+        if timestamps is None:
+            with profiling.phase('format_timestamps', len(dates)):
+                timestamps = format_timestamps(dates)
+            if self._count + len(dates) <= MAX_CACHED_TIMESTAMPS:
+                self._windows[key] = timestamps
+                self._count += len(dates)
+        return timestamps
+
+
+class _GenerationContext:
+    """ State used to generate tide files within a single process; the
+    tide model, timestamp cache and prediction cache (if enabled).
+    """
+
+    def __init__(
+            self,
+            data_folder: Path,
+            engine: str,
+            cache_folder: Optional[Path],
+            cache_size: Optional[int],
+            model_step: Optional[int],
+            tolerance: float,
+            region: Optional[Region],
+            threads: int) -> None:
+        # interpolated predictions are cached separately from those
+        # predicted at every date
+        self.engine = engine
+        if model_step is not None:
+            self.engine = f"{engine}-step{model_step}"
+        self.tide_model = create_tide_model(
+            data_folder, engine, cache_folder, model_step, tolerance, region,
+            threads)
+        self.timestamp_cache = _TimestampCache()
+
+        # predictions are only cached if a cache size has been given
+        self.prediction_cache = None
+        if cache_size is not None:
+            if cache_folder is None:
+                cache_folder = default_cache_folder()
+            self.prediction_cache = PredictionCache(
+                cache_folder.joinpath('predictions'),
+                config_digest(data_folder),
+                cache_size
+            )
+
+
+    def close(self) -> None:
+        self.tide_model.close()
+
+
+    def cache_counts(self) -> Tuple[int, int]:
+        """ Number of prediction cache hits and misses so far """
+        if self.prediction_cache is None:
+            return (0, 0)
+        return (self.prediction_cache.hits, self.prediction_cache.misses)
+
+
+    def write_tide_files(
+            self,
+            location_files: List[List[Path]],
+            locations: List[Tuple[float, float]],
+            start_date: datetime, end_date: datetime,
+            time_period: int,
+            chunk: int,
+            append: bool,
+            sidecar: bool) -> List[Path]:
+        """ Predicts the tide data for each location and writes it to each
+        of the matching output files. If append is True the tide data is
+        added to the end of existing tide files. If sidecar is True the
+        binary sidecar file is written with each tide file, the paths of
+        the sidecars that didn't already exist are returned. The date range
+        is processed in windows of at most chunk dates, each window is
+        written to the files as soon as it has been predicted so memory use
+        does not depend on the length of the date range. Windows are written
+        by a background thread while the next window is predicted.
+
+        Tide files are only moved into place (see `TidWriter`) once all the
+        windows have been written, if anything fails all the files are left
+        as they were.
+
+        Locations found in the prediction cache are copied from the cache
+        rather than predicted, all other predictions are added to the cache.
+        """
+        count = count_dates_between(start_date, end_date, time_period)
+        cache = self.prediction_cache
+        if count == 0:
+            # nothing worth caching
+            cache = None
+
+        # series from the cache, None for locations that must be predicted
+        cached = [None] * len(locations)
+        if cache is not None:
+            with profiling.phase('cache_read'):
+                cached = [
+                    cache.get(
+                        latitude, longitude,
+                        start_date, end_date,
+                        time_period,
+                        self.engine)
+                    for latitude, longitude in locations
+                ]
+        predicted = [i for i, c in enumerate(cached) if c is None]
+        predicted_locations = [locations[i] for i in predicted]
+        # output files of the predicted locations, prediction time is
+        # shared between these when profiling
+        predicted_files = [f for i in predicted for f in location_files[i]]
+
+        # list of writers for each location
+        writers = []
+        cache_writers = []
+        writer_thread = _WriterThread()
+        try:
+            for output_files in location_files:
+                writers.append([])
+                for output_file in output_files:
+                    writers[-1].append(
+                        TidWriter(output_file, append, sidecar))
+            if cache is not None:
+                for i in predicted:
+                    latitude, longitude = locations[i]
+                    cache_writers.append(cache.writer(
+                        latitude, longitude,
+                        start_date, end_date,
+                        time_period,
+                        self.engine,
+                        count
+                    ))
+
+            first = 0
+            for dates in iter_dates_between(
+                    start_date, end_date, time_period, chunk):
+                timestamps = self.timestamp_cache.get(dates)
+                last = first + len(dates)
+
+                with profiling.phase(
+                        'predict',
+                        len(dates) * len(predicted_locations),
+                        predicted_files):
+                    all_series = list(self.tide_model.calculate_stations(
+                        dates, predicted_locations))
+
+                # (writer, series) of everything written for this window
+                writes = []
+                cache_writes = []
+                for j, series in enumerate(all_series):
+                    for writer in writers[predicted[j]]:
+                        writes.append((writer, series))
+                    if len(cache_writers) > 0:
+                        cache_writes.append((cache_writers[j], series))
+                for location_writers, series in zip(writers, cached):
+                    if series is None:
+                        continue
+                    for writer in location_writers:
+                        writes.append((writer, series[first:last]))
+
+                writer_thread.submit(
+                    _write_window, writes, cache_writes, timestamps)
+                first = last
+
+            writer_thread.close()
+        except BaseException:
+            writer_thread.stop()
+            for cache_writer in cache_writers:
+                cache_writer.discard()
+            for location_writers in writers:
+                for writer in location_writers:
+                    writer.discard()
+            raise
+
+        for cache_writer in cache_writers:
+            cache_writer.commit()
+        created_sidecars = []
+        for location_writers in writers:
+            for writer in location_writers:
+                writer.close()
+                if writer.created_sidecar:
+                    created_sidecars.append(sidecar_path(writer.path))
+        return created_sidecars
+
+
+# Each worker process creates its own generation context, as pyfes handlers
+# can't be shared across processes. This is created once when the worker
+# starts by _init_worker.
+_worker_context = None
+
+
+def _init_worker(profile: bool, trace_memory: bool, *args) -> None:
+    """ Worker process initializer, see `_GenerationContext` for args. If
+    profile is True the worker is profiled (see `profiling.start`).
+    """
+    global _worker_context
+    if profile:
+        profiling.start(trace_memory)
+    _worker_context = _GenerationContext(*args)
+
+
+def _generate_tide_files(
+        location_files: List[List[Path]],
+        *args
+        ) -> Tuple[List[List[Path]], List[Path], int, int, Optional[dict]]:
+    """ Worker process function, see `_GenerationContext.write_tide_files`
+    for args. Returns the output files and the sidecars created, along with
+    the number of prediction cache hits and misses, and the profile
+    snapshot (if profiling).
+    """
+    hits, misses = _worker_context.cache_counts()
+    created_sidecars = _worker_context.write_tide_files(location_files, *args)
+    new_hits, new_misses = _worker_context.cache_counts()
+
+    snapshot = None
+    if profiling.enabled():
+        snapshot = profiling.get_profiler().take_snapshot()
+    return (
+        location_files, created_sidecars,
+        new_hits - hits, new_misses - misses,
+        snapshot
+    )
+
+
+class _GenerationRun:
+    """ Group of tide files that are generated for the same date range and
+    time period. Tide files that share a location (see `LocationIndex`)
+    share a single prediction, even if they're listed in different zdf
+    files.
+    """
+
+    def __init__(
+            self,
+            start_date: datetime, end_date: datetime,
+            time_period: int,
+            append: bool,
+            grid_cell_size: float) -> None:
+        self.start_date = start_date
+        self.end_date = end_date
+        self.time_period = time_period
+        # tide data is appended to existing files
+        self.append = append
+
+        self.location_index = LocationIndex(grid_cell_size)
+        # list of the output files for each location in the location index
+        self.location_files = []
+
+
+    def add(self, latitude: float, longitude: float, output_file: Path) -> None:
+        group = self.location_index.add(latitude, longitude)
+        if group == len(self.location_files):
+            self.location_files.append([])
+        self.location_files[group].append(output_file)
 
 
 class TideGenerator:
@@ -22,9 +398,66 @@ class TideGenerator:
         # if false the process will raise a runtime error. If true
         # it will replace existing files.
         self.overwrite = False
+        # number of processes used to generate tide files, if more than one
+        # the tide stations are spread across a pool of worker processes
+        self.workers = 1
+        # maximum number of dates predicted and written at a time, this
+        # bounds memory use for long date ranges
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+        # prediction engine, see `create_tide_model` for options
+        self.engine = 'fes'
+        # folder for cached data, if None the default cache folder is used
+        self.cache_folder = None
+        # maximum size (bytes) of the prediction cache. Predictions are only
+        # cached if this is set.
+        self.cache_size = None
+        # tide stations within the same grid cell (of this size in degrees)
+        # share a single prediction. If zero only stations with exactly the
+        # same location share a prediction.
+        self.grid_cell_size = 0.0
+        # if True existing tide files are extended to the end date, only
+        # the missing tide data is predicted and appended to the file
+        self.extend = False
+        # if True a binary sidecar file (see `tide_file.read_tid_sidecar`)
+        # is written along with each tide file
+        self.sidecar = False
+        # if set the tide model is evaluated every model_step minutes, with
+        # the heights interpolated to the time period (see
+        # `tides.InterpolatedTideModel`). The interpolated heights must be
+        # within interpolation_tolerance cm of a direct prediction.
+        self.model_step = None
+        self.interpolation_tolerance = DEFAULT_INTERPOLATION_TOLERANCE
+        # if True the FES grids are cropped to the region around all the
+        # tide stations (plus region_margin degrees) and loaded into memory,
+        # see `fes_config.regional_data_folder`
+        self.regional_grids = False
+        self.region_margin = DEFAULT_REGION_MARGIN
+        # if set the tide data of all tide stations is also written to this
+        # NetCDF file (see `tide_netcdf`)
+        self.netcdf_file = None
+        # number of threads each process uses to predict, long date ranges
+        # are split into time slices predicted in parallel (see
+        # `tides.ThreadedTideModel`)
+        self.threads = 1
 
         self._tidefile_count = 0
         self._tidefile_total = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._extend_skipped = 0
+        self._extend_current = 0
+        # location, date range and time period of each output file, and
+        # the number of tide files listed again by another tide station
+        self._output_listings = {}
+        self._duplicate_count = 0
+        # tide station name of each output file
+        self._station_names = {}
+        # sidecars written by this run that didn't already exist
+        self._created_sidecars = []
+
+        # pyfes handlers are expensive to create, so one tide model is
+        # created per run and shared by all tide stations
+        self._context = None
 
 
     def _log_message(self, message: str) -> None:
@@ -37,24 +470,10 @@ class TideGenerator:
         self.log_function(message)
 
 
-    def _process_tide_station(
-            self,
-            output_location: Path,
-            filename: str,
-            start_date: datetime, end_date: datetime,
-            time_period: int,
-            latitude: float, longitude: float) -> None:
-        """ generates a tide data file with the given filename in the
-        output_location folder
+    def _check_output_file(self, output_file: Path) -> None:
+        """ Raises a RuntimeError if the output file exists and the
+        overwrite option has not been set.
         """
-        tide_data = get_tide_data(
-            self.data_folder,
-            start_date, end_date,
-            latitude, longitude,
-            time_period
-        )
-
-        output_file = output_location.joinpath(filename)
         if output_file.exists() and not self.overwrite:
             # then we should not overwrite the file
             self._log_message(
@@ -64,61 +483,446 @@ class TideGenerator:
             )
             raise RuntimeError(
                 f"File {output_file} exists without overwrite option")
+
+
+    def _log_progress(self, output_file: Path) -> None:
         self._log_message(
             "Generating tide file ("
             f"{self._tidefile_count}/{self._tidefile_total}"
             f") {output_file}"
         )
 
-        with output_file.open('w') as output:
-            # all tide files start with this line
-            output.write('--------\n')
-            for td in tide_data:
-                timestamp, height = td
-                # CARIS tide files use UTC so don't need to include zone
-                timestamp_str = timestamp.strftime("%Y/%m/%d %H:%M")
-                # height is always 6 chars wide, right justified
-                height_str = f"{height: .2f}".rjust(6)
-                line = f"{timestamp_str} {height_str}\n"
-                output.write(line)
 
+    def _group_size(
+            self,
+            start_date: datetime, end_date: datetime,
+            time_period: int) -> int:
+        """ Number of locations predicted together, so that each window of
+        each group is a single pyfes calculate call.
+        """
+        window = min(
+            self.chunk_size,
+            count_dates_between(start_date, end_date, time_period)
+        )
+        return max(1, MAX_POINTS_PER_CALL // max(1, window))
 
-    def generate_tides_from_zdf(
+
+    def _group_bounds(
             self,
-            zone_definition: Path,
+            location_files: List[List[Path]],
+            group_size: int) -> Iterator[Tuple[int, int]]:
+        """ (first, last) index of each group of locations, with at most
+        group_size locations and MAX_OPEN_FILES files open while a group is
+        written.
+        """
+        # each tide file (and sidecar) is open while a group is written,
+        # along with a cache entry per location when caching
+        sidecar = self.sidecar or self.netcdf_file is not None
+        per_file = 2 if sidecar else 1
+        per_location = 1 if self.cache_size is not None else 0
+
+        first = 0
+        open_files = 0
+        for i, output_files in enumerate(location_files):
+            files = per_location + per_file * len(output_files)
+            if i > first and (
+                    i - first >= group_size
+                    or open_files + files > MAX_OPEN_FILES):
+                yield first, i
+                first = i
+                open_files = 0
+            open_files += files
+        if first < len(location_files):
+            yield first, len(location_files)
+
+
+    def _groups(
+            self,
+            runs: List[_GenerationRun],
+            max_group_size: Optional[int] = None) -> Iterator[Tuple]:
+        """ Splits the locations of each run into groups, yielding the
+        arguments for `_GenerationContext.write_tide_files` for each group.
+        """
+        for run in runs:
+            group_size = self._group_size(
+                run.start_date, run.end_date, run.time_period)
+            if max_group_size is not None:
+                group_size = min(group_size, max_group_size)
+            locations = run.location_index.locations
+            for first, last in self._group_bounds(
+                    run.location_files, group_size):
+                yield (
+                    run.location_files[first:last],
+                    locations[first:last],
+                    run.start_date, run.end_date,
+                    run.time_period,
+                    self.chunk_size,
+                    run.append,
+                    # the NetCDF file is written from the sidecars
+                    self.sidecar or self.netcdf_file is not None
+                )
+
+
+    def _log_group_progress(self, location_files: List[List[Path]]) -> None:
+        for output_files in location_files:
+            for output_file in output_files:
+                self._tidefile_count += 1
+                self._log_progress(output_file)
+
+
+    def _region(self, runs: List[_GenerationRun]) -> Optional[Region]:
+        """ Region covered by the regional grids, None if they're not
+        used.
+        """
+        if not self.regional_grids:
+            return None
+        locations = [
+            location
+            for run in runs
+            for location in run.location_index.locations
+        ]
+        region = Region.from_locations(locations, self.region_margin)
+        self._log_message(f"Using regional AVISO FES grids, {region}")
+        return region
+
+
+    def _generate_serial(
+            self,
+            runs: List[_GenerationRun],
+            region: Optional[Region]) -> None:
+        """ Generates all tide files within this process """
+        self._context = _GenerationContext(
+            self.data_folder,
+            self.engine,
+            self.cache_folder,
+            self.cache_size,
+            self.model_step,
+            self.interpolation_tolerance,
+            region,
+            self.threads
+        )
+
+        try:
+            for group in self._groups(runs):
+                self._created_sidecars.extend(
+                    self._context.write_tide_files(*group))
+                self._log_group_progress(group[0])
+        finally:
+            self._context.close()
+
+        self._cache_hits, self._cache_misses = self._context.cache_counts()
+
+
+    def _generate_parallel(
+            self,
+            runs: List[_GenerationRun],
+            region: Optional[Region]) -> None:
+        """ Generates all tide files using a pool of worker processes. The
+        locations are split into groups, each group is handled by a single
+        call to a worker.
+        """
+        # several groups per worker helps to keep all workers busy until
+        # the end of the run
+        location_count = sum(len(run.location_index.locations) for run in runs)
+        max_group_size = math.ceil(location_count / (self.workers * 4))
+
+        with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(
+                    profiling.enabled(),
+                    profiling.enabled() and
+                        profiling.get_profiler().trace_memory,
+                    self.data_folder,
+                    self.engine,
+                    self.cache_folder,
+                    self.cache_size,
+                    self.model_step,
+                    self.interpolation_tolerance,
+                    region,
+                    self.threads
+                )
+                ) as executor:
+            futures = [
+                executor.submit(_generate_tide_files, *group)
+                for group in self._groups(runs, max_group_size)
+            ]
+
+            # results are collected in the order they were submitted so
+            # progress is reported in the same order as the zdf file
+            for future in futures:
+                group_files, created_sidecars, hits, misses, snapshot = \
+                    future.result()
+                self._created_sidecars.extend(created_sidecars)
+                self._cache_hits += hits
+                self._cache_misses += misses
+                if snapshot is not None:
+                    profiling.get_profiler().merge(snapshot)
+                self._log_group_progress(group_files)
+
+
+    def _write_netcdf(self, run: _GenerationRun) -> None:
+        """ Writes the tide data of every tide file (in the order they were
+        listed) to the NetCDF file.
+        """
+        from tidetool.lib.tide_netcdf import write_tide_netcdf_from_sidecars
+
+        tide_files = list(self._output_listings)
+        stations = []
+        for tide_file in tide_files:
+            latitude, longitude = self._output_listings[tide_file][:2]
+            # tide files are named relative to the NetCDF file if possible
+            try:
+                name = os.path.relpath(tide_file, self.netcdf_file.parent)
+            except ValueError:
+                name = str(tide_file)
+            stations.append((
+                self._station_names[tide_file], latitude, longitude, name))
+
+        count = count_dates_between(
+            run.start_date, run.end_date, run.time_period)
+        with profiling.phase('write_netcdf', count * len(stations)):
+            write_tide_netcdf_from_sidecars(
+                self.netcdf_file,
+                stations, tide_files,
+                run.start_date, run.time_period,
+                count
+            )
+        self._log_message(
+            f"Wrote tide data for {len(stations)} tide stations to "
+            f"{self.netcdf_file}")
+
+
+    def _remove_sidecars(self) -> None:
+        """ Removes the sidecars created for the NetCDF file, sidecars that
+        were there before the run (and have been rewritten) are kept.
+        """
+        for path in self._created_sidecars:
+            path.unlink(missing_ok=True)
+        self._created_sidecars = []
+
+
+    def _extend_from(
+            self,
+            output_file: Path,
             start_date: datetime, end_date: datetime,
-            time_period: int) -> None:
-        """ Reads the input zone_definition file to extract file names
-        and locations to generate tide data files for. The tide data
-        files are created using tidal predictions from the AVISO FES
-        library.
+            time_period: int) -> Optional[datetime]:
+        """ Date from which an existing tide file needs to be extended, or
+        None if the tide file can't (or doesn't need to) be extended. The
+        reason a file isn't extended is passed to the log function.
+        """
+        step = np.timedelta64(time_period, 'm')
+        try:
+            with profiling.phase('read_tid_extent'):
+                first, last, spacing = read_tid_extent(output_file)
+        except ValueError as ex:
+            self._extend_skipped += 1
+            self._log_message(f"Can't extend tide file: {ex}")
+            return None
+
+        if first != np.datetime64(start_date, 'm') or spacing != step:
+            self._extend_skipped += 1
+            self._log_message(
+                f"Can't extend tide file {output_file}, it starts at {first} "
+                f"with a {spacing} time period which does not match the "
+                f"start date {start_date} and time period of {step}"
+            )
+            return None
+
+        extend_from = (last + step).astype(datetime)
+        if count_dates_between(extend_from, end_date, time_period) == 0:
+            self._extend_current += 1
+            return None
+
+        return extend_from
+
+
+    def _add_zdf(self, job: ZdfJob, runs: Dict[Tuple, _GenerationRun]) -> int:
+        """ Adds the tide files of each tide station in the job's zdf file
+        to the run for its date range, creating runs as needed. Returns the
+        number of tide stations found.
+
+        A tide file listed more than once (eg; by zdf files in the same
+        folder) is only generated once, a RuntimeError is raised if it's
+        listed with a different date range, time period or location.
         """
         zdf_parser = ZdfParser()
-        zdf_parser.read(Path(zone_definition))
+        with profiling.phase('read_zdf'):
+            zdf_parser.read(Path(job.zone_definition))
 
         zdf = zdf_parser.zdf
 
-        output_folder = zone_definition.parent
+        output_folder = Path(job.zone_definition).parent
 
         tide_station_blocks = zdf.get_blocks_by_type('TIDE_STATION')
 
-        # keep track of tide file count for progress reporting
-        self._tidefile_total = sum(
-            [len(ts.data) for ts in tide_station_blocks]
-        )
-        self._tidefile_count = 0
-
+        station_count = 0
         # loop through each one of the tide station block (probably only one)
         # and then each of the data lines (one data line per tode station /
         # output file)
         for tsb in tide_station_blocks:
             for tsb_entry in tsb.data:
-                self._tidefile_count += 1
-                _, latitude, longitude, _, _, filename = tsb_entry
-                self._process_tide_station(
-                    output_folder,
-                    filename,
-                    start_date, end_date,
-                    time_period,
-                    latitude, longitude
+                name, latitude, longitude, _, _, filename = tsb_entry
+                output_file = output_folder.joinpath(filename)
+                station_count += 1
+
+                listing = (
+                    latitude, longitude,
+                    job.start_date, job.end_date, job.time_period
                 )
+                previous = self._output_listings.get(output_file)
+                if previous is not None:
+                    if previous != listing:
+                        raise RuntimeError(
+                            f"Tide file {output_file} is listed more than "
+                            "once with a different location, date range or "
+                            "time period")
+                    self._duplicate_count += 1
+                    continue
+                self._output_listings[output_file] = listing
+                self._station_names[output_file] = name
+
+                run_start = job.start_date
+                append = False
+                if self.extend and output_file.exists():
+                    run_start = self._extend_from(
+                        output_file,
+                        job.start_date, job.end_date,
+                        job.time_period)
+                    append = True
+                    if run_start is None:
+                        continue
+
+                key = (run_start, job.end_date, job.time_period, append)
+                run = runs.get(key)
+                if run is None:
+                    run = _GenerationRun(
+                        run_start, job.end_date, job.time_period, append,
+                        self.grid_cell_size)
+                    runs[key] = run
+                run.add(latitude, longitude, output_file)
+
+                # keep track of tide file count for progress reporting
+                self._tidefile_total += 1
+
+        return station_count
+
+
+    def generate_tides_from_zdfs(self, jobs: List[ZdfJob]) -> None:
+        """ Generates the tide data files of each zdf file in jobs (see
+        `generate_tides_from_zdf`) using a single tide model. Tide stations
+        are collected from all the zdf files before any predictions are
+        made, so each location, date range and time period is predicted
+        once no matter how many zdf files it's listed in. One summary is
+        logged for all the zdf files.
+        """
+        self._tidefile_count = 0
+        self._tidefile_total = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._extend_skipped = 0
+        self._extend_current = 0
+        self._output_listings = {}
+        self._duplicate_count = 0
+        self._station_names = {}
+        # sidecars written by this run that didn't already exist
+        self._created_sidecars = []
+
+        if self.netcdf_file is not None and self.extend:
+            raise ValueError(
+                "NetCDF output can't be written when extending tide files")
+
+        # tide files are generated in runs, each run covers the same date
+        # range and time period. Unless extending existing tide files
+        # there's one run per date range.
+        runs = {}
+        station_count = 0
+        for job in jobs:
+            station_count += self._add_zdf(job, runs)
+
+        runs = list(runs.values())
+        location_count = sum(len(run.location_index.locations) for run in runs)
+
+        if self.netcdf_file is not None and len(runs) > 1:
+            raise ValueError(
+                "NetCDF output needs all tide files to have the same date "
+                "range and time period")
+
+        # all output files are checked before anything is predicted, so the
+        # run fails straight away rather than part way through
+        if self.netcdf_file is not None:
+            self._check_output_file(self.netcdf_file)
+        for run in runs:
+            if run.append:
+                continue
+            for output_files in run.location_files:
+                for output_file in output_files:
+                    self._check_output_file(output_file)
+
+        if location_count > 0:
+            # the regional grids are created here rather than by each
+            # worker process
+            region = self._region(runs)
+            if region is not None:
+                regional_data_folder(
+                    self.data_folder, region, self.cache_folder,
+                    self._log_message)
+            try:
+                if self.workers > 1:
+                    self._generate_parallel(runs, region)
+                else:
+                    self._generate_serial(runs, region)
+
+                if self.netcdf_file is not None:
+                    self._write_netcdf(runs[0])
+            finally:
+                # sidecars that weren't asked for are removed, even if the
+                # tide files or NetCDF file couldn't be written
+                if not self.sidecar:
+                    self._remove_sidecars()
+
+        if len(jobs) > 1:
+            self._log_message(
+                f"Read {station_count} tide stations from {len(jobs)} zdf "
+                f"files, {self._duplicate_count} skipped as their tide file "
+                "was already listed"
+            )
+        self._log_message(
+            f"Predicted tide data for {location_count} locations, "
+            f"{self._tidefile_total - location_count} predictions saved by "
+            "tide stations sharing a location"
+        )
+        if self.extend:
+            extended = sum(
+                len(output_files)
+                for run in runs if run.append
+                for output_files in run.location_files
+            )
+            self._log_message(
+                f"Extended {extended} tide files, "
+                f"{self._extend_current} already up to date, "
+                f"{self._extend_skipped} could not be extended"
+            )
+        if self.cache_size is not None:
+            self._log_message(
+                f"Prediction cache: {self._cache_hits} hits, "
+                f"{self._cache_misses} misses"
+            )
+
+
+    def generate_tides_from_zdf(
+            self,
+            zone_definition: Path,
+            start_date: datetime, end_date: datetime,
+            time_period: int) -> None:
+        """ Reads the input zone_definition file to extract file names
+        and locations to generate tide data files for. The tide data
+        files are created using tidal predictions from the AVISO FES
+        library.
+
+        If the extend option is set, existing tide data files are extended
+        up to the end date rather than being generated again.
+        """
+        self.generate_tides_from_zdfs([
+            ZdfJob(zone_definition, start_date, end_date, time_period)
+        ])
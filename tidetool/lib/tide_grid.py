@@ -0,0 +1,255 @@
+""" Module for predicting a tide surface over the zone polygons of a zdf
+file, eg; to QC the zoning of a survey.
+
+The zones are rasterized onto a regular latitude / longitude grid of nodes
+(`TideGrid`), and the tide is predicted at every node within a zone. Heights
+are written to a numpy npy file of shape (time, latitude, longitude), with
+NaN for nodes outside the zones. The grid and dates are described by a json
+file written next to it (eg; grid.npy and grid.json), see `read_tide_grid`.
+
+Grids can include millions of nodes, so nothing is held in memory for the
+whole grid and date range. Dates are predicted in windows of at most
+chunk_points (nodes x dates), which are appended to the npy file as they're
+predicted. Only when a single date of the grid exceeds chunk_points is a
+window predicted in groups of nodes.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import math
+import os
+import numpy as np
+
+from tidetool.lib import profiling
+from tidetool.lib.tide_file import _tmp_path
+from tidetool.lib.tide_series import count_dates_between, iter_dates_between
+from tidetool.lib.tides import MAX_POINTS_PER_CALL, BaseTideModel
+from tidetool.lib.zdf import ZdfZone
+
+
+# maximum number of points (nodes x dates) predicted and held in memory at
+# a time
+GRID_CHUNK_POINTS = MAX_POINTS_PER_CALL
+
+# maximum number of nodes tested against a zone polygon at a time
+RASTER_CHUNK_NODES = 1_000_000
+
+
+class TideGrid:
+    """ Regular grid of nodes, resolution degrees apart, starting from
+    (lat_start, lon_start) at the south west corner.
+    """
+
+    def __init__(
+            self,
+            lat_start: float, lon_start: float,
+            resolution: float,
+            lat_count: int, lon_count: int) -> None:
+        self.lat_start = lat_start
+        self.lon_start = lon_start
+        self.resolution = resolution
+        self.lat_count = lat_count
+        self.lon_count = lon_count
+
+
+    @classmethod
+    def from_zones(cls, zones: List[ZdfZone], resolution: float) -> 'TideGrid':
+        """ Smallest grid (aligned to multiples of the resolution) that
+        covers all the zones.
+        """
+        if resolution <= 0:
+            raise ValueError("Grid resolution must be greater than zero")
+        vertices = np.array([v for zone in zones for v in zone.vertices])
+        if len(vertices) == 0:
+            raise ValueError("Zones have no vertices")
+        lat_min, lon_min = vertices.min(axis=0)
+        lat_max, lon_max = vertices.max(axis=0)
+
+        # small tolerance so a zone edge exactly on a node includes it
+        def start(value):
+            return math.floor(value / resolution + 1e-9) * resolution
+
+        def count(first, last):
+            return int(math.floor((last - first) / resolution + 1e-9)) + 1
+
+        lat_start = start(lat_min)
+        lon_start = start(lon_min)
+        return cls(
+            lat_start, lon_start,
+            resolution,
+            count(lat_start, lat_max),
+            count(lon_start, lon_max)
+        )
+
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (self.lat_count, self.lon_count)
+
+
+    def latitudes(self) -> np.ndarray:
+        return self.lat_start + np.arange(self.lat_count) * self.resolution
+
+
+    def longitudes(self) -> np.ndarray:
+        return self.lon_start + np.arange(self.lon_count) * self.resolution
+
+
+def points_in_polygon(
+        latitudes: np.ndarray, longitudes: np.ndarray,
+        vertices: List[Tuple[float, float]]) -> np.ndarray:
+    """ Boolean array, True for the points inside the polygon (even-odd
+    rule). The polygon is closed from the last vertex back to the first.
+    """
+    inside = np.zeros(len(latitudes), dtype=bool)
+    lat_j, lon_j = vertices[-1]
+    for lat_i, lon_i in vertices:
+        # points level with the edge, where a ray east from the point
+        # crosses it
+        crosses = np.flatnonzero((lat_i > latitudes) != (lat_j > latitudes))
+        edge_lon = lon_i + (latitudes[crosses] - lat_i) * \
+            (lon_j - lon_i) / (lat_j - lat_i)
+        inside[crosses] ^= longitudes[crosses] < edge_lon
+        lat_j, lon_j = lat_i, lon_i
+    return inside
+
+
+def rasterize_zones(grid: TideGrid, zones: List[ZdfZone]) -> np.ndarray:
+    """ Boolean array of the grid shape, True for nodes inside any of the
+    zones. Zones with fewer than three vertices cover no nodes.
+
+    Nodes on the south or west edge of a zone are inside it and those on
+    the north or east edge aren't, so zones that share an edge never
+    share nodes.
+    """
+    mask = np.zeros(grid.shape, dtype=bool)
+    latitudes = grid.latitudes()
+    longitudes = grid.longitudes()
+
+    for zone in zones:
+        if len(zone.vertices) < 3:
+            continue
+        vertices = np.array(zone.vertices)
+        # only the nodes within the zone's bounding box are tested
+        rows = np.flatnonzero(
+            (latitudes >= vertices[:, 0].min())
+            & (latitudes <= vertices[:, 0].max()))
+        cols = np.flatnonzero(
+            (longitudes >= vertices[:, 1].min())
+            & (longitudes <= vertices[:, 1].max()))
+        if len(rows) == 0 or len(cols) == 0:
+            continue
+
+        block_rows = max(1, RASTER_CHUNK_NODES // len(cols))
+        for first in range(0, len(rows), block_rows):
+            block = rows[first:first + block_rows]
+            lats = np.repeat(latitudes[block], len(cols))
+            lons = np.tile(longitudes[cols], len(block))
+            inside = points_in_polygon(lats, lons, zone.vertices)
+            mask[block[0]:block[-1] + 1, cols[0]:cols[-1] + 1] |= \
+                inside.reshape(len(block), len(cols))
+    return mask
+
+
+def grid_metadata_path(path: Path) -> Path:
+    """ Path of the json file describing the tide grid at path """
+    return path.with_suffix('.json')
+
+
+def generate_tide_grid(
+        model: BaseTideModel,
+        zones: List[ZdfZone],
+        resolution: float,
+        start_date: datetime, end_date: datetime,
+        time_period: int,
+        path: Path,
+        chunk_points: int = GRID_CHUNK_POINTS,
+        log_function: Optional[Callable[[str], None]] = None) -> Dict:
+    """ Predicts the tide at every node of a grid (resolution degrees apart)
+    within the zones, at time_period minute intervals from the start date
+    up to the end date, and writes the heights to a npy file at path (see
+    module docs). Returns the grid metadata, as written to the json file.
+
+    The npy and json files are written to temporary files that are only
+    moved into place once complete.
+    """
+    grid = TideGrid.from_zones(zones, resolution)
+    with profiling.phase('rasterize'):
+        mask = rasterize_zones(grid, zones).ravel()
+    inside = np.flatnonzero(mask)
+    if len(inside) == 0:
+        raise ValueError(
+            "No grid nodes fall within the zones, use a finer resolution")
+
+    node_lats = np.repeat(grid.latitudes(), grid.lon_count)
+    node_lons = np.tile(grid.longitudes(), grid.lat_count)
+    node_count = grid.lat_count * grid.lon_count
+
+    # the file is time major, so each window of dates is a contiguous block
+    # of the file that's predicted in memory then appended to it
+    count = count_dates_between(start_date, end_date, time_period)
+    window = max(1, min(count, chunk_points // node_count))
+    group_size = max(1, chunk_points // window)
+
+    metadata = {
+        'lat_start': grid.lat_start,
+        'lon_start': grid.lon_start,
+        'resolution': grid.resolution,
+        'shape': [count, grid.lat_count, grid.lon_count],
+        'start_date': start_date.isoformat(),
+        'time_period': time_period,
+        'zones': [zone.name for zone in zones],
+        'nodes': len(inside),
+    }
+    if log_function is not None:
+        log_function(
+            f"Predicting {len(inside)} grid nodes ({grid.lat_count} x "
+            f"{grid.lon_count} grid) at {count} dates")
+
+    tmp_path = _tmp_path(path)
+    tmp_metadata = _tmp_path(grid_metadata_path(path))
+    try:
+        with tmp_path.open('wb') as output:
+            np.lib.format.write_array_header_1_0(output, {
+                'descr': np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                'fortran_order': False,
+                'shape': (count, grid.lat_count, grid.lon_count),
+            })
+
+            for dates in iter_dates_between(
+                    start_date, end_date, time_period, window):
+                heights = np.full(
+                    (len(dates), node_count), np.nan, dtype=np.float32)
+                for first in range(0, len(inside), group_size):
+                    group = inside[first:first + group_size]
+                    locations = list(zip(
+                        node_lats[group].tolist(), node_lons[group].tolist()))
+                    with profiling.phase('predict', len(dates) * len(group)):
+                        for i, series in zip(group, model.calculate_stations(
+                                dates, locations)):
+                            heights[:, i] = series.heights
+
+                with profiling.phase('write', heights.size):
+                    heights.tofile(output)
+
+        tmp_metadata.write_text(json.dumps(metadata, indent=2))
+        os.replace(tmp_path, path)
+        os.replace(tmp_metadata, grid_metadata_path(path))
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        tmp_metadata.unlink(missing_ok=True)
+        raise
+    return metadata
+
+
+def read_tide_grid(
+        path: Path,
+        mmap_mode: Optional[str] = 'r') -> Tuple[Dict, np.ndarray]:
+    """ Reads the metadata and heights of the tide grid at path. Heights
+    are a (time, latitude, longitude) array, memory mapped by default so
+    only the parts used are read from disk.
+    """
+    metadata = json.loads(grid_metadata_path(path).read_text())
+    return metadata, np.load(path, mmap_mode=mmap_mode)
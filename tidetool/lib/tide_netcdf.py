@@ -0,0 +1,277 @@
+""" Module for writing the tide data of all the tide stations of a run to
+a single compressed NetCDF4 (HDF5) file, and reading it back.
+
+The file has a `time` dimension shared by all stations and a `station`
+dimension. The station variables hold the name, latitude and longitude
+given in the TIDE_STATION block of the zdf file, along with the name of the
+tide file. Heights (m) are a float32 `height(station, time)` variable,
+stored in chunks of CHUNK_STATIONS stations by CHUNK_TIMES times so that a
+single station, or a time slice of all stations, can be read without
+decompressing the whole file.
+
+NetCDF files are written incrementally (a block of stations and times at a
+time) so memory use doesn't depend on the number of stations or the length
+of the date range. This module requires the netCDF4 package, which is only
+imported when a NetCDF file is written or read.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+import math
+import os
+import numpy as np
+
+from tidetool.lib.tide_file import _tmp_path, read_tid_sidecar
+from tidetool.lib.tide_series import TideSeries
+
+
+# stations and times of each compressed chunk of the height variable, 1MB
+# of heights
+CHUNK_STATIONS = 16
+CHUNK_TIMES = 16384
+
+# heights are stored to this many decimal places (mm), which lets them be
+# compressed much further than full float32 precision
+HEIGHT_DIGITS = 3
+
+TIME_UNITS = 'minutes since 1970-01-01 00:00:00'
+
+# (name, latitude, longitude, tide file) of a tide station
+Station = Tuple[str, float, float, str]
+
+
+def _netcdf4():
+    try:
+        import netCDF4
+    except ImportError:
+        raise RuntimeError(
+            "The netCDF4 package is needed to write and read NetCDF tide data")
+    return netCDF4
+
+
+class TideNetcdfWriter:
+    """ Writes the tide data of many stations to a NetCDF file. The file is
+    written to a temporary file that's moved into place by `close`, as is
+    done for tide data files (see `tide_file.TidWriter`).
+    """
+
+    def __init__(
+            self,
+            path: Path,
+            stations: List[Station],
+            start_date: datetime,
+            time_period: int,
+            count: int) -> None:
+        """ Creates the NetCDF file for the stations, with count times
+        time_period minutes apart from the start date.
+        """
+        netCDF4 = _netcdf4()
+        self.path = path
+        self._tmp_path = _tmp_path(path)
+        self._dataset = netCDF4.Dataset(self._tmp_path, 'w', format='NETCDF4')
+        dataset = self._dataset
+
+        dataset.Conventions = 'CF-1.8'
+        dataset.featureType = 'timeSeries'
+        dataset.source = 'tidetool, AVISO FES tide predictions'
+        dataset.time_period = time_period
+        dataset.createDimension('station', len(stations))
+        dataset.createDimension('time', count)
+
+        time = dataset.createVariable(
+            'time', 'i8', ('time',),
+            zlib=True, chunksizes=(min(max(1, count), CHUNK_TIMES * 8),))
+        time.standard_name = 'time'
+        time.units = TIME_UNITS
+        # dates are regularly spaced, so they're written in windows rather
+        # than all at once
+        start = int(np.datetime64(start_date, 'm').astype(np.int64))
+        window = CHUNK_TIMES * 8
+        for first in range(0, count, window):
+            last = min(count, first + window)
+            time[first:last] = \
+                start + np.arange(first, last, dtype=np.int64) * time_period
+
+        names = dataset.createVariable('station_name', str, ('station',))
+        names.cf_role = 'timeseries_id'
+        tide_files = dataset.createVariable('tide_file', str, ('station',))
+        latitude = dataset.createVariable('latitude', 'f8', ('station',))
+        latitude.standard_name = 'latitude'
+        latitude.units = 'degrees_north'
+        longitude = dataset.createVariable('longitude', 'f8', ('station',))
+        longitude.standard_name = 'longitude'
+        longitude.units = 'degrees_east'
+        for i, (name, lat, lon, tide_file) in enumerate(stations):
+            names[i] = name
+            tide_files[i] = tide_file
+        if len(stations) > 0:
+            latitude[:] = [s[1] for s in stations]
+            longitude[:] = [s[2] for s in stations]
+
+        height = dataset.createVariable(
+            'height', 'f4', ('station', 'time'),
+            zlib=True, shuffle=True,
+            least_significant_digit=HEIGHT_DIGITS,
+            chunksizes=(
+                min(max(1, len(stations)), CHUNK_STATIONS),
+                min(max(1, count), CHUNK_TIMES)
+            ))
+        height.standard_name = 'sea_surface_height'
+        height.long_name = 'predicted tide height'
+        height.units = 'm'
+        height.coordinates = 'time latitude longitude station_name'
+        self._height = height
+
+
+    def write(
+            self,
+            first_station: int,
+            first_time: int,
+            heights: np.ndarray) -> None:
+        """ Writes the heights (a 2D array of stations by times), starting
+        at the given station and time index.
+        """
+        self._height[
+            first_station:first_station + heights.shape[0],
+            first_time:first_time + heights.shape[1]
+        ] = heights
+
+
+    def close(self) -> None:
+        """ Finishes the NetCDF file, moving it into place """
+        self._dataset.close()
+        os.replace(self._tmp_path, self.path)
+
+
+    def discard(self) -> None:
+        """ Abandons the write, leaving any existing file as it was """
+        self._dataset.close()
+        self._tmp_path.unlink()
+
+
+    def __enter__(self) -> 'TideNetcdfWriter':
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def write_tide_netcdf_from_sidecars(
+        path: Path,
+        stations: List[Station],
+        tide_files: List[Path],
+        start_date: datetime,
+        time_period: int,
+        count: int) -> None:
+    """ Writes a NetCDF file of the tide data in the binary sidecars (see
+    `tide_file.read_tid_sidecar`) of the tide files, one per station. The
+    sidecars are memory mapped and copied a block of stations and times at
+    a time.
+    """
+    window = CHUNK_TIMES * 8
+    with TideNetcdfWriter(
+            path, stations, start_date, time_period, count) as writer:
+        for first in range(0, len(tide_files), CHUNK_STATIONS):
+            block = [
+                read_tid_sidecar(tide_file).heights
+                for tide_file in tide_files[first:first + CHUNK_STATIONS]
+            ]
+            for heights, tide_file in zip(block, tide_files[first:]):
+                if len(heights) != count:
+                    raise ValueError(
+                        f"Sidecar of {tide_file} has {len(heights)} heights, "
+                        f"expected {count}")
+            for first_time in range(0, count, window):
+                writer.write(first, first_time, np.array([
+                    heights[first_time:first_time + window]
+                    for heights in block
+                ]))
+
+
+def read_tide_netcdf_stations(path: Path) -> List[Station]:
+    """ (name, latitude, longitude, tide file) of each station in the
+    NetCDF file, in the order they're stored.
+    """
+    with _netcdf4().Dataset(path) as dataset:
+        return list(zip(
+            dataset['station_name'][:].tolist(),
+            dataset['latitude'][:].tolist(),
+            dataset['longitude'][:].tolist(),
+            dataset['tide_file'][:].tolist()
+        ))
+
+
+def _time_indices(
+        dataset,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]) -> Tuple[int, int]:
+    """ Index of the first time at or after start_date, and the index after
+    the last time at or before end_date.
+    """
+    count = len(dataset.dimensions['time'])
+    if count == 0:
+        return 0, 0
+    start = int(dataset['time'][0])
+    time_period = int(dataset.time_period)
+
+    def minutes(date):
+        return int(np.datetime64(date, 'm').astype(np.int64)) - start
+
+    first, last = 0, count
+    if start_date is not None:
+        first = min(count, max(0, math.ceil(minutes(start_date) / time_period)))
+    if end_date is not None:
+        last = min(count, max(0, minutes(end_date) // time_period + 1))
+    return first, max(first, last)
+
+
+def _times(dataset, first: int, last: int) -> np.ndarray:
+    return dataset['time'][first:last].astype('datetime64[m]')
+
+
+def read_tide_netcdf(
+        path: Path,
+        station: Union[int, str],
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None) -> TideSeries:
+    """ Reads the tide data of a single station, given by its index or
+    name, between the start and end date (inclusive). By default all the
+    tide data of the station is read.
+
+    Raises a ValueError if the station isn't in the file.
+    """
+    with _netcdf4().Dataset(path) as dataset:
+        dataset.set_auto_mask(False)
+        if isinstance(station, str):
+            names = dataset['station_name'][:].tolist()
+            if station not in names:
+                raise ValueError(f"Station {station} is not in {path}")
+            station = names.index(station)
+        elif not 0 <= station < len(dataset.dimensions['station']):
+            raise ValueError(f"Station {station} is not in {path}")
+
+        first, last = _time_indices(dataset, start_date, end_date)
+        return TideSeries(
+            _times(dataset, first, last),
+            dataset['height'][station, first:last]
+        )
+
+
+def read_tide_netcdf_window(
+        path: Path,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+        ) -> Tuple[np.ndarray, np.ndarray]:
+    """ Reads the tide data of all the stations between the start and end
+    date (inclusive). Returns the times and a 2D array of the heights of
+    each station (in the order given by `read_tide_netcdf_stations`).
+    """
+    with _netcdf4().Dataset(path) as dataset:
+        dataset.set_auto_mask(False)
+        first, last = _time_indices(dataset, start_date, end_date)
+        return _times(dataset, first, last), dataset['height'][:, first:last]
@@ -0,0 +1,147 @@
+""" Module for the TideSeries type, a series of tide heights held as numpy
+arrays, along with the functions used to generate the dates of a series.
+"""
+
+from datetime import datetime
+from typing import Iterator, Optional, Tuple, Union
+import numpy as np
+
+from tidetool.lib import profiling
+
+
+# default number of dates included in each window of tide data when the
+# tide data is generated incrementally (see `iter_dates_between`)
+DEFAULT_CHUNK_SIZE = 100_000
+
+# number of (datetime, height) tuples created at a time when iterating over
+# a TideSeries
+_ITER_CHUNK_SIZE = 10_000
+
+
+def count_dates_between(
+        start_date: datetime,
+        end_date: datetime,
+        time_period: int) -> int:
+    """ Number of dates generated between start_date and end_date, see
+    `generate_dates_between`
+    """
+    # number of time periods needed to reach the end date, a partial
+    # time period still gets a date as the end date is exclusive
+    span = np.datetime64(end_date, 'us') - np.datetime64(start_date, 'us')
+    step = np.timedelta64(time_period, 'm')
+    return max(0, int(-(-span // step)))
+
+
+def generate_dates_between(
+        start_date: datetime,
+        end_date: datetime,
+        time_period: int) -> np.ndarray:
+    """ Generate a numpy datetime64 (minute resolution) array of dates
+    starting at start_date, up to but not including end_date, with a spacing
+    as specifed by the time_period (minutes). start_date is expected to fall
+    on a whole minute.
+
+    The array is built from integer offsets, so no python datetime objects
+    are created regardless of the number of dates.
+    """
+    count = count_dates_between(start_date, end_date, time_period)
+    start = np.datetime64(start_date, 'm')
+    step = np.timedelta64(time_period, 'm')
+
+    with profiling.phase('dates', count):
+        return start + np.arange(count, dtype=np.int64) * step
+
+
+def iter_dates_between(
+        start_date: datetime,
+        end_date: datetime,
+        time_period: int,
+        chunk: int = DEFAULT_CHUNK_SIZE) -> Iterator[np.ndarray]:
+    """ Same dates as `generate_dates_between` but yielded as a series of
+    arrays (windows) each containing at most chunk dates. Only one window
+    is held in memory at a time.
+    """
+    count = count_dates_between(start_date, end_date, time_period)
+    start = np.datetime64(start_date, 'm')
+    step = np.timedelta64(time_period, 'm')
+
+    for first in range(0, count, chunk):
+        last = min(first + chunk, count)
+        with profiling.phase('dates', last - first):
+            dates = start + np.arange(first, last, dtype=np.int64) * step
+        yield dates
+
+
+class TideSeries:
+    """ Tide heights (m) at a series of times. The times are held as a
+    numpy datetime64 array, and the heights as a numpy float array of the
+    same length (float64 unless another dtype is given, float32 halves the
+    memory used).
+
+    Iterating over a TideSeries gives (datetime, height) tuples, as the
+    lists returned by earlier versions of the tide functions did. Working
+    with the times and heights arrays directly is much faster.
+    """
+
+    __slots__ = ('times', 'heights')
+
+    def __init__(
+            self,
+            times: np.ndarray,
+            heights: np.ndarray,
+            dtype: Optional[np.dtype] = None) -> None:
+        times = np.asarray(times)
+        if times.dtype.kind != 'M':
+            raise ValueError(
+                f"TideSeries times must be datetime64, not {times.dtype}")
+        heights = np.asarray(heights, dtype=dtype)
+        if times.shape != heights.shape or times.ndim != 1:
+            raise ValueError(
+                f"Got {times.shape} times for {heights.shape} heights")
+
+        self.times = times
+        self.heights = heights
+
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+    def __iter__(self) -> Iterator[Tuple[datetime, float]]:
+        # python objects are only created for a block of the series at a
+        # time. datetime64 values finer than microseconds convert to ints
+        # rather than datetimes, so are converted to microseconds first.
+        for first in range(0, len(self), _ITER_CHUNK_SIZE):
+            last = first + _ITER_CHUNK_SIZE
+            times = self.times[first:last].astype('datetime64[us]')
+            yield from zip(times.tolist(), self.heights[first:last].tolist())
+
+
+    def __getitem__(
+            self,
+            index: Union[int, slice]
+            ) -> Union[Tuple[datetime, float], 'TideSeries']:
+        """ An int index gives a single (datetime, height) tuple, a slice
+        gives a TideSeries that is a view of this series.
+        """
+        if isinstance(index, slice):
+            return TideSeries(self.times[index], self.heights[index])
+        time = self.times[index].astype('datetime64[us]').item()
+        return (time, self.heights[index].item())
+
+
+    def __repr__(self) -> str:
+        if len(self) == 0:
+            return "TideSeries(empty)"
+        return (
+            f"TideSeries({len(self)} heights from {self.times[0]} to "
+            f"{self.times[-1]}, {self.heights.dtype})"
+        )
+
+
+    def astype(self, dtype: np.dtype) -> 'TideSeries':
+        """ Series with the heights converted to dtype, the times array is
+        shared.
+        """
+        return TideSeries(
+            self.times, self.heights.astype(dtype, copy=False))
@@ -0,0 +1,214 @@
+""" Module for computing tidal datum statistics of tide stations, eg; the
+lowest and highest astronomical tide (LAT, HAT) and mean sea level (MSL)
+over a full 18.61 year nodal cycle.
+
+A nodal cycle at a short time period is too much tide data to hold in
+memory (close to a million heights per station at 10 minutes), so the tide
+is predicted a window of dates at a time and each window is folded into
+running statistics (`TideStats`) that are independent of the number of
+dates. Percentiles are taken from a histogram of the heights, with
+HISTOGRAM_BIN_SIZE (m) bins.
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+import csv
+import math
+import os
+import numpy as np
+
+from tidetool.lib import profiling
+from tidetool.lib.tide_file import _tmp_path
+from tidetool.lib.tide_series import DEFAULT_CHUNK_SIZE, TideSeries, \
+    count_dates_between, iter_dates_between
+from tidetool.lib.tides import MAX_POINTS_PER_CALL, BaseTideModel
+
+
+# length of the lunar nodal cycle, the period over which tidal datums such
+# as LAT and HAT are defined
+NODAL_CYCLE = timedelta(days=18.61 * 365.25)
+
+# histogram bins (m) used for percentiles, heights beyond HISTOGRAM_LIMIT
+# of zero are counted in the first or last bin
+HISTOGRAM_BIN_SIZE = 0.01
+HISTOGRAM_LIMIT = 25.0
+
+DEFAULT_PERCENTILES = [1.0, 5.0, 50.0, 95.0, 99.0]
+
+
+def default_end_date(start_date: datetime) -> datetime:
+    """ End date of a nodal cycle starting at start_date """
+    return start_date + NODAL_CYCLE
+
+
+class TideStats:
+    """ Running statistics of the tide heights at a location, updated one
+    window of tide data at a time.
+    """
+
+    def __init__(self, histogram: bool = False) -> None:
+        self.count = 0
+        self.mean = 0.0
+        # sum of the squared differences from the mean
+        self._m2 = 0.0
+        self.min = math.inf
+        self.min_time = None
+        self.max = -math.inf
+        self.max_time = None
+        self.histogram = None
+        if histogram:
+            bins = int(round(2 * HISTOGRAM_LIMIT / HISTOGRAM_BIN_SIZE))
+            self.histogram = np.zeros(bins, dtype=np.int64)
+
+
+    def update(self, series: TideSeries) -> None:
+        """ Adds the heights of the series to the statistics """
+        heights = np.asarray(series.heights, dtype=np.float64)
+        if len(heights) == 0:
+            return
+
+        low = int(np.argmin(heights))
+        if heights[low] < self.min:
+            self.min = float(heights[low])
+            self.min_time = series.times[low]
+        high = int(np.argmax(heights))
+        if heights[high] > self.max:
+            self.max = float(heights[high])
+            self.max_time = series.times[high]
+
+        # combines the mean and variance of the window with the running
+        # values (Chan et al.), which is stable over millions of heights
+        count = len(heights)
+        mean = float(heights.mean())
+        m2 = float(np.square(heights - mean).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+        if self.histogram is not None:
+            bins = np.floor((heights + HISTOGRAM_LIMIT) / HISTOGRAM_BIN_SIZE)
+            bins = bins.astype(np.int64)
+            np.clip(bins, 0, len(self.histogram) - 1, out=bins)
+            self.histogram += np.bincount(bins, minlength=len(self.histogram))
+
+
+    @property
+    def std(self) -> float:
+        if self.count == 0:
+            return math.nan
+        return math.sqrt(self._m2 / self.count)
+
+
+    @property
+    def range(self) -> float:
+        return self.max - self.min
+
+
+    def percentile(self, q: float) -> float:
+        """ Height (m) below which q percent of the heights fall, to within
+        half a histogram bin.
+        """
+        if self.histogram is None:
+            raise ValueError("Percentiles require the histogram")
+        if self.count == 0:
+            return math.nan
+        cumulative = np.cumsum(self.histogram)
+        index = int(np.searchsorted(cumulative, q / 100 * self.count))
+        index = min(index, len(self.histogram) - 1)
+        # centre of the bin, limited to the heights seen
+        height = -HISTOGRAM_LIMIT + (index + 0.5) * HISTOGRAM_BIN_SIZE
+        return min(max(height, self.min), self.max)
+
+
+def compute_tide_stats(
+        model: BaseTideModel,
+        locations: List[Tuple[float, float]],
+        start_date: datetime, end_date: datetime,
+        time_period: int,
+        histogram: bool = False,
+        chunk: int = DEFAULT_CHUNK_SIZE,
+        chunk_points: int = MAX_POINTS_PER_CALL,
+        log_function: Optional[Callable[[str], None]] = None
+        ) -> List[TideStats]:
+    """ Statistics of the tide heights at each of the (latitude, longitude)
+    locations, from the start date up to the end date at time_period minute
+    intervals. Dates are predicted chunk at a time, so memory use doesn't
+    depend on the length of the date range. Each window is predicted in
+    groups of locations of at most chunk_points (locations x dates), so it
+    doesn't depend on the number of locations either. Locations listed more
+    than once are only predicted once, and share the same TideStats.
+    """
+    unique = list(dict.fromkeys(locations))
+    stats = [TideStats(histogram) for _ in unique]
+
+    count = count_dates_between(start_date, end_date, time_period)
+    windows = max(1, math.ceil(count / chunk))
+    for window, dates in enumerate(iter_dates_between(
+            start_date, end_date, time_period, chunk)):
+        if log_function is not None:
+            log_function(
+                f"Predicting window {window + 1} of {windows} "
+                f"({dates[0]} to {dates[-1]})")
+        group_size = max(1, chunk_points // len(dates))
+        for first in range(0, len(unique), group_size):
+            predictions = model.calculate_stations(
+                dates, unique[first:first + group_size])
+            for location_stats in stats[first:first + group_size]:
+                with profiling.phase('predict', len(dates)):
+                    series = next(predictions)
+                with profiling.phase('stats', len(dates)):
+                    location_stats.update(series)
+
+    index = {location: i for i, location in enumerate(unique)}
+    return [stats[index[location]] for location in locations]
+
+
+def _format_time(time) -> str:
+    if time is None:
+        return ''
+    return str(np.datetime64(time, 'm'))
+
+
+def write_tide_stats_csv(
+        path: Path,
+        stations: List[Tuple[str, float, float]],
+        stats: List[TideStats],
+        percentiles: Optional[List[float]] = None) -> None:
+    """ Writes a csv table with a row of statistics for each (name,
+    latitude, longitude) station. Heights are in metres, the min and max
+    heights are the LAT and HAT, and the mean the MSL, of the date range.
+    """
+    percentiles = percentiles or []
+    columns = [
+        'station', 'latitude', 'longitude', 'count',
+        'min', 'min_time', 'max', 'max_time', 'range', 'mean', 'std'
+    ]
+    columns.extend(f"p{q:g}" for q in percentiles)
+
+    tmp_path = _tmp_path(path)
+    try:
+        with tmp_path.open('w', newline='') as output:
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            for (name, latitude, longitude), station_stats in \
+                    zip(stations, stats):
+                row = [
+                    name, latitude, longitude, station_stats.count,
+                    f"{station_stats.min:.3f}",
+                    _format_time(station_stats.min_time),
+                    f"{station_stats.max:.3f}",
+                    _format_time(station_stats.max_time),
+                    f"{station_stats.range:.3f}",
+                    f"{station_stats.mean:.3f}",
+                    f"{station_stats.std:.3f}",
+                ]
+                row.extend(
+                    f"{station_stats.percentile(q):.3f}" for q in percentiles)
+                writer.writerow(row)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
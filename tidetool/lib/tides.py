@@ -4,12 +4,59 @@ This library is used to generate tide data for specific locations, at a
 specific year for an entire year.
 """
 
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Iterator, List, Optional, Tuple
 import pyfes
 import numpy as np
-import os
+import queue
+import threading
+
+from tidetool.lib import profiling
+from tidetool.lib.cache import ConstituentStore, config_digest, \
+    default_cache_folder
+from tidetool.lib.fes_config import Region, regional_data_folder, \
+    resolve_config
+from tidetool.lib.harmonics import HarmonicConstituents, fit_constituents, \
+    predict
+from tidetool.lib.interpolation import coarse_dates, interpolate, \
+    off_step
+from tidetool.lib.tide_series import DEFAULT_CHUNK_SIZE, TideSeries, \
+    count_dates_between, generate_dates_between, iter_dates_between
+
+
+# upper limit on the number of points (stations x dates) passed to pyfes in
+# a single calculate call when predicting for many stations at once
+MAX_POINTS_PER_CALL = 1_000_000
+
+# prediction engines available, see `create_tide_model`
+ENGINES = ['fes', 'harmonic']
+
+# harmonic constituents are extracted from an hourly FES prediction
+# starting at this date. A little over a year is needed to resolve the
+# annual constituents.
+HARMONIC_FIT_START = np.datetime64('2015-01-01T00:00', 'm')
+HARMONIC_FIT_DAYS = 370
+
+# largest error (cm) allowed between interpolated heights and the heights
+# predicted directly, see `InterpolatedTideModel`
+DEFAULT_INTERPOLATION_TOLERANCE = 1.0
+
+# number of heights per station checked against a direct prediction each
+# time heights are interpolated
+INTERPOLATION_CHECK_SAMPLES = 8
+
+# fewest dates predicted by each thread of a `ThreadedTideModel`, shorter
+# series aren't worth splitting
+MIN_SLICE_DATES = 10_000
+
+
+class InterpolationError(RuntimeError):
+    """ Raised when interpolated tide heights differ from the directly
+    predicted heights by more than the tolerance.
+    """
+    pass
 
 
 def get_load_tide_config(data_folder: Path) -> str:
@@ -20,39 +67,596 @@ def get_ocean_tide_config(data_folder: Path) -> str:
     return str(data_folder.joinpath('ocean_tide.ini'))
 
 
-def _generate_annual_dates(year: int, time_period: int) -> np.array:
-    """ Generates a numpy array full of datetimes. These datetimes
-    fill an entire year (from first of Jan) with a specific time
-    period between each datetime.
+def _generate_annual_dates(year: int, time_period: int) -> np.ndarray:
+    """ Generates a numpy datetime64 array. These datetimes fill an entire
+    year (from first of Jan) with a specific time period between each
+    datetime.
     """
     # start datetime
-    d = datetime(year, 1, 1)
+    d = np.datetime64(f"{year:04d}-01-01T00:00", 'm')
 
     # Creating the time series
-    dates = np.array([
-        d + timedelta(seconds=(item * 60 * time_period))
-        for item in range(int(24 * 60 / time_period * 365))
-    ])
+    count = int(24 * 60 / time_period * 365)
+    return d + np.arange(count, dtype=np.int64) * np.timedelta64(time_period, 'm')
+
+
+# previous (private) name of `tide_series.generate_dates_between`, kept for
+# code written against earlier versions of this module
+_generate_dates_between = generate_dates_between
+
+
+class BaseTideModel:
+    """ Base class for the tide prediction models. Implementations must
+    provide `calculate_stations`, the other prediction functions are built
+    on it.
+
+    Models that hold resources (eg; threads) release them in `close`, every
+    model can be used as a context manager that closes it on exit.
+    """
+
+    def __enter__(self) -> 'BaseTideModel':
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def close(self) -> None:
+        pass
+
+
+    def calculate_stations(
+            self,
+            dates: np.ndarray,
+            locations: List[Tuple[float, float]]
+            ) -> Iterator[TideSeries]:
+        """ Calculates the tide heights (m) at each of the dates for every
+        (latitude, longitude) location. Yields one TideSeries per location,
+        in the same order as the locations list. All the series share the
+        dates array.
+        """
+        raise NotImplementedError(
+            "BaseTideModel class must override calculate_stations function")
+
+
+    def get_tide_data(
+            self,
+            start_date: datetime, end_date: datetime,
+            latitude: float, longitude: float,
+            time_period: int,
+            dtype: np.dtype = np.float64
+            ) -> TideSeries:
+        """ Generates a datetime vs height (m) tide dataset for the given
+        location, see `get_tide_data` for details.
+        """
+        return self.get_tide_data_many(
+            start_date, end_date,
+            [(latitude, longitude)],
+            time_period,
+            dtype
+        )[0]
+
+
+    def iter_tide_data(
+            self,
+            start_date: datetime, end_date: datetime,
+            latitude: float, longitude: float,
+            time_period: int,
+            chunk: int = DEFAULT_CHUNK_SIZE,
+            dtype: np.dtype = np.float64
+            ) -> Iterator[TideSeries]:
+        """ Generates a datetime vs height (m) tide dataset for the given
+        location, see `iter_tide_data` for details.
+        """
+        for dates in iter_dates_between(
+                start_date, end_date, time_period, chunk):
+            series = next(self.calculate_stations(
+                dates, [(latitude, longitude)]))
+            yield series.astype(dtype)
+
+
+    def get_tide_data_many(
+            self,
+            start_date: datetime, end_date: datetime,
+            locations: List[Tuple[float, float]],
+            time_period: int,
+            dtype: np.dtype = np.float64
+            ) -> List[TideSeries]:
+        """ Generates a datetime vs height (m) tide dataset for each of the
+        (latitude, longitude) locations, see `get_tide_data_many` for
+        details.
+        """
+        # datetimes that the tide will be calculated for
+        dates = generate_dates_between(start_date, end_date, time_period)
+
+        return [
+            series.astype(dtype)
+            for series in self.calculate_stations(dates, locations)
+        ]
+
+
+class TideModel(BaseTideModel):
+    """ Long lived session around the pyfes ocean and radial (load) tide
+    handlers.
+
+    Creating a pyfes handler parses the config file and opens all the
+    NetCDF grids it refers to, so this is the expensive part of a tide
+    prediction. A TideModel creates both handlers once and can then be
+    used for any number of predictions.
+
+    The handlers read the grids from disk as needed ('io' mode) unless
+    mode is 'memory', where all grids are loaded up front. Loading is only
+    practical for regional grids (see `fes_config.regional_data_folder`),
+    region is then the region they cover.
+
+    A TideModel can be shared by many threads, calls to the handlers are
+    made one at a time. num_threads is the number of threads pyfes uses
+    for each call (all cores by default).
+    """
+
+    def __init__(
+            self,
+            ocean_config: str, load_config: str,
+            mode: str = 'io',
+            region: Optional[Region] = None,
+            num_threads: Optional[int] = None) -> None:
+        self.ocean_config = ocean_config
+        self.load_config = load_config
+        self.mode = mode
+        self.region = region
+        self.num_threads = num_threads
+        self._lock = threading.Lock()
+
+        # pyfes seems to not resolve locations of files referred to in the
+        # config ini files correctly, this has only been noted to occur on
+        # windows. So the handlers are given copies of the config files with
+        # absolute paths to the NetCDF grids (the working directory isn't
+        # changed, as that would affect all threads).
+        with profiling.phase('load_model'):
+            self._short_tide = pyfes.Handler(
+                'ocean', mode, str(resolve_config(Path(ocean_config))))
+            self._radial_tide = pyfes.Handler(
+                'radial', mode, str(resolve_config(Path(load_config))))
+
+
+    @classmethod
+    def from_data_folder(
+            cls,
+            data_folder: Path,
+            region: Optional[Region] = None,
+            cache_folder: Optional[Path] = None,
+            num_threads: Optional[int] = None) -> 'TideModel':
+        """ Creates a TideModel using the config files found in the
+        AVISO FES data folder. If a region is given the grids are cropped to
+        the region (once, they're kept in the cache folder) and loaded into
+        memory.
+        """
+        if region is None:
+            return cls(
+                get_ocean_tide_config(data_folder),
+                get_load_tide_config(data_folder),
+                num_threads=num_threads
+            )
+
+        with profiling.phase('regional_grids'):
+            data_folder = regional_data_folder(
+                data_folder, region, cache_folder)
+        return cls(
+            get_ocean_tide_config(data_folder),
+            get_load_tide_config(data_folder),
+            'memory',
+            region,
+            num_threads
+        )
+
+
+    def calculate(
+            self,
+            dates: np.ndarray,
+            latitudes: np.ndarray, longitudes: np.ndarray
+            ) -> np.ndarray:
+        """ Calculates the tide height (m) for each of the dates, latitudes
+        and longitudes given. All three arrays must be the same shape.
+        """
+        # pyfes works with microsecond resolution datetimes
+        dates = dates.astype('datetime64[us]')
+
+        # only passed when set, to work with versions of pyfes without it
+        options = {}
+        if self.num_threads is not None:
+            options['num_threads'] = self.num_threads
+
+        with self._lock, profiling.phase('fes_calculate', len(dates)):
+            tide, lp, _ = self._short_tide.calculate(
+                longitudes, latitudes, dates, **options)
+            load, load_lp, _ = self._radial_tide.calculate(
+                longitudes, latitudes, dates, **options)
+
+        # add the various tide components to get the actual tide height
+        # and then convert from cm to m
+        return (tide + lp + load) / 100
+
+
+    def calculate_stations(
+            self,
+            dates: np.ndarray,
+            locations: List[Tuple[float, float]]
+            ) -> Iterator[TideSeries]:
+        """ Calculates the tide heights (m) at each of the dates for every
+        (latitude, longitude) location. Stations are packed together so
+        that pyfes is called once per group of stations rather than once
+        per station.
+
+        Yields one TideSeries per location, in the same order as the
+        locations list.
+        """
+        if self.region is not None:
+            for latitude, longitude in locations:
+                if not self.region.contains(latitude, longitude):
+                    raise ValueError(
+                        f"Location {latitude}, {longitude} is outside the "
+                        f"regional grids {self.region}")
+
+        stations_per_call = max(1, MAX_POINTS_PER_CALL // max(1, len(dates)))
+
+        for first in range(0, len(locations), stations_per_call):
+            group = locations[first:first + stations_per_call]
+
+            lats = np.repeat([lat for lat, _ in group], len(dates))
+            lons = np.repeat([lon for _, lon in group], len(dates))
+            group_dates = np.tile(dates, len(group))
+
+            heights = self.calculate(group_dates, lats, lons)
+
+            for station_heights in heights.reshape(len(group), len(dates)):
+                yield TideSeries(dates, station_heights)
+
+
+class HarmonicTideModel(BaseTideModel):
+    """ Predicts tides from harmonic constituents, without using the
+    AVISO FES grids.
+
+    The constituents for each location are extracted once, by fitting them
+    to a FES prediction (see HARMONIC_FIT_START), and saved in a
+    ConstituentStore. Later predictions for the same location only need the
+    stored constituents. The FES model is only loaded when constituents
+    need to be extracted. Constituents are also kept in memory for the life
+    of the model, so the store is only read once for each location.
+    """
+
+    def __init__(
+            self,
+            data_folder: Path,
+            store: ConstituentStore,
+            region: Optional[Region] = None,
+            cache_folder: Optional[Path] = None) -> None:
+        self.data_folder = data_folder
+        self.store = store
+        # the FES model uses grids cropped to the region, if given
+        self.region = region
+        self.cache_folder = cache_folder
+
+        self._fes_model = None
+        # (latitude, longitude): constituents of each location used so far
+        self._constituents = {}
+
+
+    @classmethod
+    def from_data_folder(
+            cls,
+            data_folder: Path,
+            cache_folder: Optional[Path] = None,
+            region: Optional[Region] = None) -> 'HarmonicTideModel':
+        """ Creates a HarmonicTideModel for the AVISO FES data folder, with
+        the constituents stored in the cache folder.
+        """
+        if cache_folder is None:
+            cache_folder = default_cache_folder()
+        store = ConstituentStore(
+            cache_folder.joinpath('constituents'),
+            config_digest(data_folder)
+        )
+        return cls(data_folder, store, region, cache_folder)
+
+
+    def extract_constituents(
+            self,
+            locations: List[Tuple[float, float]]
+            ) -> List[HarmonicConstituents]:
+        """ Extracts the harmonic constituents for each of the locations
+        from the FES model.
+        """
+        if self._fes_model is None:
+            self._fes_model = TideModel.from_data_folder(
+                self.data_folder, self.region, self.cache_folder)
+
+        dates = HARMONIC_FIT_START + \
+            np.arange(HARMONIC_FIT_DAYS * 24) * np.timedelta64(60, 'm')
+        heights = np.array([
+            series.heights
+            for series in self._fes_model.calculate_stations(dates, locations)
+        ])
+
+        with profiling.phase('harmonic_fit', heights.size):
+            return fit_constituents(dates, heights)
+
+
+    def get_constituents(
+            self,
+            locations: List[Tuple[float, float]]
+            ) -> List[HarmonicConstituents]:
+        """ Gets the harmonic constituents for each of the locations from
+        memory or the store, extracting (and storing) those that are
+        missing.
+        """
+        constituents = []
+        for location in locations:
+            c = self._constituents.get(location)
+            if c is None:
+                c = self.store.get(*location)
+                if c is not None:
+                    self._constituents[location] = c
+            constituents.append(c)
 
-    return dates
+        missing = [i for i, c in enumerate(constituents) if c is None]
+        if len(missing) > 0:
+            extracted = self.extract_constituents(
+                [locations[i] for i in missing])
+            for i, c in zip(missing, extracted):
+                latitude, longitude = locations[i]
+                self.store.put(latitude, longitude, c)
+                self._constituents[locations[i]] = c
+                constituents[i] = c
 
+        return constituents
 
-def _generate_dates_between(
-        start_date: datetime,
-        end_date: datetime,
-        time_period: int) -> np.array:
-    """ Generate a number of datetime objects between the start_data and
-    end_date with a spacing as specifed by the time_period (minutes)
+
+    def calculate_stations(
+            self,
+            dates: np.ndarray,
+            locations: List[Tuple[float, float]]
+            ) -> Iterator[TideSeries]:
+        stations_per_call = max(1, MAX_POINTS_PER_CALL // max(1, len(dates)))
+
+        for first in range(0, len(locations), stations_per_call):
+            group = locations[first:first + stations_per_call]
+            constituents = self.get_constituents(group)
+            with profiling.phase('harmonic_predict', len(group) * len(dates)):
+                heights = predict(constituents, dates)
+            for station_heights in heights:
+                yield TideSeries(dates, station_heights)
+
+
+class InterpolatedTideModel(BaseTideModel):
+    """ Predicts tides by evaluating another tide model every model_step
+    minutes, and interpolating the heights to the dates requested (see
+    `interpolation`). This greatly reduces the number of points the model
+    is evaluated at when the time period is much shorter than the model
+    step.
+
+    Each time heights are interpolated a sample of them (between the coarse
+    dates, where the error is largest) is also predicted directly. An
+    InterpolationError is raised if any differ by more than tolerance cm.
+    """
+
+    def __init__(
+            self,
+            model: BaseTideModel,
+            model_step: int,
+            tolerance: float = DEFAULT_INTERPOLATION_TOLERANCE) -> None:
+        if model_step < 1:
+            raise ValueError("Model step must be at least one minute")
+        self.model = model
+        self.model_step = model_step
+        self.tolerance = tolerance
+
+
+    def _check_samples(
+            self,
+            dates: np.ndarray,
+            locations: List[Tuple[float, float]],
+            heights: np.ndarray) -> None:
+        """ Compares a sample of the interpolated heights with heights
+        predicted directly by the model.
+        """
+        # points that fall on a coarse date aren't interpolated
+        between = np.flatnonzero(off_step(dates, self.model_step))
+        if len(between) == 0:
+            return
+        sample = between[np.linspace(
+            0, len(between) - 1,
+            min(len(between), INTERPOLATION_CHECK_SAMPLES)
+        ).astype(np.int64)]
+
+        with profiling.phase('interpolation_check'):
+            direct = np.array([
+                series.heights for series in
+                self.model.calculate_stations(dates[sample], locations)
+            ])
+        error = np.abs(direct - heights[:, sample]).max() * 100
+        if error > self.tolerance:
+            raise InterpolationError(
+                f"Interpolated tide heights differ from direct predictions "
+                f"by up to {error:.2f} cm, more than the tolerance of "
+                f"{self.tolerance} cm. Use a shorter model step.")
+
+
+    def calculate_stations(
+            self,
+            dates: np.ndarray,
+            locations: List[Tuple[float, float]]
+            ) -> Iterator[TideSeries]:
+        if len(dates) == 0 or len(locations) == 0:
+            yield from self.model.calculate_stations(dates, locations)
+            return
+
+        # coarse dates for a window of dates at a time, so the coarse
+        # heights of many stations fit in a single model call
+        coarse = coarse_dates(dates, self.model_step)
+        coarse_heights = np.array([
+            series.heights
+            for series in self.model.calculate_stations(coarse, locations)
+        ])
+        with profiling.phase('interpolate', len(dates) * len(locations)):
+            heights = interpolate(coarse, coarse_heights, dates)
+        self._check_samples(dates, locations, heights)
+
+        for station_heights in heights:
+            yield TideSeries(dates, station_heights)
+
+
+    def close(self) -> None:
+        self.model.close()
+
+
+class ThreadedTideModel(BaseTideModel):
+    """ Splits long tide series into time slices that are predicted in
+    parallel by a pool of threads, for when a few stations span many years.
+
+    pyfes releases the GIL while predicting, but each handler only makes one
+    prediction at a time, so every thread uses its own model (created by
+    create_model the first time it's needed). The models are kept for the
+    life of the ThreadedTideModel.
     """
-    dates_list = []
 
-    current_datetime = start_date
-    dt = timedelta(minutes=time_period)
-    while current_datetime < end_date:
-        dates_list.append(current_datetime)
-        current_datetime += dt
+    def __init__(
+            self,
+            create_model: Callable[[], BaseTideModel],
+            threads: int,
+            min_slice: int = MIN_SLICE_DATES) -> None:
+        if threads < 1:
+            raise ValueError("threads must be at least 1")
+        self.create_model = create_model
+        self.threads = threads
+        self.min_slice = min_slice
+
+        # models not in use by a thread. The first is created straight away
+        # so that any problems with the model are raised here.
+        self._models = queue.LifoQueue()
+        self._models.put(create_model())
+        self._model_count = 1
+        self._lock = threading.Lock()
+        self._executor = None
+
+
+    def _acquire_model(self) -> BaseTideModel:
+        try:
+            return self._models.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._model_count < self.threads
+            if create:
+                self._model_count += 1
+        if create:
+            return self.create_model()
+        return self._models.get()
+
+
+    def _calculate_slice(
+            self,
+            dates: np.ndarray,
+            locations: List[Tuple[float, float]]
+            ) -> List[np.ndarray]:
+        model = self._acquire_model()
+        try:
+            return [
+                series.heights
+                for series in model.calculate_stations(dates, locations)
+            ]
+        finally:
+            self._models.put(model)
+
+
+    def calculate_stations(
+            self,
+            dates: np.ndarray,
+            locations: List[Tuple[float, float]]
+            ) -> Iterator[TideSeries]:
+        slices = max(1, min(self.threads, len(dates) // self.min_slice))
+        if slices == 1:
+            heights = [self._calculate_slice(dates, locations)]
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.threads)
+            heights = list(self._executor.map(
+                lambda slice_dates: self._calculate_slice(
+                    slice_dates, locations),
+                np.array_split(dates, slices)
+            ))
+
+        for i in range(len(locations)):
+            yield TideSeries(
+                dates,
+                np.concatenate([slice_heights[i] for slice_heights in heights])
+            )
 
-    return np.array(dates_list)
+
+    def close(self) -> None:
+        """ Shuts down the thread pool and closes the threads' models """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        while True:
+            try:
+                self._models.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def create_tide_model(
+        data_folder: Path,
+        engine: str = 'fes',
+        cache_folder: Optional[Path] = None,
+        model_step: Optional[int] = None,
+        tolerance: float = DEFAULT_INTERPOLATION_TOLERANCE,
+        region: Optional[Region] = None,
+        threads: int = 1
+        ) -> BaseTideModel:
+    """ Creates the tide model used to predict tides.
+
+    Args:
+        data_folder (Path): AVISO FES data folder containing the
+            ocean_tide.ini and load_tide.ini config files.
+        engine (str): one of ENGINES. 'fes' predicts using the AVISO FES
+            library directly, 'harmonic' predicts from harmonic constituents
+            extracted from FES once per location and cached.
+        cache_folder (Path): folder the harmonic constituents (and
+            regional grids) are cached in, defaults to
+            `default_cache_folder()`
+        model_step (int): if given the engine predicts every model_step
+            minutes, and heights are interpolated to the dates requested
+            (see `InterpolatedTideModel`).
+        tolerance (float): largest error (cm) allowed in the interpolated
+            heights.
+        region (Region): if given FES uses grids cropped to the region
+            and loaded into memory, all locations predicted must be within
+            the region.
+        threads (int): if more than one the 'fes' engine splits long series
+            into time slices predicted by this many threads, each with its
+            own pyfes handlers (see `ThreadedTideModel`).
+    """
+    if engine == 'fes' and threads > 1:
+        # each pyfes call runs on a single core, the threads are the
+        # parallelism
+        model = ThreadedTideModel(
+            lambda: TideModel.from_data_folder(
+                data_folder, region, cache_folder, num_threads=1),
+            threads
+        )
+    elif engine == 'fes':
+        model = TideModel.from_data_folder(data_folder, region, cache_folder)
+    elif engine == 'harmonic':
+        model = HarmonicTideModel.from_data_folder(
+            data_folder, cache_folder, region)
+    else:
+        raise ValueError(
+            f"Unknown tide engine {engine}, must be one of {ENGINES}")
+
+    if model_step is not None:
+        model = InterpolatedTideModel(model, model_step, tolerance)
+    return model
 
 
 def _get_tide_data(
@@ -60,45 +664,26 @@ def _get_tide_data(
         latitude: float, longitude: float,
         time_period: int,
         ocean_config: str, load_config:str
-        ) -> List[Tuple[datetime, float]]:
-    # pyfes seems to not resolve locations of files referred to in the
-    # config ini files correctly, this has only been noted to occur on
-    # windows. Workaround is to set the work dir to the folder the config
-    # files and some reworking of the folder structure containing the NetCDF
-    # grids
-    os.chdir(Path(ocean_config).parent)
-
-    # Create handler
-    short_tide = pyfes.Handler('ocean', 'io', ocean_config)
-    radial_tide = pyfes.Handler('radial', 'io', load_config)
-
-    # datetimes that the tide will be calculated for
-    dates = _generate_dates_between(start_date, end_date, time_period)
-
-    lats = np.full(dates.shape, latitude)
-    lons = np.full(dates.shape, longitude)
-
-    # Computes tides
-    tide, lp, _ = short_tide.calculate(lons, lats, dates)
-    load, load_lp, _ = radial_tide.calculate(lons, lats, dates)
-
-    # the resultant datetime vs tide height (m) dataset
-    res = []
-    for idx, date in enumerate(dates):
-        # add the various tide components to get the actual tide height
-        # and then convert from cm to m
-        tide_height = (tide[idx] + lp[idx] + load[idx]) / 100
-        res.append((date, tide_height))
-
-    return res
+        ) -> TideSeries:
+    model = TideModel(ocean_config, load_config)
+    return model.get_tide_data(
+        start_date, end_date,
+        latitude, longitude,
+        time_period
+    )
 
 
 def get_tide_data(
         data_folder: Path,
         start_date: datetime, end_date: datetime,
         latitude: float, longitude: float,
-        time_period: int = 10
-        ) -> List[Tuple[datetime, float]]:
+        time_period: int = 10,
+        engine: str = 'fes',
+        dtype: np.dtype = np.float64,
+        model_step: Optional[int] = None,
+        tolerance: float = DEFAULT_INTERPOLATION_TOLERANCE,
+        threads: int = 1
+        ) -> TideSeries:
     """ Generates a datetime vs height (float) tide dataset for the given
         year and location (latitude, longitude)
 
@@ -113,21 +698,135 @@ def get_tide_data(
                 generate the tide data for.
             time_period (int): time in minutes between each each entry in
                 the tide prediction returned by this function.
+            engine (str): prediction engine used, one of ENGINES (see
+                `create_tide_model`).
+            dtype (dtype): dtype of the heights, np.float32 can be used to
+                halve the memory used by long series.
+            model_step (int): if given the tide model is only evaluated
+                every model_step minutes, with the heights in between
+                interpolated. Much faster when the time period is short.
+            tolerance (float): largest error (cm) allowed in interpolated
+                heights, an InterpolationError is raised if a sample of
+                them differ from direct predictions by more than this.
+            threads (int): if more than one, long series are split into
+                time slices that are predicted in parallel by this many
+                threads (see `ThreadedTideModel`).
 
     Returns:
-        list: List of tuples, each tuple contains a datetime and height
-           value.
+        TideSeries: times and heights of the tide data. Iterating over it
+           gives tuples of a datetime and height value.
     """
-    # this is really just a helper function to make dealing with the 
-    # config files a bit easier. Actual tide calcs performed in
-    # _get_tide_data
-    ocean_cfg = get_ocean_tide_config(data_folder)
-    load_cfg = get_load_tide_config(data_folder)
+    # this is really just a helper function to make dealing with the
+    # config files a bit easier. Actual tide calcs performed by the tide
+    # model, callers making more than one prediction should create their
+    # own model (see `create_tide_model`) and reuse it.
+    with create_tide_model(
+            data_folder, engine, model_step=model_step, tolerance=tolerance,
+            threads=threads) as model:
+        return model.get_tide_data(
+            start_date, end_date,
+            latitude, longitude,
+            time_period,
+            dtype
+        )
 
-    return _get_tide_data(
-        start_date, end_date,
-        latitude, longitude,
-        time_period,
-        ocean_cfg, load_cfg
-    )
 
+def get_tide_data_many(
+        data_folder: Path,
+        locations: List[Tuple[float, float]],
+        start_date: datetime, end_date: datetime,
+        time_period: int = 10,
+        engine: str = 'fes',
+        dtype: np.dtype = np.float64,
+        model_step: Optional[int] = None,
+        tolerance: float = DEFAULT_INTERPOLATION_TOLERANCE,
+        threads: int = 1
+        ) -> List[TideSeries]:
+    """ Generates a datetime vs height (float) tide dataset for each of
+        the given locations. Predictions for all locations are made in as
+        few pyfes calls as possible.
+
+        Args:
+            data_folder (Path): AVISO FES data folder containing the
+                ocean_tide.ini and load_tide.ini config files.
+            locations (list): List of (latitude, longitude) tuples to
+                generate the tide data for.
+            start_date (datetime): Date from which the tide data will be
+                generated for.
+            end_date (datetime): Tide data will be generated up to this
+                date.
+            time_period (int): time in minutes between each each entry in
+                the tide predictions returned by this function.
+            engine (str): prediction engine used, one of ENGINES (see
+                `create_tide_model`).
+            dtype (dtype): dtype of the heights.
+            model_step (int): see `get_tide_data`.
+            tolerance (float): see `get_tide_data`.
+            threads (int): see `get_tide_data`.
+
+    Returns:
+        list: One TideSeries per location (in the same order as
+            locations), all sharing the same times array.
+    """
+    with create_tide_model(
+            data_folder, engine, model_step=model_step, tolerance=tolerance,
+            threads=threads) as model:
+        return model.get_tide_data_many(
+            start_date, end_date,
+            locations,
+            time_period,
+            dtype
+        )
+
+
+def iter_tide_data(
+        data_folder: Path,
+        start_date: datetime, end_date: datetime,
+        latitude: float, longitude: float,
+        time_period: int = 10,
+        chunk: int = DEFAULT_CHUNK_SIZE,
+        engine: str = 'fes',
+        dtype: np.dtype = np.float64,
+        model_step: Optional[int] = None,
+        tolerance: float = DEFAULT_INTERPOLATION_TOLERANCE,
+        threads: int = 1
+        ) -> Iterator[TideSeries]:
+    """ Generates the same tide dataset as `get_tide_data`, but as a
+        series of fixed size time windows. Each window is predicted as it is
+        requested so memory use does not depend on the length of the date
+        range.
+
+        Args:
+            data_folder (Path): AVISO FES data folder containing the
+                ocean_tide.ini and load_tide.ini config files.
+            start_date (datetime): Date from which the tide data will be
+                generated for.
+            end_date (datetime): Tide data will be generated up to this
+                date.
+            latitude (float): Latitude component of the location to
+                generate the tide data for.
+            longitude (float): Longitude component of the location to
+                generate the tide data for.
+            time_period (int): time in minutes between each each entry in
+                the tide prediction returned by this function.
+            chunk (int): maximum number of entries in each window.
+            engine (str): prediction engine used, one of ENGINES (see
+                `create_tide_model`).
+            dtype (dtype): dtype of the heights.
+            model_step (int): see `get_tide_data`.
+            tolerance (float): see `get_tide_data`.
+            threads (int): see `get_tide_data`.
+
+    Yields:
+        TideSeries: times and heights of each window.
+    """
+    with create_tide_model(
+            data_folder, engine, model_step=model_step, tolerance=tolerance,
+            threads=threads) as model:
+        yield from model.iter_tide_data(
+            start_date, end_date,
+            latitude, longitude,
+            time_period,
+            chunk,
+            dtype
+        )
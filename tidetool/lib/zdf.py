@@ -1,8 +1,16 @@
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional
+import locale
+import mmap
 import re
 
 
+# matches the start of the type definition line of each block, eg; [ZONE].
+# Searching for a new line followed by [ is much faster than a multiline
+# regex, the first line of the file is checked separately.
+_BLOCK_HEADER = re.compile(rb'\n\[')
+
+
 class ZdfParsingException(Exception):
     """ Exception definition for when the parsing of a zdf file fails
     """
@@ -27,9 +35,17 @@ class ZdfBlock:
         format.
         """
         raise NotImplementedError("ZdfBlock class must override to_strings function")
-    
+
+    def line_count(self) -> int:
+        """ Number of data lines in this block """
+        return len(self.to_strings())
+
+    def decode(self) -> 'ZdfBlock':
+        """ Returns the decoded block, see `ZdfLazyBlock` """
+        return self
+
     def __repr__(self) -> str:
-       return f"type: {self.type}, len: {len(self.to_strings())}"
+       return f"type: {self.type}, len: {self.line_count()}"
 
 
 class ZdfUnparsed(ZdfBlock):
@@ -50,6 +66,9 @@ class ZdfUnparsed(ZdfBlock):
     def to_strings(self) -> List[str]:
         return self.strings
 
+    def line_count(self) -> int:
+        return len(self.strings)
+
 
 class ZdfTideStation(ZdfBlock):
 
@@ -93,13 +112,168 @@ class ZdfTideStation(ZdfBlock):
         return lines
 
 
+    def line_count(self) -> int:
+        return len(self.data)
+
+
+class ZdfZone(ZdfBlock):
+    """ A zone polygon. The first line gives the zone name and number of
+    vertices, followed by one line per vertex (latitude, longitude);
+
+        box01, 5
+        -10.434756, 134.454114
+        -10.434756, 135.845131
+        ...
+
+    The number of vertices isn't always the number of vertex lines, so all
+    the vertex lines are read and the given count is kept as it is.
+    """
+
+    def __init__(self, type: str) -> None:
+        super().__init__(type)
+        self.name = None
+        # number of vertices given on the first line
+        self.vertex_count = 0
+        # list of (lat, long) tuples
+        self.vertices = []
+
+
+    def from_strings(self, strings: List[str]) -> None:
+        if len(strings) == 0:
+            raise ZdfParsingException("Zone has no name line")
+        s_bits = strings[0].split(',')
+        if len(s_bits) != 2:
+            raise ZdfParsingException(
+                "Error reading Zone name line, "
+                f"expected 2 values got {len(s_bits)}"
+            )
+        try:
+            self.vertex_count = int(s_bits[1])
+        except ValueError:
+            raise ZdfParsingException(
+                "Error reading Zone name line, "
+                f"bad format at line \"{strings[0]}\""
+            )
+        self.name = s_bits[0].strip()
+
+        self.vertices = []
+        for s in strings[1:]:
+            s_bits = s.split(',')
+            if len(s_bits) != 2:
+                raise ZdfParsingException(
+                    "Error reading Zone vertex line, "
+                    f"expected 2 values got {len(s_bits)}"
+                )
+            try:
+                self.vertices.append((float(s_bits[0]), float(s_bits[1])))
+            except ValueError:
+                raise ZdfParsingException(
+                    "Error reading Zone vertex line, "
+                    f"bad format at line \"{s}\""
+                )
+
+
+    def to_strings(self) -> List[str]:
+        lines = [f"{self.name}, {self.vertex_count}"]
+        lines.extend(f"{lat}, {lon}" for lat, lon in self.vertices)
+        return lines
+
+
+    def line_count(self) -> int:
+        return len(self.vertices) + 1
+
+
 def block_for_type(type: str) -> ZdfBlock:
     if type == 'TIDE_STATION':
         return ZdfTideStation(type)
+    elif type == 'ZONE':
+        return ZdfZone(type)
     else:
         return ZdfUnparsed(type)
 
 
+def _decode_block(type: str, lines: List[str], line_number: int) -> ZdfBlock:
+    """ Creates the block for the given type from its data lines. Any
+    parsing error is raised as a ZdfParsingException that includes the line
+    number the block starts at.
+    """
+    block = block_for_type(type)
+    try:
+        block.from_strings(lines)
+    except ZdfParsingException as ex:
+        raise ZdfParsingException(
+            f"Parsing error in block starting at line {line_number}: {ex}"
+        ) from ex
+    return block
+
+
+class ZdfLazyBlock(ZdfBlock):
+    """ Placeholder for a block that has not been decoded. Only the location
+    of the block's data lines within the zdf file is kept, the lines are
+    read and decoded the first time the block is used (see `decode`). This
+    keeps the cost of reading a zdf file with many large blocks (eg; ZONE
+    polygons) close to that of scanning the file.
+    """
+
+    def __init__(
+            self,
+            type: str,
+            path: Path,
+            start: int, end: int,
+            encoding: str) -> None:
+        super().__init__(type)
+        self.path = path
+        # byte offsets of the data lines of this block
+        self.start = start
+        self.end = end
+        self.encoding = encoding
+
+        self._block = None
+
+    def _line_number(self) -> int:
+        """ Line number of the type definition line of this block """
+        with self.path.open('rb') as file:
+            return file.read(self.start).count(b'\n') + 1
+
+    def decode(self) -> ZdfBlock:
+        if self._block is None:
+            with self.path.open('rb') as file:
+                file.seek(self.start)
+                data = file.read(self.end - self.start)
+            lines = [
+                line
+                for line in data.decode(self.encoding).splitlines()
+                if len(line.strip()) > 0
+            ]
+            block = block_for_type(self.type)
+            try:
+                block.from_strings(lines)
+            except ZdfParsingException as ex:
+                # line number is only needed (and worked out) on error
+                raise ZdfParsingException(
+                    "Parsing error in block starting at line "
+                    f"{self._line_number()}: {ex}"
+                ) from ex
+            self._block = block
+        return self._block
+
+    def from_strings(self, strings: List[str]) -> None:
+        block = block_for_type(self.type)
+        block.from_strings(strings)
+        self._block = block
+
+    def to_strings(self) -> List[str]:
+        return self.decode().to_strings()
+
+    def line_count(self) -> int:
+        return self.decode().line_count()
+
+    def __repr__(self) -> str:
+        if self._block is None:
+            return f"type: {self.type}, bytes: {self.end - self.start}"
+        return repr(self._block)
+
+
 class ZoneDefinitionFile:
     """ Model definition for a CARIS zone defintion file (.zdf).
 
@@ -112,20 +286,24 @@ class ZoneDefinitionFile:
     def __init__(self, filename) -> None:
         self.filename = filename
         self.blocks=[]
+        # index of the blocks by type
+        self._blocks_by_type: Dict[str, List[ZdfBlock]] = {}
 
     
     def add_block(self, block: ZdfBlock) -> None:
         self.blocks.append(block)
+        self._blocks_by_type.setdefault(block.type, []).append(block)
 
 
     def get_blocks_by_type(self, type: str) -> List[ZdfBlock]:
-        """ Returns a list of blocks that have the given type
+        """ Returns a list of blocks that have the given type. Blocks that
+        have not been decoded yet are decoded, which will raise a
+        ZdfParsingException if the block is invalid.
         """
-        def block_filter(b: ZdfBlock) -> bool:
-            return b.type == type
-        blocks_with_type = filter(block_filter, self.blocks)
-
-        return list(blocks_with_type)
+        return [
+            block.decode()
+            for block in self._blocks_by_type.get(type, [])
+        ]
 
 
 class ZdfParser:
@@ -140,9 +318,12 @@ class ZdfParser:
     required by the tool).
     """
 
-    def __init__(self) -> None:
+    def __init__(self, encoding: Optional[str] = None) -> None:
         # ZDF object that includes the details (ZoneDefinitionFile)
         self.zdf = None
+        # encoding of zdf files, defaults to the platform default as used
+        # for text files
+        self.encoding = encoding
 
 
     def _get_type(self, line:str) -> str:
@@ -155,47 +336,89 @@ class ZdfParser:
         return result.groups()[0]
 
 
-    def _get_block(self, block_type: str, lines: List[str]) -> ZdfBlock:
-        block = block_for_type(block_type)
-        block.from_strings(lines)
-        return block
-
-
     def _process_lines(self, lines: List[str]) -> None:
+        """ Adds the blocks found in the lines of a zdf file to the zdf,
+        all blocks are decoded.
+        """
         type = None
         block_lines = None
+        block_start = 0
 
         for (i, line) in enumerate(lines):
             if line.startswith('['):
                 if block_lines is not None:
-                    block = self._get_block(type, block_lines)
-                    try:
-                        self.zdf.add_block(block)
-                    except ZdfParsingException as zfdex:
-                        raise ZdfParsingException(
-                            f"Parsing error in block starting at line {i}"
-                        )
+                    self.zdf.add_block(
+                        _decode_block(type, block_lines, block_start))
 
                 type = self._get_type(line)
                 block_lines = []
+                block_start = i + 1
             elif len(line.strip()) == 0:
                 # skip over blank lines
                 pass
+            elif block_lines is None:
+                raise ZdfParsingException(
+                    f"Data found before the first block at line {i + 1}")
             else:
                 block_lines.append(line)
 
-        block = self._get_block(type, block_lines)
-        self.zdf.add_block(block)
+        if block_lines is not None:
+            self.zdf.add_block(_decode_block(type, block_lines, block_start))
+
+
+    def _index_blocks(self, path: Path, data: bytes) -> None:
+        """ Adds a ZdfLazyBlock to the zdf for each block found in the
+        contents of the zdf file (data). Only the type definition lines are
+        decoded.
+        """
+        encoding = self.encoding
+        if encoding is None:
+            encoding = locale.getpreferredencoding(False)
+
+        # (start, end) byte offsets of each type definition line
+        starts = [
+            header.start() + 1 for header in _BLOCK_HEADER.finditer(data)
+        ]
+        if data[:1] == b'[':
+            starts.insert(0, 0)
+        headers = []
+        for start in starts:
+            end = data.find(b'\n', start)
+            if end == -1:
+                end = len(data)
+            if data[end - 1:end] == b'\r':
+                end -= 1
+            headers.append((start, end))
+        first = headers[0][0] if len(headers) > 0 else len(data)
+        if len(data[:first].strip()) > 0:
+            raise ZdfParsingException("Data found before the first block")
+
+        for i, (start, header_end) in enumerate(headers):
+            if i + 1 < len(headers):
+                end = headers[i + 1][0]
+            else:
+                end = len(data)
+            type = self._get_type(data[start:header_end].decode(encoding))
+            self.zdf.add_block(
+                ZdfLazyBlock(type, path, header_end, end, encoding))
 
 
     def read(self, path: Path) -> ZoneDefinitionFile:
-        """ Read the zdf file.
+        """ Read the zdf file. The file is scanned once to find each of the
+        blocks, the blocks are decoded when they're first used (see
+        `ZoneDefinitionFile.get_blocks_by_type`).
 
         Will raise a ZdfParsingException if an errror occurs.
         """
         self.zdf = ZoneDefinitionFile(path)
 
-        with path.open('r') as file:
-            lines = file.read().splitlines()
-            self._process_lines(lines)
+        with path.open('rb') as file:
+            if path.stat().st_size == 0:
+                return self.zdf
+            # the file is memory mapped so it's scanned without reading it
+            # all into memory
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                self._index_blocks(path, data)
+
+        return self.zdf
 
@@ -1,16 +1,349 @@
 from datetime import datetime, timedelta
 from pathlib import Path
-from tracemalloc import start
 import click
 import logging
 
-from tidetool.lib.tide_generation import TideGenerator
+# The tidetool.lib modules are imported within the commands that use them.
+# They import numpy and pyfes, which are slow to load and not needed for
+# `--help` or to report invalid arguments.
+
 
 def configure_logger():
     logging.basicConfig(level="DEBUG")
 
 
-configure_logger()
+def _add_options(options):
+    """ Decorator that adds a list of click options to a command """
+    def decorator(function):
+        for option in reversed(options):
+            function = option(function)
+        return function
+    return decorator
+
+
+# options giving the date range and time period of the tide files
+_date_options = [
+    click.option(
+        '-y', '--year',
+        required=False,
+        default=None,
+        type=int,
+        help=(
+            "Tide data will be generated for this calendar year (eg; 2005). "
+            "If not provided start and end dates  must be given."
+        )
+    ),
+    click.option(
+        '-ds', '--date-start',
+        required=False,
+        default=None,
+        type=click.DateTime(formats=["%Y-%m-%d"]),
+        help="Start date for the duration tide data will be generated for (eg; '2005-3-28')"
+    ),
+    click.option(
+        '-de', '--date-end',
+        required=False,
+        default=None,
+        type=click.DateTime(formats=["%Y-%m-%d"]),
+        help=(
+            "End date for the duration tide data will be generated for (eg; '2005-6-24'). "
+            "End date is inclusive, so tide date will be generated for the end date specifed."
+        )
+    ),
+    click.option(
+        '-tp', '--time-period',
+        required=False,
+        default=10,
+        type=int,
+        help=(
+            "Time (minutes) in between predicted tide values that will be "
+            "included in the tide data files generated by this process."
+        )
+    ),
+]
+
+
+# options controlling how the tide files are generated, shared by the
+# generate-tides and generate-tides-batch commands
+_generation_options = [
+    click.option(
+        '--overwrite', '-o',
+        is_flag=True,
+        help="Overwrite tide files if they already exist"
+    ),
+    click.option(
+        '-w', '--workers',
+        required=False,
+        default=1,
+        type=click.IntRange(min=1),
+        help=(
+            "Number of processes used to generate tide files. Tide stations "
+            "are spread across these processes."
+        )
+    ),
+    click.option(
+        '--prediction-cache',
+        is_flag=True,
+        help=(
+            "Cache predicted tide data in the cache folder. Tide stations with "
+            "the same location, dates and time period as a previous run are "
+            "copied from the cache rather than predicted again."
+        )
+    ),
+    click.option(
+        '--cache-size',
+        required=False,
+        default=2048,
+        type=click.IntRange(min=0),
+        help=(
+            "Maximum size (MB) of the prediction cache, the least recently used "
+            "predictions are removed when the cache exceeds this size."
+        )
+    ),
+    click.option(
+        '--snap-to-grid',
+        required=False,
+        default=0.0,
+        type=click.FloatRange(min=0.0),
+        help=(
+            "Size (degrees) of the grid cells used to group tide stations, "
+            "all stations within the same grid cell share one prediction "
+            "(FES2014 grids are 0.0625 degrees). By default only stations with "
+            "exactly the same location share a prediction."
+        )
+    ),
+    click.option(
+        '--extend',
+        is_flag=True,
+        help=(
+            "Extend existing tide files up to the end date, only the missing "
+            "tide data is predicted and appended to each file. Tide files that "
+            "do not match the start date and time period are reported and left "
+            "unchanged."
+        )
+    ),
+    click.option(
+        '--sidecar',
+        is_flag=True,
+        help=(
+            "Also write a binary sidecar file (.tid.npy) next to each tide "
+            "file, so the tide data can be loaded without parsing the text."
+        )
+    ),
+    click.option(
+        '--netcdf',
+        required=False,
+        default=None,
+        type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+        help=(
+            "Also write the tide data of all tide stations to this compressed "
+            "NetCDF4 file, with the station names and locations. All tide "
+            "files must share the same date range and time period. Requires "
+            "the netCDF4 package."
+        )
+    ),
+]
+
+
+# options controlling how tides are predicted, shared by all the commands
+# that predict tides
+_model_options = [
+    click.option(
+        '--threads',
+        required=False,
+        default=1,
+        type=click.IntRange(min=1),
+        help=(
+            "Number of threads used by each process to predict tide data. Long "
+            "date ranges are split into time slices that are predicted in "
+            "parallel, useful when a few tide stations span many years."
+        )
+    ),
+    click.option(
+        '--engine',
+        required=False,
+        default='fes',
+        type=click.Choice(['fes', 'harmonic']),
+        help=(
+            "Tide prediction engine. 'fes' uses the AVISO FES library for all "
+            "predictions, 'harmonic' predicts from harmonic constituents that "
+            "are extracted from AVISO FES once per location and cached."
+        )
+    ),
+    click.option(
+        '--cache-folder',
+        required=False,
+        default=None,
+        type=click.Path(
+            file_okay=False,
+            dir_okay=True,
+            resolve_path=True),
+        help=(
+            "Folder used to cache data between runs. Defaults to "
+            "~/.tidetool/cache, or the TIDETOOL_CACHE_FOLDER environment "
+            "variable if set."
+        )
+    ),
+    click.option(
+        '--model-step',
+        required=False,
+        default=None,
+        type=click.IntRange(min=1),
+        help=(
+            "Time (minutes) between the points AVISO FES is evaluated at, "
+            "tide heights in between are interpolated. Much faster when the "
+            "time period is short (eg; a model step of 30 with a time "
+            "period of 1). By default every point is predicted."
+        )
+    ),
+    click.option(
+        '--interpolation-tolerance',
+        required=False,
+        default=1.0,
+        type=click.FloatRange(min=0.0),
+        help=(
+            "Largest error (cm) allowed in interpolated tide heights, see "
+            "--model-step. A sample of the interpolated heights is checked "
+            "against AVISO FES and the run fails if this is exceeded."
+        )
+    ),
+    click.option(
+        '--regional-grids',
+        is_flag=True,
+        help=(
+            "Crop the AVISO FES grids to the region around the tide stations "
+            "(or zones) and load them into memory, which is much faster than "
+            "reading the global grids. Cropped grids are kept in the cache "
+            "folder and reused by later runs over the same region. Requires "
+            "the netCDF4 package."
+        )
+    ),
+    click.option(
+        '--region-margin',
+        required=False,
+        default=1.0,
+        type=click.FloatRange(min=0.0),
+        help=(
+            "Margin (degrees) added around the tide stations (or zones) when "
+            "cropping the AVISO FES grids, see --regional-grids."
+        )
+    ),
+]
+
+
+_profile_options = [
+    click.option(
+        '--profile',
+        required=False,
+        type=click.Path(dir_okay=False, writable=True),
+        help=(
+            "Profile the run and save the report to this json file. The report "
+            "includes the time taken by each phase and tide station, points "
+            "predicted per second and peak memory use."
+        )
+    ),
+    click.option(
+        '--profile-memory',
+        is_flag=True,
+        help=(
+            "Include memory traced by tracemalloc in the profile report, this "
+            "slows down the run."
+        )
+    ),
+]
+
+
+def _get_date_range(year, date_start, date_end, required=True):
+    """ Start and end date given by the year or date options. Returns None
+    if no dates have been given and they're not required.
+    """
+    # do some basic input checking
+    if year is None and date_start is None and date_end is None \
+            and not required:
+        return None
+    elif year is None and (date_start is None or date_end is None):
+        raise RuntimeError(
+            "Must provide either a year, or start and end dates")
+    elif year is not None and date_start is not None and date_end is not None:
+        raise RuntimeError(
+            "Must provide either a year, OR start and end dates. Not both.")
+    elif date_start is None and date_end is not None:
+        raise RuntimeError("Must provide start date")
+    elif date_start is not None and date_end is None:
+        raise RuntimeError("Must provide end date")
+
+    if year is not None and (year < 1900 or year >= 2100):
+        # really just to catch the case of user giving a two digit year
+        # eg; 95 instead of 1995
+        raise RuntimeError("Year must be between 1900 and 2100")
+    elif year is not None:
+        # then valid year had been provided, we just need to convert
+        # this to a start and end date
+        start_date = datetime(year, 1, 1)
+        end_date = datetime(year, 12, 31, 23, 59, 59)
+    else:
+        start_date = date_start
+        end_date = date_end
+    return start_date, end_date
+
+
+def _run_generator(
+        data_folder, overwrite, workers, threads,
+        engine, cache_folder, prediction_cache, cache_size,
+        snap_to_grid, extend, sidecar, netcdf, model_step, interpolation_tolerance,
+        regional_grids, region_margin,
+        profile, profile_memory,
+        generate):
+    """ Creates a TideGenerator with the generation options, and calls
+    generate with it (profiling the call if requested).
+    """
+    from tidetool.lib import profiling
+    from tidetool.lib.tide_generation import TideGenerator
+
+    tg = TideGenerator(Path(data_folder))
+    tg.overwrite = overwrite
+    tg.workers = workers
+    tg.threads = threads
+    tg.engine = engine
+    if cache_folder is not None:
+        tg.cache_folder = Path(cache_folder)
+    if prediction_cache:
+        tg.cache_size = cache_size * 1024 * 1024
+    tg.grid_cell_size = snap_to_grid
+    tg.extend = extend
+    tg.sidecar = sidecar
+    if netcdf is not None:
+        tg.netcdf_file = Path(netcdf)
+    tg.model_step = model_step
+    tg.interpolation_tolerance = interpolation_tolerance
+    tg.regional_grids = regional_grids
+    tg.region_margin = region_margin
+
+    # setup an simple log function
+    def log_fn(message: str):
+        click.echo(message)
+    tg.log_function = log_fn
+
+    with profiling.profile_run(profile, profile_memory, click.echo):
+        generate(tg)
+
+
+# shared by both generate commands
+_data_folder_option = click.option(
+    '-df', '--data-folder',
+    required=True,
+    type=click.Path(
+        exists=True,
+        file_okay=False,
+        dir_okay=True,
+        resolve_path=True),
+    help=(
+        "Path to root of data folder required by AVISO FES. "
+        "This should include a `load_tide` and `ocean_tide` sub folder "
+        "including netcdf files, and the config files load_tide.ini "
+        "and ocean_tide.ini"
+    )
+)
 
 
 @click.command()
@@ -26,113 +359,382 @@ configure_logger()
         "Path to Zone Definition File (.zdf)"
     )
 )
+@_data_folder_option
+@_add_options(_date_options)
+@_add_options(_generation_options)
+@_add_options(_model_options)
+@_add_options(_profile_options)
+@click.pass_context
+def generate_tides(
+        ctx, zone_definition, data_folder,
+        year, date_start, date_end,
+        time_period, overwrite, workers, threads,
+        engine, cache_folder, prediction_cache, cache_size,
+        snap_to_grid, extend, sidecar, netcdf, model_step, interpolation_tolerance,
+        regional_grids, region_margin,
+        profile, profile_memory):
+    """
+    Reads an existing zdf file, identifies locations of tide data to be
+    predicted and the desired file names, then generates these tide files
+    using predicted data.
+    """
+    start_date, end_date = _get_date_range(year, date_start, date_end)
+
+    click.echo(f"running on: {zone_definition} for year {year}")
+
+    def generate(tg):
+        tg.generate_tides_from_zdf(
+            Path(zone_definition),
+            start_date, end_date,
+            time_period
+        )
+
+    _run_generator(
+        data_folder, overwrite, workers, threads,
+        engine, cache_folder, prediction_cache, cache_size,
+        snap_to_grid, extend, sidecar, netcdf, model_step, interpolation_tolerance,
+        regional_grids, region_margin,
+        profile, profile_memory,
+        generate
+    )
+
+
+@click.command()
+@click.argument(
+    'zone_definitions',
+    nargs=-1,
+    metavar='[ZDF_FILES]...'
+)
 @click.option(
-    '-df', '--data-folder',
-    required=True,
+    '-m', '--manifest',
+    required=False,
+    default=None,
     type=click.Path(
         exists=True,
-        file_okay=False,
-        dir_okay=True,
+        file_okay=True,
+        dir_okay=False,
         resolve_path=True),
     help=(
-        "Path to root of data folder required by AVISO FES. "
-        "This should include a `load_tide` and `ocean_tide` sub folder "
-        "including netcdf files, and the config files load_tide.ini "
-        "and ocean_tide.ini"
+        "Manifest file listing the zdf files to process, one per line. "
+        "Each file may be followed by its own start date, end date and "
+        "time period (eg; 'block01.zdf, 2005-01-01, 2005-06-30, 10')."
     )
 )
+@_data_folder_option
+@_add_options(_date_options)
+@_add_options(_generation_options)
+@_add_options(_model_options)
+@_add_options(_profile_options)
+@click.pass_context
+def generate_tides_batch(
+        ctx, zone_definitions, manifest, data_folder,
+        year, date_start, date_end,
+        time_period, overwrite, workers, threads,
+        engine, cache_folder, prediction_cache, cache_size,
+        snap_to_grid, extend, sidecar, netcdf, model_step, interpolation_tolerance,
+        regional_grids, region_margin,
+        profile, profile_memory):
+    """
+    Generates the tide files of many zdf files in one run. The zdf files
+    are given as file names or glob patterns (eg; 'survey/**/*.zdf'), or
+    listed in a manifest file. A single tide model is loaded, and each tide
+    station location is only predicted once for each date range even if
+    it's listed by several zdf files. Tide files are written next to the
+    zdf file that lists them.
+
+    The year or date options give the date range of zdf files that don't
+    have their own date range in the manifest.
+    """
+    from tidetool.lib.batch import find_zdf_files, read_manifest, ZdfJob
+
+    if len(zone_definitions) == 0 and manifest is None:
+        raise click.UsageError("Must provide zdf files or a manifest")
+
+    date_range = _get_date_range(
+        year, date_start, date_end, required=manifest is None)
+    if date_range is None:
+        date_range = (None, None)
+
+    jobs = []
+    try:
+        if manifest is not None:
+            jobs.extend(read_manifest(
+                Path(manifest), *date_range, time_period))
+        for zone_definition in find_zdf_files(zone_definitions):
+            jobs.append(ZdfJob(zone_definition, *date_range, time_period))
+    except ValueError as ex:
+        raise click.UsageError(str(ex))
+
+    click.echo(f"running on: {len(jobs)} zdf files")
+
+    def generate(tg):
+        tg.generate_tides_from_zdfs(jobs)
+
+    _run_generator(
+        data_folder, overwrite, workers, threads,
+        engine, cache_folder, prediction_cache, cache_size,
+        snap_to_grid, extend, sidecar, netcdf, model_step, interpolation_tolerance,
+        regional_grids, region_margin,
+        profile, profile_memory,
+        generate
+    )
+
+
+@click.command()
 @click.option(
-    '-y', '--year',
-    required=False,
-    default=None,
-    type=int,
+    '-zd', '--zone-definition',
+    required=True,
+    type=click.Path(
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True),
     help=(
-        "Tide data will be generated for this calendar year (eg; 2005). "
-        "If not provided start and end dates  must be given."
+        "Path to Zone Definition File (.zdf), tides are predicted over the "
+        "polygons of its ZONE blocks"
     )
 )
+@_data_folder_option
+@_add_options(_date_options)
 @click.option(
-    '-ds', '--date-start',
-    required=False,
-    default=None,
-    type=click.DateTime(formats=["%Y-%m-%d"]),
-    help="Start date for the duration tide data will be generated for (eg; '2005-3-28')"
+    '-r', '--resolution',
+    required=True,
+    type=click.FloatRange(min=0.0, min_open=True),
+    help="Distance (degrees) between the grid nodes tides are predicted at."
 )
 @click.option(
-    '-de', '--date-end',
-    required=False,
-    default=None,
-    type=click.DateTime(formats=["%Y-%m-%d"]),
+    '-out', '--output',
+    required=True,
+    type=click.Path(dir_okay=False, writable=True, resolve_path=True),
     help=(
-        "End date for the duration tide data will be generated for (eg; '2005-6-24'). "
-        "End date is inclusive, so tide date will be generated for the end date specifed."
+        "Numpy (.npy) file the tide grid is written to, a json file of the "
+        "same name describing the grid is written next to it."
     )
 )
 @click.option(
-    '-tp', '--time-period',
-    required=False,
-    default=10,
-    type=int,
+    '--overwrite', '-o',
+    is_flag=True,
+    help="Overwrite the tide grid if it already exists"
+)
+@_add_options(_model_options)
+@_add_options(_profile_options)
+@click.pass_context
+def generate_tide_grid(
+        ctx, zone_definition, data_folder,
+        year, date_start, date_end,
+        time_period, resolution, output, overwrite, threads,
+        engine, cache_folder, model_step, interpolation_tolerance,
+        regional_grids, region_margin,
+        profile, profile_memory):
+    """
+    Predicts the tide over the zones of a zdf file. The zone polygons are
+    rasterized onto a grid of nodes (resolution degrees apart) and the tide
+    is predicted at every node within a zone, a block of nodes and dates at
+    a time. Heights are written to a (time, latitude, longitude) numpy
+    array file, nodes outside the zones are NaN.
+    """
+    from tidetool.lib import profiling
+    from tidetool.lib.fes_config import Region
+    from tidetool.lib.tide_grid import generate_tide_grid as generate_grid, \
+        grid_metadata_path
+    from tidetool.lib.tides import create_tide_model
+    from tidetool.lib.zdf import ZdfParser
+
+    start_date, end_date = _get_date_range(year, date_start, date_end)
+    output = Path(output)
+    if not overwrite and \
+            (output.exists() or grid_metadata_path(output).exists()):
+        raise click.UsageError(
+            f"{output} already exists, use --overwrite to replace it")
+
+    zdf_parser = ZdfParser()
+    zdf_parser.read(Path(zone_definition))
+    zones = zdf_parser.zdf.get_blocks_by_type('ZONE')
+    if len(zones) == 0:
+        raise click.UsageError(f"{zone_definition} has no ZONE blocks")
+    click.echo(f"running on: {len(zones)} zones of {zone_definition}")
+
+    region = None
+    if regional_grids:
+        region = Region.from_locations(
+            [vertex for zone in zones for vertex in zone.vertices],
+            region_margin)
+        click.echo(f"Using regional AVISO FES grids, {region}")
+
+    with profiling.profile_run(profile, profile_memory, click.echo):
+        with create_tide_model(
+                Path(data_folder), engine,
+                Path(cache_folder) if cache_folder is not None else None,
+                model_step, interpolation_tolerance, region,
+                threads) as model:
+            try:
+                generate_grid(
+                    model, zones, resolution,
+                    start_date, end_date, time_period,
+                    output,
+                    log_function=click.echo
+                )
+            except ValueError as ex:
+                raise click.UsageError(str(ex))
+        click.echo(f"Tide grid saved to {output}")
+
+
+@click.command()
+@click.option(
+    '-zd', '--zone-definition',
+    required=True,
+    type=click.Path(
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+        resolve_path=True),
     help=(
-        "Time (minutes) in between predicted tide values that will be "
-        "included in the tide data files generated by this process."
+        "Path to Zone Definition File (.zdf), statistics are computed for "
+        "each station of its TIDE_STATION blocks"
     )
 )
+@_data_folder_option
+@_add_options(_date_options)
 @click.option(
-    '--overwrite', '-o',
-    is_flag=True,
-    help="Overwrite tide files if they already exist"
+    '-out', '--output',
+    required=True,
+    type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+    help="csv file the statistics of each tide station are written to."
 )
+@click.option(
+    '-p', '--percentile',
+    'percentiles',
+    multiple=True,
+    type=click.FloatRange(min=0.0, max=100.0),
+    help=(
+        "Include this percentile of the tide heights in the statistics, "
+        "may be given many times (eg; -p 5 -p 50 -p 95)."
+    )
+)
+@_add_options(_model_options)
+@_add_options(_profile_options)
 @click.pass_context
-def generate_tides(
+def tide_stats(
         ctx, zone_definition, data_folder,
         year, date_start, date_end,
-        time_period, overwrite):
+        time_period, output, percentiles, threads,
+        engine, cache_folder, model_step, interpolation_tolerance,
+        regional_grids, region_margin,
+        profile, profile_memory):
     """
-    Reads an existing zdf file, identifies locations of tide data to be
-    predicted and the desired file names, then generates these tide files
-    using predicted data.
+    Computes tidal statistics (eg; LAT, HAT and MSL) of the tide stations
+    in a zdf file. The tide is predicted a window of dates at a time and
+    folded into running statistics, so long date ranges at short time
+    periods use little memory. If only a start date is given statistics
+    cover a full 18.61 year nodal cycle from that date.
     """
-    # do some basic input checking
-    if year is None and (date_start is None or date_end is None):
-        raise RuntimeError(
-            "Must provide either a year, or start and end dates")
-    elif year is not None and date_start is not None and date_end is not None:
-        raise RuntimeError(
-            "Must provide either a year, OR start and end dates. Not both.")
-    elif date_start is None and date_end is not None:
-        raise RuntimeError("Must provide start date")
-    elif date_start is not None and date_end is None:
-        raise RuntimeError("Must provide end date")
+    from tidetool.lib import profiling
+    from tidetool.lib.fes_config import Region
+    from tidetool.lib.tide_stats import compute_tide_stats, \
+        default_end_date, write_tide_stats_csv
+    from tidetool.lib.tides import create_tide_model
+    from tidetool.lib.zdf import ZdfParser
 
-    if year is not None and (year < 1900 or year >= 2100):
-        # really just to catch the case of user giving a two digit year
-        # eg; 95 instead of 1995
-        raise RuntimeError("Year must be between 1900 and 2100")
-    elif year is not None:
-        # then valid year had been provided, we just need to convert
-        # this to a start and end date
-        start_date = datetime(year, 1, 1)
-        end_date = datetime(year, 12, 31, 23, 59, 59)
-    else:
-        start_date = date_start
-        end_date = date_end
+    if year is None and date_start is not None and date_end is None:
+        date_end = default_end_date(date_start)
+    start_date, end_date = _get_date_range(year, date_start, date_end)
 
-    click.echo(f"running on: {zone_definition} for year {year}")
+    zdf_parser = ZdfParser()
+    zdf_parser.read(Path(zone_definition))
+    stations = [
+        (name, latitude, longitude)
+        for block in zdf_parser.zdf.get_blocks_by_type('TIDE_STATION')
+        for name, latitude, longitude, _, _, _ in block.data
+    ]
+    if len(stations) == 0:
+        raise click.UsageError(f"{zone_definition} has no tide stations")
+    locations = [(latitude, longitude) for _, latitude, longitude in stations]
+    click.echo(
+        f"running on: {len(stations)} tide stations of {zone_definition} "
+        f"from {start_date} to {end_date}")
 
-    tg = TideGenerator(Path(data_folder))
-    tg.overwrite = overwrite
+    region = None
+    if regional_grids:
+        region = Region.from_locations(locations, region_margin)
+        click.echo(f"Using regional AVISO FES grids, {region}")
 
-    # setup an simple log function
-    def log_fn(message: str):
-        click.echo(message)
-    tg.log_function = log_fn
+    with profiling.profile_run(profile, profile_memory, click.echo):
+        with create_tide_model(
+                Path(data_folder), engine,
+                Path(cache_folder) if cache_folder is not None else None,
+                model_step, interpolation_tolerance, region,
+                threads) as model:
+            stats = compute_tide_stats(
+                model, locations,
+                start_date, end_date, time_period,
+                histogram=len(percentiles) > 0,
+                log_function=click.echo
+            )
+        write_tide_stats_csv(Path(output), stations, stats, list(percentiles))
+
+    for (name, _, _), station_stats in zip(stations, stats):
+        click.echo(
+            f"{name}: LAT {station_stats.min:.3f} m, "
+            f"HAT {station_stats.max:.3f} m, "
+            f"MSL {station_stats.mean:.3f} m")
+    click.echo(f"Tide statistics saved to {output}")
 
-    tg.generate_tides_from_zdf(
-        Path(zone_definition),
-        start_date, end_date,
-        time_period
+
+@click.command()
+@_data_folder_option
+@click.option(
+    '--host',
+    required=False,
+    default='127.0.0.1',
+    help="Address the service listens on."
+)
+@click.option(
+    '--port',
+    required=False,
+    default=8765,
+    type=click.IntRange(min=0, max=65535),
+    help="TCP port the service listens on."
+)
+@click.option(
+    '--socket',
+    'socket_path',
+    required=False,
+    default=None,
+    type=click.Path(dir_okay=False, resolve_path=True),
+    help=(
+        "Listen on this unix socket rather than a TCP port (not available "
+        "on windows)."
     )
+)
+@click.option(
+    '--batch-delay',
+    required=False,
+    default=2.0,
+    type=click.FloatRange(min=0.0),
+    help=(
+        "Time (milliseconds) to wait for other requests to arrive, so they "
+        "can share a single call to AVISO FES."
+    )
+)
+@click.pass_context
+def serve(ctx, data_folder, host, port, socket_path, batch_delay):
+    """
+    Runs a local tide prediction service. The AVISO FES grids are loaded
+    once and kept in memory, other processes request predictions using
+    the client in tidetool.lib.service. Requests that arrive at the same
+    time are predicted together.
+    """
+    from tidetool.lib.service import run_server
+    from tidetool.lib.tides import TideModel
+
+    with TideModel.from_data_folder(Path(data_folder)) as model:
+        run_server(
+            model,
+            host, port,
+            socket_path,
+            batch_delay / 1000,
+            click.echo
+        )
 
 
 @click.group()
@@ -151,9 +753,14 @@ def cli(ctx, fail_on_error):
 
 
 cli.add_command(generate_tides)
+cli.add_command(generate_tides_batch)
+cli.add_command(generate_tide_grid)
+cli.add_command(tide_stats)
+cli.add_command(serve)
 
 
 def main():
+    configure_logger()
     cli(obj={})
 
 